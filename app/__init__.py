@@ -1,4 +1,3 @@
-import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -9,23 +8,38 @@ from flask_mail import Mail
 from flask_cors import CORS
 from dotenv import load_dotenv
 from update_db import register_commands
+from .services.cache import Cache
+from .services.pool_metrics import InstrumentedQueuePool
+from .services.replica import RoutingSession
+from .services import replica
+from .services.logs import configure_logging
 import os
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 csrf = CSRFProtect()
 bootstrap = Bootstrap()
 login_manager = LoginManager()
 mail = Mail()
 cors = CORS()
+cache = Cache()
 
 def create_app(config_class='config.Config'):
     app = Flask(__name__, static_folder='static')
     app.config.from_object(config_class)
+    configure_logging(app)
+
+    # Instrument the primary and replica pools whenever pool settings are configured
+    engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if 'pool_size' in engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': InstrumentedQueuePool, **engine_options}
+    for key, bind in app.config.get('SQLALCHEMY_BINDS', {}).items():
+        if isinstance(bind, dict) and 'pool_size' in bind:
+            app.config['SQLALCHEMY_BINDS'][key] = {'poolclass': InstrumentedQueuePool, **bind}
 
     # Initialize extensions with the app
     db.init_app(app)
@@ -35,6 +49,8 @@ def create_app(config_class='config.Config'):
     login_manager.init_app(app)
     mail.init_app(app)
     cors.init_app(app)
+    cache.init_app(app, db)
+    replica.init_app(app, db)
 
     # Configure Flask-Login
     login_manager.login_view = 'auth.login'
@@ -48,6 +64,12 @@ def create_app(config_class='config.Config'):
         def load_user(user_id):
             return Worker.query.get(int(user_id))
 
+        from .services import notifications, blobstore, bookings, live
+        notifications.init_app(app, db)
+        blobstore.init_app(app, db)
+        bookings.init_app(app, db)
+        live.init_app(app, db)
+
         # Import routes and register blueprints
         from .routes.admin import admin_bp
         from .routes.help import help_bp
@@ -58,6 +80,12 @@ def create_app(config_class='config.Config'):
         from .routes.errorhandlers import error_bp
         from .routes.backup_routes import backup_bp
         from .routes.base import base_bp  # Import the base blueprint
+        from .routes.health import health_bp
+        from .routes.files import files_bp
+        from .routes.uploads import uploads_bp
+        from .routes.search import search_bp
+        from .routes.api import api_bp
+        from .routes.live import live_bp
 
         app.register_blueprint(admin_bp)
         app.register_blueprint(help_bp)
@@ -68,18 +96,42 @@ def create_app(config_class='config.Config'):
         app.register_blueprint(error_bp)
         app.register_blueprint(backup_bp)
         app.register_blueprint(base_bp)  # Register the base blueprint
+        app.register_blueprint(health_bp)
+        app.register_blueprint(files_bp)
+        app.register_blueprint(uploads_bp)
+        app.register_blueprint(search_bp)
+        app.register_blueprint(api_bp)
+        app.register_blueprint(live_bp)
 
     # Register CLI commands
     from .update_db import register_commands as update_db_commands
     from .populate_db import register_commands as populate_db_commands
+    from .routes.health import register_commands as health_commands
+    from .services.outbox import register_commands as outbox_commands
+    from .services.documents import register_commands as documents_commands
+    from .services.blobstore import register_commands as blobs_commands
+    from .services.receipts import register_commands as receipts_commands
+    from .services.uploads import register_commands as uploads_commands
+    from .services.query_plans import register_commands as query_plans_commands
+    from .services.search import register_commands as search_commands
+    from .services.archive import register_commands as archive_commands
+    from .services.deletion import register_commands as deletion_commands
+    from .services.autostaff import register_commands as autostaff_commands
+    from .services.bookings import register_commands as bookings_commands
     update_db_commands(app)
     populate_db_commands(app)
+    health_commands(app)
+    outbox_commands(app)
+    documents_commands(app)
+    blobs_commands(app)
+    receipts_commands(app)
+    uploads_commands(app)
+    query_plans_commands(app)
+    search_commands(app)
+    archive_commands(app)
+    deletion_commands(app)
+    autostaff_commands(app)
+    bookings_commands(app)
     register_commands(app)
 
     return app
-
-# Set up logging
-import logging
-logging.basicConfig(level=logging.WARN)
-logging.getLogger('sqlalchemy.engine').setLevel(logging.WARN)
-
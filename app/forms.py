@@ -8,12 +8,9 @@ from wtforms import (
 from wtforms.validators import DataRequired, InputRequired, Email, EqualTo, URL, Optional, Length
 from flask_wtf.file import FileAllowed
 from wtforms.widgets import ListWidget, CheckboxInput
-from .models import Worker, Role
 from app import db
-from .utils import get_account_managers, get_locations
+from .utils import account_manager_choices, location_choices, role_choices, worker_choices
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class RoleForm(FlaskForm):
@@ -50,8 +47,7 @@ class EditWorkerForm(FlaskForm):
         self.populate_roles()
 
     def populate_roles(self):
-        roles = Role.query.all()
-        self.role_capabilities.choices = [(str(role.id), role.name) for role in roles]
+        self.role_capabilities.choices = [(str(role_id), name) for role_id, name in role_choices()]
         
 class AdminCreateWorkerForm(EditWorkerForm):
     temp_password = PasswordField('Temporary Password', validators=[DataRequired()])
@@ -82,8 +78,8 @@ class EventForm(DynamicChoicesForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.update_choices('account_manager', [(am.id, f'{am.first_name} {am.last_name}') for am in get_account_managers()])
-        self.update_choices('location', [(loc.id, loc.name) for loc in get_locations()])
+        self.update_choices('account_manager', account_manager_choices())
+        self.update_choices('location', location_choices())
 
 class LocationForm(FlaskForm):
     name = StringField('Location Name', validators=[DataRequired()])
@@ -121,7 +117,7 @@ class UpdateProfileForm(DynamicChoicesForm):
             del self.is_account_manager
             del self.worker_select
         else:
-            self.update_choices('worker_select', [(worker.id, f'{worker.first_name} {worker.last_name}') for worker in Worker.query.all()])
+            self.update_choices('worker_select', worker_choices())
 
 class ShiftForm(DynamicChoicesForm):
     start = StringField('Shift Start:', id='shift_start', validators=[InputRequired(), DataRequired()])
@@ -134,8 +130,8 @@ class ShiftForm(DynamicChoicesForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.update_choices('location', [(loc.id, loc.name) for loc in get_locations()])
-        self.update_choices('roles', [(role.id, role.name) for role in Role.query.all()])
+        self.update_choices('location', location_choices())
+        self.update_choices('roles', role_choices())
 
 class ExpenseForm(DynamicChoicesForm):
     receipt_number = IntegerField('Receipt Number:', validators=[InputRequired(), DataRequired()])
@@ -150,7 +146,7 @@ class ExpenseForm(DynamicChoicesForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.update_choices('worker', [(worker.id, f'{worker.first_name} {worker.last_name}') for worker in Worker.query.all()])
+        self.update_choices('worker', worker_choices())
 
 class NoteForm(FlaskForm):
     notes = TextAreaField('Note Content', validators=[DataRequired()])
@@ -158,8 +154,10 @@ class NoteForm(FlaskForm):
     account_manager_and_td_only = BooleanField('Visible to Account Managers and TDs Only')
     submit_note = SubmitField('Add Note')
 
+DOCUMENT_EXTENSIONS = ['pdf', 'jpeg', 'jpg', 'png', 'docx', 'xlsx']
+
 class DocumentForm(FlaskForm):
-    document = FileField('Upload Document', validators=[FileAllowed(['pdf', 'jpeg', 'jpg', 'png', 'docx', 'xlsx'], 'Documents only!')])
+    document = FileField('Upload Document', validators=[FileAllowed(DOCUMENT_EXTENSIONS, 'Documents only!')])
     submit = SubmitField('Upload Document')
 
 class SharePointForm(FlaskForm):
@@ -33,16 +33,34 @@ class Worker(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def is_available(self, start_time, end_time):
-        for assignment in self.crew_assignments:
-            if assignment.status in ['offered', 'accepted'] and not (assignment.assigned_crew.end_time <= start_time or assignment.assigned_crew.start_time >= end_time):
-                logging.debug(f'Worker {self.first_name} {self.last_name} is not available between {start_time} and {end_time}')
-                return False
-        logging.debug(f'Worker {self.first_name} {self.last_name} is available between {start_time} and {end_time}')
+        booked = db.session.query(CrewAssignment.query.filter(
+            CrewAssignment.worker_id == self.id,
+            CrewAssignment.status.in_(['offered', 'accepted']),
+            CrewAssignment.start_time < end_time,
+            CrewAssignment.end_time > start_time
+        ).exists()).scalar()
+        if booked:
+            logger.debug('Worker %s %s is not available between %s and %s', self.first_name, self.last_name, start_time, end_time)
+            return False
+        logger.debug('Worker %s %s is available between %s and %s', self.first_name, self.last_name, start_time, end_time)
         return True
 
     def get_role_capabilities(self):
         return self.role_capabilities
 
+    def get_reset_token(self):
+        s = Serializer(current_app.config['SECRET_KEY'], salt='password-reset')
+        return s.dumps({'user_id': self.id})
+
+    @staticmethod
+    def verify_reset_token(token, max_age=1800):
+        s = Serializer(current_app.config['SECRET_KEY'], salt='password-reset')
+        try:
+            user_id = s.loads(token, max_age=max_age)['user_id']
+        except Exception:
+            return None
+        return Worker.query.get(user_id)
+
 class Role(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
@@ -58,10 +76,23 @@ class Location(db.Model):
     loading_notes = db.Column(db.String(1024))
     dress_code = db.Column(db.String(256))
     other_info = db.Column(db.String(1024))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     events = db.relationship('Event', backref='location', lazy=True)
 
 class Event(db.Model):
+    __table_args__ = (
+        # The active-events report; inactive shows pile up over the years.
+        db.Index('ix_event_active_show_number', 'show_number',
+                 postgresql_where=db.text('active'), sqlite_where=db.text('active = 1')),
+        # Event listings filtered by account manager or location, paged by show number.
+        db.Index('ix_event_account_manager_id_show_number', 'account_manager_id', 'show_number'),
+        db.Index('ix_event_location_id_show_number', 'location_id', 'show_number'),
+        db.Index('ix_event_purge_requested_at', 'purge_requested_at',
+                 postgresql_where=db.text('purge_requested_at IS NOT NULL'),
+                 sqlite_where=db.text('purge_requested_at IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     show_name = db.Column(db.String(128), nullable=False)
     show_number = db.Column(db.Integer, nullable=False, unique=True)
@@ -69,6 +100,9 @@ class Event(db.Model):
     location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
     sharepoint = db.Column(db.String, nullable=True)
     active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the event is too big to delete in one request; `flask events purge` finishes the job.
+    purge_requested_at = db.Column(db.DateTime)
 
     account_manager = db.relationship('Worker', foreign_keys=[account_manager_id], backref='events')
     crews = db.relationship('Crew', backref='event', lazy=True, cascade="all, delete-orphan")
@@ -87,22 +121,65 @@ class Event(db.Model):
     def has_unfulfilled_requests(self):
         return any(not crew.is_fulfilled for crew in self.crews)
 
+# Show name prefix search; text_pattern_ops lets Postgres use it for LIKE 'abc%'.
+db.Index('ix_event_show_name_prefix', db.func.lower(Event.show_name).label('show_name_lower'),
+         postgresql_ops={'show_name_lower': 'text_pattern_ops'})
+
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     path = db.Column(db.String(256), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    # Set by the background processor (see app/services/documents.py);
+    # derived paths are relative to the uploads folder like `path`.
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    pdf_path = db.Column(db.String(256))
+    thumbnail_path = db.Column(db.String(256))
+    page_count = db.Column(db.Integer)
+    text_content = db.Column(db.Text)
+    processing_error = db.Column(db.Text)
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     event = db.relationship('Event', back_populates='documents')
 
+class Blob(db.Model):
+    """A stored upload, named by the SHA-256 of its content; shared by every row that uploaded the same bytes."""
+    key = db.Column(db.String(80), primary_key=True)  # sha256 hex digest + lowercased extension
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """A chunked document upload in progress; chunks live on disk until it is completed (see app/services/uploads.py)."""
+    id = db.Column(db.String(32), primary_key=True)  # random hex, part of every chunk URL
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), nullable=False)
+    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(128), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64))
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='SET NULL'))  # set once completed
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
 class Crew(db.Model):
+    __table_args__ = (db.Index('ix_crew_event_id_start_time', 'event_id', 'start_time'),)
+
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
     end_time = db.Column(db.DateTime, nullable=False)
     roles = db.Column(db.String, nullable=False)
     shift_type = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     crew_assignments = db.relationship('CrewAssignment', backref='assigned_crew', lazy=True)
 
@@ -111,7 +188,7 @@ class Crew(db.Model):
 
     def get_assigned_role_count(self, role):
         count = sum(1 for assignment in self.crew_assignments if assignment.role == role and assignment.status in ['offered', 'accepted'])
-        logging.debug(f'Role: {role}, Assigned Count: {count}')
+        logger.debug('Role: %s, Assigned Count: %s', role, count)
         return count
 
     def get_assigned_roles(self):
@@ -125,7 +202,7 @@ class Crew(db.Model):
         required_roles = self.get_roles()
         assigned_roles = self.get_assigned_roles()
         unassigned_roles = {role: required_roles[role] - assigned_roles.get(role, 0) for role in required_roles}
-        logging.debug(f'Unassigned Roles: {unassigned_roles}')
+        logger.debug('Unassigned Roles: %s', unassigned_roles)
         return {role: count for role, count in unassigned_roles.items() if count > 0}
 
     @property
@@ -149,15 +226,31 @@ class Crew(db.Model):
 
     def get_assignment_for_role(self, role):
         assignment = [assignment for assignment in self.crew_assignments if assignment.role == role and assignment.status in ['offered', 'accepted']]
-        logging.debug(f'Role: {role}, Assignment: {assignment}')
+        logger.debug('Role: %s, Assignment: %s', role, assignment)
         return assignment
 
 class CrewAssignment(db.Model):
+    __table_args__ = (
+        db.Index('ix_crew_assignment_worker_id_status', 'worker_id', 'status'),
+        # Upcoming shifts across all workers (admin.view_all_shifts) only look at open assignments.
+        db.Index('ix_crew_assignment_open_crew_id', 'crew_id',
+                 postgresql_where=db.text("status IN ('offered', 'accepted')"),
+                 sqlite_where=db.text("status IN ('offered', 'accepted')")),
+        # Double-booking checks; Postgres also has an exclusion constraint (app/services/bookings.py).
+        db.Index('ix_crew_assignment_open_worker_id_start_time', 'worker_id', 'start_time', 'end_time',
+                 postgresql_where=db.text("status IN ('offered', 'accepted')"),
+                 sqlite_where=db.text("status IN ('offered', 'accepted')")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    crew_id = db.Column(db.Integer, db.ForeignKey('crew.id'), nullable=False)
+    crew_id = db.Column(db.Integer, db.ForeignKey('crew.id'), nullable=False, index=True)
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
     role = db.Column(db.String(64), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='offered')
+    # The crew's times, copied on insert and kept in step by a trigger on crew.
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     worker = db.relationship('Worker', backref='crew_assignments')
 
@@ -176,6 +269,8 @@ class CrewAssignment(db.Model):
         db.session.commit()
 
 class Expense(db.Model):
+    __table_args__ = (db.Index('ix_expense_worker_id_date', 'worker_id', 'date'),)
+
     id = db.Column(db.Integer, primary_key=True)
     receipt_number = db.Column(db.String(50))
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -186,13 +281,21 @@ class Expense(db.Model):
     net = db.Column(db.Float)
     hst = db.Column(db.Float)
     receipt_filename = db.Column(db.String(100))
+    # Set by the background processor (see app/services/receipts.py); both are blob store paths.
+    receipt_status = db.Column(db.String(20), index=True)
+    receipt_display_path = db.Column(db.String(100))
+    receipt_thumbnail_path = db.Column(db.String(100))
+    receipt_processing_error = db.Column(db.Text)
+    receipt_updated_at = db.Column(db.DateTime)
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
 
     worker = db.relationship('Worker', foreign_keys=[worker_id], backref='expenses')
 
 class Shift(db.Model):
+    __table_args__ = (db.Index('ix_shift_worker_id_start', 'worker_id', 'start'),)
+
     id = db.Column(db.Integer, primary_key=True)
-    start = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    start = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     end = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     show_name = db.Column(db.String(100))
     show_number = db.Column(db.Integer, db.ForeignKey('event.show_number'), nullable=False)
@@ -214,7 +317,7 @@ class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False, index=True)
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
     account_manager_only = db.Column(db.Boolean, default=False)
     account_manager_and_td_only = db.Column(db.Boolean, default=False)
@@ -228,4 +331,59 @@ class HelpTicket(db.Model):
     status = db.Column(db.String(20), nullable=False, default='open')
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
 
-    worker = db.relationship('Worker', backref='help_tickets', lazy=True)
\ No newline at end of file
+    worker = db.relationship('Worker', backref='help_tickets', lazy=True)
+
+class OfferNotification(db.Model):
+    """A new offer waiting to be rolled into its worker's next offer digest."""
+    id = db.Column(db.Integer, primary_key=True)
+    crew_assignment_id = db.Column(db.Integer, db.ForeignKey('crew_assignment.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    crew_assignment = db.relationship('CrewAssignment', backref=db.backref('offer_notifications', cascade='all, delete-orphan'))
+
+class OutboxMessage(db.Model):
+    """An email written in the same transaction as the change that triggered it and sent later by the outbox worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    channel = db.Column(db.String(16), nullable=False, default='email')
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_outbox_message_status_available_at', 'status', 'available_at'),)
+
+def _archive_table(model, *indexes, event_id=False):
+    """
+    Read-only copy of a model's table for rows moved out by `flask archive events`.
+
+    Same columns plus archived_at, but no foreign keys or unique constraints,
+    so batches can be copied in any order and show numbers can be reused.
+
+    :param indexes: Column name tuples to index.
+    :param event_id: Also record the event the rows were archived with, for tables
+        that otherwise only reach it through the show number.
+    """
+    name = f'archived_{model.__tablename__}'
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                         autoincrement=False) for column in model.__table__.columns]
+    if event_id:
+        columns.append(db.Column('event_id', db.Integer))
+    return db.Table(name, *columns, db.Column('archived_at', db.DateTime, nullable=False),
+                    *(db.Index(f'ix_{name}_{"_".join(cols)}', *cols) for cols in indexes))
+
+# In the order rows are copied; the archive service deletes them in reverse.
+ARCHIVE_TABLES = {
+    'event': _archive_table(Event, ('show_number',)),
+    'crew': _archive_table(Crew, ('event_id',)),
+    'crew_assignment': _archive_table(CrewAssignment, ('crew_id',), ('worker_id',)),
+    'shift': _archive_table(Shift, ('crew_assignment_id',), ('worker_id', 'start'), ('event_id',), event_id=True),
+    'note': _archive_table(Note, ('event_id',)),
+    'expense': _archive_table(Expense, ('show_number',), ('worker_id', 'date'), ('event_id',), event_id=True),
+    'document': _archive_table(Document, ('event_id',)),
+}
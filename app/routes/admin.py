@@ -1,14 +1,15 @@
-from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, session, jsonify, request
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from flask import Blueprint, render_template, redirect, url_for, flash, session, jsonify, request, current_app, abort
 from flask_login import login_required, current_user
 from ..models import Crew, Location, Worker, CrewAssignment, Event, Role
-from ..forms import AssignWorkerForm, AdminCreateWorkerForm, EditWorkerForm, LocationForm, RoleForm
+from ..forms import CSRFForm, AssignWorkerForm, AdminCreateWorkerForm, EditWorkerForm, LocationForm, RoleForm
 from .. import db
-from ..utils import get_account_managers, get_locations
+from ..utils import get_account_managers, get_locations, worker_choices, location_choices
+from ..services import pool_metrics, outbox, event_query, archive, deletion, staffing, autostaff, transactions
+from ..services.replica import read_only
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.WARN)
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -151,7 +152,7 @@ def handle_view_modes(view_as_employee=None, view_as_manager=None):
 @login_required
 def unfulfilled_crew_requests():
     form = AssignWorkerForm()
-    form.worker.choices = [(worker.id, f'{worker.first_name} {worker.last_name}') for worker in Worker.query.all()]
+    form.worker.choices = worker_choices()
 
     if form.validate_on_submit():
         worker_id = form.worker.data
@@ -159,53 +160,54 @@ def unfulfilled_crew_requests():
         role = form.role.data
 
         try:
-            assignment = CrewAssignment(
-                crew_id=crew_id,
-                worker_id=worker_id,
-                role=role,
-                status='offered'
-            )
-            db.session.add(assignment)
-            db.session.commit()
-            flash(f'Worker assigned successfully!', 'success')
+            result, = transactions.run(lambda: staffing.assign([(int(crew_id), role, worker_id)]))
+            if result['error']:
+                flash(f"{result['error']}.", 'warning')
+            else:
+                flash(f'Worker assigned successfully!', 'success')
         except Exception as e:
             db.session.rollback()
             flash(f'Error: {str(e)}', 'danger')
 
         return redirect(url_for('admin.unfulfilled_crew_requests'))
 
-    unfulfilled_crews = Crew.query.filter(Crew.end_time >= datetime.utcnow()).all()
-    unfulfilled_roles = []
-
-    for crew in unfulfilled_crews:
-        required_roles = crew.get_roles()
-        for role, required_count in required_roles.items():
-            assigned_count = crew.get_assigned_role_count(role)
-            assignments = [
-                {
-                    "id": assignment.id,
-                    "status": assignment.status,
-                    "worker_name": f"{assignment.worker.first_name} {assignment.worker.last_name}"
-                }
-                for assignment in crew.crew_assignments
-                if assignment.role == role
-            ]
-            if assigned_count < required_count or any(assignment['status'] == 'offered' for assignment in assignments):
-                unfulfilled_roles.append({
-                    "crew_id": crew.id,
-                    "event_name": crew.event.show_name,
-                    "description": crew.description,
-                    "role": role,
-                    "required_count": required_count,
-                    "assigned_count": assigned_count,
-                    "start_time": crew.start_time,
-                    "end_time": crew.end_time,
-                    "assignments": assignments
-                })
-
+    unfulfilled_roles = staffing.open_roles(Crew.query.filter(Crew.end_time >= datetime.utcnow()).all())
     workers = Worker.query.all()
     return render_template('admin/admin_unfulfilled_crew_requests.html', form=form, unfulfilled_roles=unfulfilled_roles, workers=workers)
 
+@admin_bp.route('/auto_staff', methods=['GET', 'POST'])
+@login_required
+def auto_staff():
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('base.home'))
+
+    form = CSRFForm()
+    if form.validate_on_submit():
+        requests = []
+        for value in request.form.getlist('proposal'):
+            crew_id, worker_id, role = value.split(':', 2)
+            requests.append((int(crew_id), role, int(worker_id)))
+        if not requests:
+            flash('No assignments selected.', 'warning')
+            return redirect(url_for('admin.auto_staff', days=request.args.get('days')))
+        # Re-checked here: the board may have changed since the proposal was made.
+        results = transactions.run(lambda: staffing.assign(requests))
+        created = sum(1 for result in results if result['assignment_id'] is not None)
+        flash(f'Offered {created} assignments.', 'success')
+        if created < len(results):
+            flash(f'{len(results) - created} assignments were no longer possible and were skipped.', 'warning')
+        return redirect(url_for('admin.unfulfilled_crew_requests'))
+
+    days = min(max(request.args.get('days', 14, type=int), 1), 90)
+    start = datetime.utcnow()
+    result = autostaff.propose(start, start + timedelta(days=days))
+    crews = {crew.id: crew for crew in Crew.query.options(joinedload(Crew.event)).filter(
+        Crew.id.in_({crew_id for crew_id, _, _ in result['proposals']}))}
+    proposals = sorted(result['proposals'], key=lambda proposal: (crews[proposal[0]].start_time, proposal[0], proposal[1]))
+    return render_template('admin/auto_staff.html', form=form, days=days, proposals=proposals, crews=crews,
+                           workers=dict(worker_choices()), seats=result['seats'], seconds=result['seconds'])
+
 @admin_bp.route('/add_location', methods=['GET', 'POST'])
 @login_required
 def add_location():
@@ -244,22 +246,23 @@ def view_event(event_id):
 @login_required
 def delete_event(event_id):
     event = Event.query.get_or_404(event_id)
-    db.session.delete(event)
+    if deletion.delete_event(event):
+        flash('Event is being deleted in the background.', 'success')
+    else:
+        flash('Event deleted successfully.', 'success')
     db.session.commit()
-    flash('Event deleted successfully.', 'success')
     return redirect(url_for('admin.list_events'))
 
 @admin_bp.route('/list_events')
 @login_required
 def list_events():
-    events = Event.query.all()
-    return render_template('admin/list_events.html', events=events)
+    return render_template('admin/list_events.html', form=CSRFForm(), **event_query.listing(request.args))
 
 @admin_bp.route('/assign_worker', methods=['POST'])
 @login_required
 def assign_worker():
     form = AssignWorkerForm()
-    form.worker.choices = [(worker.id, f'{worker.first_name} {worker.last_name}') for worker in Worker.query.all()]
+    form.worker.choices = worker_choices()
 
     if form.validate_on_submit():
         worker_id = form.worker.data
@@ -267,19 +270,11 @@ def assign_worker():
         role = form.role.data
 
         try:
-            if CrewAssignment.is_role_fulfilled(crew_id, role):
-                flash('This role is already fulfilled.', 'warning')
-                return redirect(url_for('admin.unfulfilled_crew_requests'))
-
-            assignment = CrewAssignment(
-                crew_id=crew_id,
-                worker_id=worker_id,
-                role=role,
-                status='offered'
-            )
-            db.session.add(assignment)
-            db.session.commit()
-            flash(f'Worker assigned successfully!', 'success')
+            result, = transactions.run(lambda: staffing.assign([(int(crew_id), role, worker_id)]))
+            if result['error']:
+                flash(f"{result['error']}.", 'warning')
+            else:
+                flash(f'Worker assigned successfully!', 'success')
         except Exception as e:
             db.session.rollback()
             flash(f'Error: {str(e)}', 'danger')
@@ -293,8 +288,18 @@ def assign_worker():
 @admin_bp.route('/remind_worker', methods=['POST'])
 @login_required
 def remind_worker():
-    assignment_id = request.form.get('assignment_id')
+    assignment_id = request.form.get('assignment_id') or request.args.get('assignment_id')
     assignment = CrewAssignment.query.get_or_404(assignment_id)
+    crew = assignment.assigned_crew
+    body = f'''Hi {assignment.worker.first_name},
+
+This is a reminder about your {assignment.status} {assignment.role} shift for {crew.event.show_name}:
+{crew.start_time:%A %B %d, %Y %H:%M} - {crew.end_time:%H:%M}
+
+{url_for('base.home', _external=True)}
+'''
+    outbox.enqueue(assignment.worker.email, f'Shift reminder: {crew.event.show_name}', body, kind='shift_reminder')
+    db.session.commit()
     flash(f'Reminder sent to {assignment.worker.first_name} {assignment.worker.last_name}.', 'success')
     return redirect(url_for('admin.unfulfilled_crew_requests'))
 
@@ -307,4 +312,42 @@ def revoke_offer():
     flash(f'Offer revoked for {assignment.worker.first_name} {assignment.worker.last_name}.', 'success')
     return redirect(url_for('admin.unfulfilled_crew_requests'))
 
+@admin_bp.route('/pool_metrics')
+@login_required
+def view_pool_metrics():
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('base.home'))
+
+    snapshots = pool_metrics.collect(db.engine)
+    if request.args.get('format') == 'json':
+        return jsonify(snapshots)
+    return render_template('admin/pool_metrics.html', snapshots=snapshots,
+                           engine_options=current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+@admin_bp.route('/archive')
+@login_required
+@read_only
+def archived_events():
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('base.home'))
+
+    prefix = request.args.get('prefix', '').strip()
+    page = archive.archived_events(prefix, request.args.get('after', type=int))
+    return render_template('admin/archived_events.html', prefix=prefix, workers=dict(worker_choices()),
+                           locations=dict(location_choices()), **page)
+
+@admin_bp.route('/archive/<int:event_id>')
+@login_required
+@read_only
+def archived_event(event_id):
+    if not current_user.is_admin:
+        flash('Access denied', 'danger')
+        return redirect(url_for('base.home'))
 
+    archived = archive.archived_event(event_id)
+    if archived is None:
+        abort(404)
+    return render_template('admin/archived_event.html', workers=dict(worker_choices()),
+                           locations=dict(location_choices()), **archived)
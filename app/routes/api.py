@@ -0,0 +1,55 @@
+from flask import Blueprint, jsonify, request
+from flask_login import current_user
+from ..models import CrewAssignment, Crew, Event
+from ..services import schedule as schedule_service, staffing, transactions
+from ..services.conditional import conditional, row_stamp, time_bucket
+from ..services.replica import read_only
+from .. import db
+
+# Versioned JSON API; breaking changes go to a new /api/v2 blueprint.
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api_bp.before_request
+def require_login():
+    # Answer with JSON rather than redirecting API clients to the login page.
+    if not current_user.is_authenticated:
+        return jsonify(error='Authentication required'), 401
+
+
+@api_bp.errorhandler(schedule_service.DecisionError)
+@api_bp.errorhandler(staffing.AssignmentError)
+def bad_request(e):
+    return jsonify(error=str(e)), 400
+
+
+def schedule_stamps():
+    assignments = CrewAssignment.query.join(Crew).join(Event).filter(CrewAssignment.worker_id == current_user.id)
+    return row_stamp(assignments, CrewAssignment.updated_at, Crew.updated_at, Event.updated_at) + (time_bucket(),)
+
+
+@api_bp.route('/schedule')
+@read_only
+@conditional(schedule_stamps)
+def schedule():
+    return jsonify(schedule_service.schedule(current_user.id))
+
+
+@api_bp.route('/offers/decisions', methods=['POST'])
+def decide_offers():
+    decisions = schedule_service.parse_decisions(request.get_json(silent=True))
+    results = schedule_service.decide(current_user.id, decisions)
+    db.session.commit()
+    return jsonify(results=results, schedule=schedule_service.schedule(current_user.id))
+
+
+@api_bp.route('/assignments', methods=['POST'])
+def create_assignments():
+    if not current_user.is_admin:
+        return jsonify(error='Access denied'), 403
+    data = request.get_json(silent=True)
+    requests = staffing.parse_assignments(data)
+    all_or_nothing = bool(isinstance(data, dict) and data.get('all_or_nothing'))
+    results = transactions.run(lambda: staffing.assign(requests, all_or_nothing=all_or_nothing))
+    created = sum(1 for result in results if result['assignment_id'] is not None)
+    return jsonify(created=created, results=results), 201 if created else 200
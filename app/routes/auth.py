@@ -4,9 +4,9 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, login_user, logout_user, current_user
 from sqlalchemy.exc import IntegrityError
 from ..models import Worker
-from ..forms import ChangePasswordForm, LoginForm, RegistrationForm, RequestResetForm
-from .. import db, mail
-from flask_mail import Message
+from ..forms import ChangePasswordForm, LoginForm, RegistrationForm, RequestResetForm, ResetPasswordForm
+from .. import db
+from ..services import outbox
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -24,10 +24,6 @@ def change_password():
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logger.addHandler(handler)
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -36,7 +32,7 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        logger.debug(f"Form data: {form.data}")
+        logger.debug("Login attempt for %s", form.email.data)
         worker = Worker.query.filter_by(email=form.email.data).first()
         if worker and worker.check_password(form.password.data):
             login_user(worker, remember=form.remember.data)
@@ -45,7 +41,7 @@ def login():
         else:
             logger.error('Login Unsuccessful. Please check email and password')
             flash('Login Unsuccessful. Please check email and password', 'danger')
-    logger.debug(f"Form errors: {form.errors}")
+    logger.debug("Form errors: %s", form.errors)
     return render_template('auth/login.html', form=form)
 
 
@@ -89,14 +85,29 @@ def reset_request():
     return render_template('auth/reset_request.html', form=form)
 
 
+@auth_bp.route('/reset_password/<token>', methods=['GET', 'POST'])
+def reset_token(token):
+    if current_user.is_authenticated:
+        return redirect(url_for('base.home'))
+    user = Worker.verify_reset_token(token)
+    if user is None:
+        flash('That is an invalid or expired token.', 'warning')
+        return redirect(url_for('auth.reset_request'))
+    form = ResetPasswordForm()
+    if form.validate_on_submit():
+        user.set_password(form.password.data)
+        db.session.commit()
+        flash('Your password has been updated! You can now log in.', 'success')
+        return redirect(url_for('auth.login'))
+    return render_template('auth/reset_token.html', form=form)
+
+
 def send_reset_email(user):
     token = user.get_reset_token()
-    msg = Message('Password Reset Request',
-                  sender='noreply@demo.com',
-                  recipients=[user.email])
-    msg.body = f'''To reset your password, visit the following link:
+    body = f'''To reset your password, visit the following link:
 {url_for('auth.reset_token', token=token, _external=True)}
 
 If you did not make this request then simply ignore this email and no changes will be made.
 '''
-    mail.send(msg)
+    outbox.enqueue(user.email, 'Password Reset Request', body, kind='password_reset')
+    db.session.commit()
@@ -1,15 +1,32 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from flask_wtf.csrf import generate_csrf
-from ..models import CrewAssignment, Crew, Expense
+from ..models import CrewAssignment, Crew, Event, Expense, Location
 from ..utils import get_pay_periods, create_time_report_ch, create_expense_report_ch
-from .. import db
+from ..services.conditional import conditional, row_stamp, expense_stamp, time_bucket
+from ..services.replica import read_only
+from ..services.notifications import load_offer_token
+from ..services import schedule, live
+from .. import db, cache, csrf
+import logging
+
+logger = logging.getLogger(__name__)
 
 base_bp = Blueprint('base', __name__)
 
+def home_stamps():
+    assignments = CrewAssignment.query.join(Crew).join(Event).join(Location).filter(
+        CrewAssignment.worker_id == current_user.id)
+    expenses = Expense.query.filter(Expense.worker_id == current_user.id)
+    return (row_stamp(assignments, CrewAssignment.updated_at, Crew.updated_at, Event.updated_at, Location.updated_at)
+            + expense_stamp(expenses)
+            + (time_bucket(),))
+
 @base_bp.route('/')
 @login_required
+@read_only
+@conditional(home_stamps)
 def home():
     # Fetch upcoming shifts for the current user
     now = datetime.utcnow()
@@ -20,8 +37,10 @@ def home():
     ).order_by(Crew.start_time).all()
     
     # Debugging: Log the upcoming shifts
-    for shift in upcoming_shifts:
-        current_app.logger.debug(f'Upcoming Shift: {shift.id} | Role: {shift.role} | Status: {shift.status} | Start: {shift.assigned_crew.start_time} | End: {shift.assigned_crew.end_time}')
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        for shift in upcoming_shifts:
+            current_app.logger.debug('Upcoming Shift: %s | Role: %s | Status: %s | Start: %s | End: %s',
+                                     shift.id, shift.role, shift.status, shift.assigned_crew.start_time, shift.assigned_crew.end_time)
     
     # Generate a limited number of pay periods
     start_date = datetime(2024, 1, 7)
@@ -40,21 +59,17 @@ def home():
         CrewAssignment.worker_id == current_user.id,
         Crew.start_time >= selected_period_start,
         Crew.end_time <= selected_period_end
-    ).all()
-    
-    # Debugging: Log the shifts for the pay period
-    for shift in shifts:
-        current_app.logger.debug(f'Shift: {shift.id} | Role: {shift.role} | Status: {shift.status} | Start: {shift.assigned_crew.start_time} | End: {shift.assigned_crew.end_time}')
-    
+    )
     expenses = Expense.query.filter(
         Expense.worker_id == current_user.id,
         Expense.date >= selected_period_start,
         Expense.date <= selected_period_end
-    ).all()
-    
-    # Generate reports
-    shift_report = create_time_report_ch(shifts)
-    expense_report = create_expense_report_ch(expenses)
+    )
+
+    # Generate reports, reusing cached fragments until the underlying rows change
+    report_key = (current_user.id, selected_period_start)
+    shift_report = cache.get_or_set('reports', ('time',) + report_key, lambda: create_time_report_ch(shifts.all()))
+    expense_report = cache.get_or_set('reports', ('expense',) + report_key, lambda: create_expense_report_ch(expenses.all()))
     
     # Generate CSRF token
     csrf = generate_csrf()
@@ -62,28 +77,55 @@ def home():
     return render_template('base/home.html', upcoming_shifts=upcoming_shifts, pay_periods=pay_periods, selected_period_start=selected_period_start, shift_report=shift_report, expense_report=expense_report, now=now, csrf=csrf)
 
 
+def respond_to_offer(status):
+    # Same conditional update as the JSON API: only offers still open change.
+    assignment_id = request.form.get('assignment_id', type=int)
+    result, = schedule.decide(current_user.id, {assignment_id: status}) if assignment_id else [{'status': None}]
+    db.session.commit()
+    if result['status'] is None:
+        flash('Invalid assignment.', 'danger')
+    elif result['changed']:
+        flash(f'You have {status} the offer.', 'success')
+    else:
+        flash(f'This offer is no longer open (it is {result["status"]}).', 'info')
+    return redirect(url_for('base.home'))
+
 @base_bp.route('/accept_offer', methods=['POST'])
 @login_required
 def accept_offer():
-    assignment_id = request.form.get('assignment_id')
-    assignment = CrewAssignment.query.get(assignment_id)
-    if assignment and assignment.worker_id == current_user.id:
-        assignment.status = 'accepted'
-        db.session.commit()
-        flash('You have accepted the offer.', 'success')
-    else:
-        flash('Invalid assignment.', 'danger')
-    return redirect(url_for('base.home'))
+    return respond_to_offer('accepted')
 
 @base_bp.route('/reject_offer', methods=['POST'])
 @login_required
 def reject_offer():
-    assignment_id = request.form.get('assignment_id')
-    assignment = CrewAssignment.query.get(assignment_id)
-    if assignment and assignment.worker_id == current_user.id:
-        assignment.status = 'rejected'
-        db.session.commit()
-        flash('You have rejected the offer.', 'success')
+    return respond_to_offer('rejected')
+
+@base_bp.route('/offers/<token>/<any(accept, reject):action>', methods=['GET', 'POST'])
+def respond_offer(token, action):
+    # Links from offer digests; the signed token stands in for a login.
+    assignment = load_offer_token(token)
+    if assignment is None:
+        flash('That link is invalid or has expired.', 'warning')
+        return redirect(url_for('base.home'))
+    if request.method == 'GET':
+        return render_template('base/respond_offer.html', assignment=assignment, action=action)
+
+    status = 'accepted' if action == 'accept' else 'rejected'
+    updated = CrewAssignment.query.filter_by(id=assignment.id, status='offered').update({'status': status})
+    if updated:
+        live.queue_assignments(db.session, [assignment])
+    db.session.commit()
+    if updated:
+        flash(f'You have {status} the offer.', 'success')
     else:
-        flash('Invalid assignment.', 'danger')
+        flash(f'This offer is no longer open (it is {assignment.status}).', 'info')
     return redirect(url_for('base.home'))
+
+@base_bp.route('/hooks/offer_digest', methods=['POST'])
+@csrf.exempt
+def offer_digest_hook():
+    # Local stand-in for a chat/SMS gateway when OFFER_DIGEST_CHANNEL=webhook.
+    if not (current_app.debug or current_app.testing):
+        abort(404)
+    logger.info('Offer digest webhook received: %s', request.get_json(silent=True))
+    return '', 204
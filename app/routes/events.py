@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError
@@ -6,6 +6,9 @@ from ..models import Event, Crew, CrewAssignment, Note, Document, Role, Worker
 from ..forms import CSRFForm, EventForm, CrewRequestForm, NoteForm, DocumentForm, SharePointForm
 from .. import db
 from ..utils import ROLES, get_crew_assignments
+from ..services.conditional import conditional, row_stamp
+from ..services import blobstore, event_query, deletion
+from ..services.replica import read_only
 import json
 import os
 from datetime import datetime
@@ -29,15 +32,24 @@ def create_event():
         flash('Event created successfully!', 'success')
         return redirect(url_for('events.create_event'))
     
-    events = Event.query.all()
-    return render_template('events/create_event.html', form=form, events=events)
+    return render_template('events/create_event.html', form=form, **event_query.listing(request.args))
 
 @events_bp.route('/list_events')
 @login_required
+@read_only
 def list_events():
-    events = Event.query.all()
     form = CSRFForm()
-    return render_template('events/events.html', events=events, form=form)
+    return render_template('events/events.html', form=form, **event_query.listing(request.args))
+
+@events_bp.route('/api')
+@login_required
+@read_only
+def events_api():
+    # Same filters and cursors as the list pages: ?prefix=&active=&account_manager_id=&location_id=
+    # &crews_from=&crews_to=&after=&before=&per_page=
+    page = event_query.page_events(event_query.parse_filters(request.args), **event_query.page_args(request.args))
+    return jsonify(events=[event_query.describe(event) for event in page['events']],
+                   next=page['next'], previous=page['previous'], per_page=page['per_page'])
 
 @events_bp.route('/activate_event/<int:event_id>')
 @login_required
@@ -60,8 +72,19 @@ def inactivate_event(event_id):
 import logging
 logger = logging.getLogger(__name__)
 
+def view_event_stamps(event_id):
+    crews = Crew.query.filter(Crew.event_id == event_id)
+    assignments = CrewAssignment.query.join(Crew).filter(Crew.event_id == event_id)
+    return ((db.session.query(Event.updated_at).filter(Event.id == event_id).scalar(),)
+            + row_stamp(crews, Crew.updated_at, Crew.id)
+            + row_stamp(assignments, CrewAssignment.updated_at, CrewAssignment.id)
+            + row_stamp(Note.query.filter(Note.event_id == event_id), Note.id)
+            + row_stamp(Document.query.filter(Document.event_id == event_id), Document.updated_at, Document.id)
+            + row_stamp(Role.query, Role.id))
+
 @events_bp.route('/view_event/<int:event_id>', methods=['GET', 'POST'])
 @login_required
+@conditional(view_event_stamps)
 def view_event(event_id):
     event = Event.query.get_or_404(event_id)
     form = CrewRequestForm()
@@ -144,28 +167,21 @@ def delete_event(event_id):
     form = CSRFForm()
 
     if form.validate_on_submit():
-        # First, delete all related crew assignments
-        crews = Crew.query.filter_by(event_id=event_id).all()
-        for crew in crews:
-            CrewAssignment.query.filter_by(crew_id=crew.id).delete()
-
-        # Then, delete all related crews
-        Crew.query.filter_by(event_id=event_id).delete()
-
-        # Finally, delete the event
-        db.session.delete(event)
+        if deletion.delete_event(event, background='background' in request.form):
+            flash('Event is being deleted in the background.', 'success')
+        else:
+            flash('Event deleted successfully.', 'success')
         db.session.commit()
-        flash('Event deleted successfully.', 'success')
         return redirect(url_for('events.list_events'))
 
-    return render_template('admin/delete_event.html', form=form, event=event)
+    return render_template('events/delete_event.html', form=form, event=event)
 
 @events_bp.route('/delete_crew/<int:crew_id>', methods=['POST'])
 @login_required
 def delete_crew(crew_id):
     crew = Crew.query.get_or_404(crew_id)
     event_id = crew.event_id
-    db.session.delete(crew)
+    deletion.delete_crews([crew.id])
     db.session.commit()
     flash('Crew deleted successfully.', 'success')
     return redirect(url_for('events.view_event', event_id=event_id))
@@ -199,12 +215,11 @@ def upload_document(event_id):
     if document_form.validate_on_submit():
         file = document_form.document.data
         filename = secure_filename(file.filename)
-        file_path = os.path.join(current_app.root_path, 'static', 'uploads', filename)
-        file.save(file_path)
-        document = Document(name=filename, path=filename, event_id=event_id)
+        # Identical files share one blob; conversion and thumbnails happen in the document worker
+        document = Document(name=filename, path=blobstore.store(file.stream, filename), event_id=event_id, status='pending')
         db.session.add(document)
         db.session.commit()
-        flash('Document uploaded successfully.', 'success')
+        flash('Document uploaded; it will be processed in the background.', 'success')
     else:
         flash('Failed to upload document.', 'danger')
     return redirect(url_for('events.view_event', event_id=event_id))
@@ -226,14 +241,16 @@ def add_sharepoint(event_id):
 @login_required
 def delete_document(document_id):
     document = Document.query.get_or_404(document_id)
-    file_path = os.path.join(current_app.root_path, 'static', 'uploads', document.path)
-    
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-            flash('Document file and link deleted successfully.', 'success')
-        except Exception as e:
-            flash('Error deleting document file.', 'danger')
+    file_path = os.path.join(blobstore.upload_dir(), document.path)
+    # Files are only removed once the row is gone, so a failed commit leaves them in place
+    blobstore.discard_files([os.path.join(blobstore.upload_dir(), 'derived', str(document.id))])
+
+    if blobstore.release(document.path):
+        # The shared file is removed on commit once no other row references it
+        flash('Document deleted successfully.', 'success')
+    elif os.path.exists(file_path):
+        blobstore.discard_files([file_path])
+        flash('Document file and link deleted successfully.', 'success')
     else:
         flash('Document file not found, only link deleted.', 'warning')
 
@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import posixpath
+import unicodedata
+from urllib.parse import quote
+from flask import Blueprint, abort, current_app, request, send_file
+from flask_login import login_required, current_user
+from sqlalchemy import select
+from ..models import ARCHIVE_TABLES, Document, Expense
+from ..services.blobstore import upload_dir, is_blob
+from .. import db
+
+files_bp = Blueprint('files', __name__, url_prefix='/files')
+
+# Content-addressed files never change, so browsers may keep them for a year.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@files_bp.before_app_request
+def block_static_uploads():
+    # Uploads live outside the static folder; this guards anything still left in
+    # app/static/uploads until `flask uploads relocate` has moved it.
+    if request.endpoint != 'static':
+        return
+    filename = (request.view_args or {}).get('filename', '').replace('\\', '/')
+    path = posixpath.normpath(filename).lstrip('/')
+    if '..' in filename.split('/') or path == 'uploads' or path.startswith('uploads/'):
+        abort(404)
+
+
+def serve_upload(relative_path, download_name, root=None):
+    """
+    Send a file from the uploads folder with Range and conditional GET
+    support, or hand it to the proxy with X-Accel-Redirect / X-Sendfile.
+
+    :param relative_path: Path relative to the uploads folder.
+    :param download_name: Filename shown to the user; also decides the content type.
+    :param root: Folder for legacy files kept outside the uploads folder; never offloaded.
+    """
+    path = os.path.join(root or upload_dir(), relative_path)
+    if not os.path.isfile(path):
+        abort(404)
+    immutable = is_blob(relative_path)
+    # A blob's name is its SHA-256, which makes a strong validator for Range requests.
+    etag = os.path.basename(relative_path).split('.')[0] if immutable else True
+    max_age = IMMUTABLE_MAX_AGE if immutable else 0
+    as_attachment = request.args.get('download') == '1'
+
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix and root is None:
+        response = current_app.response_class(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+        if immutable:
+            response.set_etag(etag)
+            if request.if_none_match.contains(etag):
+                response.status_code = 304
+                return _cache_headers(response, max_age, immutable)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + relative_path
+        response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline',
+                             **_filename_params(download_name))
+    else:
+        # send_file honours USE_X_SENDFILE itself.
+        response = send_file(path, download_name=download_name, as_attachment=as_attachment,
+                             conditional=True, etag=etag, max_age=max_age)
+    return _cache_headers(response, max_age, immutable)
+
+
+def _filename_params(download_name):
+    """Content-Disposition filename parameters, built the way send_file builds them."""
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        # safe = RFC 5987 attr-char
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    return {'filename': download_name}
+
+
+def _cache_headers(response, max_age, immutable):
+    response.cache_control.private = True
+    response.cache_control.public = False
+    if immutable:
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def can_view_receipt(expense):
+    return current_user.is_admin or current_user.id in (expense.worker_id, expense.account_manager_id)
+
+
+@files_bp.route('/documents/<int:document_id>')
+@files_bp.route('/documents/<int:document_id>/<any(original, pdf, thumbnail):variant>')
+@login_required
+def document(document_id, variant='original'):
+    document = db.get_or_404(Document, document_id)
+    if variant == 'pdf':
+        path, name = document.pdf_path, os.path.splitext(document.name)[0] + '.pdf'
+    elif variant == 'thumbnail':
+        path, name = document.thumbnail_path, os.path.splitext(document.name)[0] + '.png'
+    else:
+        path, name = document.path, document.name
+    if not path:
+        abort(404)
+    return serve_upload(path, name)
+
+
+@files_bp.route('/archive/documents/<int:document_id>')
+@login_required
+def archived_document(document_id):
+    table = ARCHIVE_TABLES['document']
+    document = db.session.execute(select(table).where(table.c.id == document_id)).first()
+    if document is None or not current_user.is_admin:
+        abort(404)
+    return serve_upload(document.path, document.name)
+
+
+@files_bp.route('/receipts/<int:expense_id>')
+@files_bp.route('/receipts/<int:expense_id>/<any(original, display, thumbnail):variant>')
+@login_required
+def receipt(expense_id, variant='original'):
+    expense = db.get_or_404(Expense, expense_id)
+    if not expense.receipt_filename or not can_view_receipt(expense):
+        abort(404)
+    if variant == 'thumbnail':
+        path = expense.receipt_thumbnail_path
+    elif variant == 'display':
+        path = expense.receipt_display_path or expense.receipt_filename
+    else:
+        path = expense.receipt_filename
+    if not path:
+        abort(404)
+    name = f'receipt_{expense.receipt_number or expense.id}{os.path.splitext(path)[1]}'
+    # Receipts saved before the blob store live in UPLOAD_FOLDER
+    root = None if is_blob(path) else os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    return serve_upload(path, name, root)
@@ -0,0 +1,27 @@
+import click
+from flask import Blueprint, jsonify
+from ..services.health import run_checks
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz')
+def healthz():
+    healthy, report = run_checks()
+    return jsonify(status='ok' if healthy else 'unavailable', checks=report), 200 if healthy else 503
+
+@health_bp.route('/livez')
+def livez():
+    return jsonify(status='ok'), 200
+
+@click.command('healthcheck')
+@click.option('--timeout', type=float, default=None, help='Seconds to wait for each check.')
+def healthcheck_command(timeout):
+    """Run the readiness checks once and exit non-zero on failure."""
+    healthy, report = run_checks(timeout)
+    for name, result in report.items():
+        click.echo(f"{name}: {result['status']} ({result['latency_ms']} ms)")
+    if not healthy:
+        raise SystemExit(1)
+
+def register_commands(app):
+    app.cli.add_command(healthcheck_command)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from flask import Blueprint, Response, request, current_app, jsonify, render_template
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+from ..models import Crew, Event, Worker
+from ..forms import AssignWorkerForm
+from ..services import live, staffing
+from .. import db
+
+live_bp = Blueprint('live', __name__, url_prefix='/live')
+
+MAX_ROWS = 50
+
+
+@live_bp.route('/events')
+@login_required
+def events():
+    # Each open stream holds a server thread; past LIVE_MAX_STREAMS the client
+    # is turned away and tries again later, so ordinary requests keep a thread.
+    slots = current_app.extensions['live']
+    if not slots.acquire(blocking=False):
+        return Response('Too many live connections.\n', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(current_app.config['LIVE_RETRY_MILLISECONDS'] // 1000 or 1)})
+    # Everything the stream needs is read up front, and the session released, so
+    # an open stream does not hold a database connection for its whole life.
+    user = {'id': current_user.id, 'is_admin': bool(current_user.is_admin),
+            'is_account_manager': bool(current_user.is_account_manager)}
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_id'))
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    config = {key: value for key, value in current_app.config.items() if key.startswith('LIVE_')}
+    db.session.remove()
+    response = Response(live.stream(user, last_id, config), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(slots.release)
+    return response
+
+
+def event_rows(ids):
+    events = Event.query.options(joinedload(Event.account_manager), joinedload(Event.location)).filter(
+        Event.id.in_(ids)).all()
+    return {f'event-{event.id}': render_template('events/event_row.html', event=event) for event in events}
+
+
+def crew_rows(ids):
+    crews = Crew.query.filter(Crew.id.in_(ids), Crew.end_time >= datetime.utcnow()).all()
+    roles = staffing.open_roles(crews)
+    if not roles:
+        return {}
+    form, workers = AssignWorkerForm(), Worker.query.all()
+    rows = {}
+    for role in roles:
+        rows.setdefault(f"crew-{role['crew_id']}", []).append(
+            render_template('admin/unfulfilled_role_row.html', role=role, form=form, workers=workers))
+    return {key: ''.join(html) for key, html in rows.items()}
+
+
+ROW_RENDERERS = {'event': event_rows, 'crew': crew_rows}
+
+
+@live_bp.route('/rows')
+@login_required
+def rows():
+    """
+    Current HTML of the rows tagged data-live-row="<type>-<id>", for patching a
+    page after a change event.
+
+    Requested rows that no longer exist (or no longer belong on the page) come
+    back as '', so the client removes them.
+    """
+    wanted = {}
+    for key in request.args.get('keys', '').split(',')[:MAX_ROWS]:
+        kind, _, row_id = key.partition('-')
+        if kind in ROW_RENDERERS and row_id.isdigit():
+            wanted.setdefault(kind, set()).add(int(row_id))
+    found = {}
+    for kind, ids in wanted.items():
+        found.update(dict.fromkeys((f'{kind}-{row_id}' for row_id in ids), ''))
+        found.update(ROW_RENDERERS[kind](ids))
+    return jsonify(found)
@@ -1,28 +1,34 @@
-import os
 from datetime import datetime
 from flask import (
     Blueprint, render_template, redirect, url_for, flash, request, 
-    session, jsonify, current_app
+    session, jsonify
 )
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from app import db
-from app.models import Worker, Event, Shift, Expense
+from app import db, cache
+from app.models import Event, Shift, Expense
 from app.forms import ShiftForm, ExpenseForm
 from app.utils import (
     create_time_report_ch, create_expense_report_ch, create_event_report, 
-    allowed_file
+    allowed_file, worker_choices, with_csrf
 )
+from app.services.conditional import conditional, row_stamp, shift_stamp, expense_stamp, time_bucket
+from app.services.replica import read_only
+from app.services import blobstore, event_query
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.WARN)
 logger = logging.getLogger(__name__)
 
 misc_bp = Blueprint('misc', __name__)
 
+def upcoming_shifts_stamps():
+    shifts = Shift.query.filter(Shift.worker_id == current_user.id)
+    return row_stamp(shifts, Shift.id) + (time_bucket(),)
+
 @misc_bp.route('/upcoming_shifts')
 @login_required
+@read_only
+@conditional(upcoming_shifts_stamps)
 def upcoming_shifts():
     now = datetime.utcnow()
     shifts = Shift.query.filter(Shift.worker_id == current_user.id, Shift.start > now).order_by(Shift.start).all()
@@ -48,14 +54,12 @@ def save_view_mode():
     session['view_as_account_manager'] = view_as_manager
     return jsonify(success=True)
 
-# Enable SQLAlchemy query logging
-logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
-
 @misc_bp.route('/timesheet', methods=['GET', 'POST'])
 @login_required
+@read_only
 def timesheet():
     shift_form = ShiftForm()
-    shift_form.worker.choices = [(worker.id, f"{worker.first_name} {worker.last_name}") for worker in Worker.query.all()]
+    shift_form.worker.choices = worker_choices()
 
     if shift_form.validate_on_submit():
         show_number = shift_form.show_number.data
@@ -71,33 +75,27 @@ def timesheet():
                 location=event.location,
                 worker_id=shift_form.worker.data
             )
-            logger.debug(f'New shift before adding: {new_shift}')
+            logger.debug('New shift before adding: %s', new_shift)
             db.session.add(new_shift)
             db.session.commit()
-            logger.debug(f'Shift committed to DB: {new_shift}')  # Log shift details after commit
+            logger.debug('Shift committed to DB: %s', new_shift)  # Log shift details after commit
             flash('Shift added successfully!', 'success')
             return redirect(url_for('misc.timesheet'))
         else:
             flash('Invalid Event Number', 'danger')
 
-    if current_user.is_admin:
-        shifts = Shift.query.order_by(Shift.start).all()
-        logger.debug(f'Admin shifts query result: {shifts}')
-    elif current_user.is_account_manager:
-        shifts = Shift.query.join(Event).filter(Event.account_manager == current_user.email).order_by(Shift.start).all()
-        logger.debug(f'Account manager shifts query result: {shifts}')
-    else:
-        shifts = Shift.query.filter_by(worker_id=current_user.id).order_by(Shift.start).all()
-        logger.debug(f'Worker shifts query result: {shifts}')
+    shifts = visible_shifts_query().order_by(Shift.start).all()
+    logger.debug('Shifts query result: %s', shifts)
 
     report = create_time_report_ch(shifts)
     return render_template('misc/timesheet.html', shift=shift_form, report=report, shifts=shifts)
 
 @misc_bp.route('/expenses', methods=['GET', 'POST'])
 @login_required
+@read_only
 def expenses():
     expense_form = ExpenseForm()
-    expense_form.worker.choices = [(worker.id, f"{worker.first_name} {worker.last_name}") for worker in Worker.query.all()]
+    expense_form.worker.choices = worker_choices()
 
     if expense_form.validate_on_submit():
         show_number = expense_form.show_number.data
@@ -106,8 +104,7 @@ def expenses():
         if event:
             receipt_file = expense_form.receipt.data
             if receipt_file and allowed_file(receipt_file.filename):
-                filename = secure_filename(receipt_file.filename)
-                receipt_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                filename = blobstore.store(receipt_file.stream, secure_filename(receipt_file.filename))
 
                 date_str = expense_form.date.data
                 try:
@@ -126,6 +123,7 @@ def expenses():
                     net=expense_form.net.data,
                     hst=expense_form.hst.data,
                     receipt_filename=filename,
+                    receipt_status='pending',
                     worker_id=expense_form.worker.data
                 )
 
@@ -139,47 +137,54 @@ def expenses():
         else:
             flash('Invalid Event Number', 'danger')
 
+    expenses = visible_expenses_query().all()
+
+    return render_template('misc/expenses.html', expense_form=expense_form, expenses=expenses)
+
+def visible_shifts_query():
     if current_user.is_admin:
-        expenses = Expense.query.all()
+        return Shift.query
     elif current_user.is_account_manager:
-        expenses = Expense.query.join(Event).filter(Event.account_manager == current_user.email).all()
-    else:
-        expenses = Expense.query.filter_by(worker_id=current_user.id).all()
+        return Shift.query.join(Event).filter(Event.account_manager == current_user.email)
+    return Shift.query.filter_by(worker_id=current_user.id)
 
-    return render_template('misc/expenses.html', expense_form=expense_form, expenses=expenses)
+def visible_expenses_query():
+    if current_user.is_admin:
+        return Expense.query
+    elif current_user.is_account_manager:
+        return Expense.query.join(Event).filter(Event.account_manager == current_user.email)
+    return Expense.query.filter_by(worker_id=current_user.id)
 
 @misc_bp.route('/refresh_timesheet_display')
 @login_required
+@read_only
+@conditional(lambda: shift_stamp(visible_shifts_query()))
 def refresh_timesheet_display():
-    if current_user.is_admin:
-        shifts = Shift.query.order_by(Shift.start).all()
-    elif current_user.is_account_manager:
-        shifts = Shift.query.join(Event).filter(Event.account_manager == current_user.email).order_by(Shift.start).all()
-    else:
-        shifts = Shift.query.filter_by(worker_id=current_user.id).order_by(Shift.start).all()
-
-    report = create_time_report_ch(shifts)
+    report = cache.get_or_set('reports', ('timesheet', current_user.id),
+                              lambda: create_time_report_ch(visible_shifts_query().order_by(Shift.start).all()))
     return report
 
 @misc_bp.route('/refresh_expense_display')
 @login_required
+@read_only
+@conditional(lambda: expense_stamp(visible_expenses_query()))
 def refresh_expense_display():
-    if current_user.is_admin:
-        expenses = Expense.query.all()
-    elif current_user.is_account_manager:
-        expenses = Expense.query.join(Event).filter(Event.account_manager == current_user.email).all()
-    else:
-        expenses = Expense.query.filter_by(worker_id=current_user.id).all()
-
-    report = create_expense_report_ch(expenses)
-    return render_template('misc/expense_report.html', report=report)
+    report = cache.get_or_set('reports', ('expenses', current_user.id),
+                              lambda: create_expense_report_ch(visible_expenses_query().all()))
+    return report
 
 @misc_bp.route('/refresh_event_display')
 @login_required
+@read_only
+@conditional(lambda: row_stamp(event_query.filtered_events(
+    {'active': True} if request.args.get('filter') == 'active' else {}), Event.updated_at, Event.id))
 def refresh_event_display():
     filter_option = request.args.get('filter', 'all')
-    event_report = create_event_report(filter_option)
-    return event_report
+    event_report, next_page, previous_page = create_event_report(
+        filter_option, request.args.get('after', type=int), request.args.get('before', type=int))
+    pager = render_template('events/event_pager.html', next=next_page, previous=previous_page,
+                            filter_args={'filter': filter_option} if filter_option != 'all' else {})
+    return with_csrf(event_report) + pager
 
 @misc_bp.route('/set_event_status/<int:event_id>/<status>', methods=['POST'])
 @login_required
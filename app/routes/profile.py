@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from ..models import Worker
 from ..forms import UpdateProfileForm, UpdatePasswordForm
 from .. import db
+from ..utils import worker_choices
 
 profile_bp = Blueprint('profile', __name__, url_prefix='/profile')
 
@@ -18,7 +19,7 @@ def update_profile():
     form = UpdateProfileForm(obj=worker)
 
     if current_user.is_admin:
-        form.worker_select.choices = [(w.id, f"{w.first_name} {w.last_name}") for w in Worker.query.all()]
+        form.worker_select.choices = worker_choices()
 
     if form.validate_on_submit():
         worker.first_name = form.first_name.data
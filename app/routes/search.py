@@ -0,0 +1,20 @@
+from flask import Blueprint, render_template, request
+from flask_login import login_required, current_user
+from ..services import search as search_service
+from ..services.replica import read_only
+
+search_bp = Blueprint('search', __name__)
+
+PER_PAGE = 20
+
+
+@search_bp.route('/search')
+@login_required
+@read_only
+def search():
+    text = request.args.get('q', '').strip()
+    kind = request.args.get('kind', 'all')
+    page = max(request.args.get('page', 1, type=int), 1)
+    kinds = None if kind == 'all' else [kind]
+    found = search_service.search(text, current_user, kinds=kinds, page=page, per_page=PER_PAGE)
+    return render_template('search/results.html', q=text, kind=kind, labels=search_service.LABELS, **found)
@@ -0,0 +1,63 @@
+from flask import Blueprint, abort, jsonify, request
+from flask_login import login_required, current_user
+from ..models import Event, UploadSession
+from ..services import uploads
+from .. import db
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/uploads')
+
+
+@uploads_bp.errorhandler(uploads.UploadError)
+def upload_error(e):
+    return jsonify(error=str(e)), e.status
+
+
+def get_upload(upload_id, **kwargs):
+    upload = db.session.get(UploadSession, upload_id, **kwargs)
+    if upload is None or upload.worker_id != current_user.id:
+        abort(404)
+    return upload
+
+
+@uploads_bp.route('', methods=['POST'])
+@login_required
+def initiate():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('event_id'), int):
+        raise uploads.UploadError('event_id is required')
+    event = db.get_or_404(Event, data['event_id'])
+    upload = uploads.initiate(event, current_user, data.get('filename'), data.get('size'), data.get('sha256'))
+    return jsonify(uploads.describe(upload)), 201
+
+
+@uploads_bp.route('/<upload_id>')
+@login_required
+def status(upload_id):
+    return jsonify(uploads.describe(get_upload(upload_id)))
+
+
+@uploads_bp.route('/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def put_chunk(upload_id, index):
+    upload = get_upload(upload_id)
+    if request.content_length is not None and request.content_length > upload.chunk_size:
+        abort(413)
+    uploads.write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    return '', 204
+
+
+@uploads_bp.route('/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete(upload_id):
+    # Locked so two retries of the same request cannot both assemble the file.
+    upload = get_upload(upload_id, with_for_update=True)
+    data = request.get_json(silent=True) or {}
+    document = uploads.complete(upload, data.get('sha256'))
+    return jsonify(document_id=document.id, status=document.status), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel(upload_id):
+    uploads.discard(get_upload(upload_id))
+    return '', 204
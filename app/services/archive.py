@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, func, literal, or_
+from app import db
+from app.models import ARCHIVE_TABLES, Event, Crew, CrewAssignment, Shift, Note, Expense, Document
+from .deletion import event_rows, delete_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'event': Event, 'crew': Crew, 'crew_assignment': CrewAssignment, 'shift': Shift,
+          'note': Note, 'expense': Expense, 'document': Document}
+
+
+def archivable(cutoff):
+    """
+    SELECT of the ids of inactive events with nothing after `cutoff`: every crew
+    has ended by then, or, for events without crews, the event was last changed before it.
+    """
+    last_crew_end = select(func.max(Crew.end_time)).where(Crew.event_id == Event.id).scalar_subquery()
+    return select(Event.id).where(Event.active.is_(False), Event.purge_requested_at.is_(None),
+                                  func.coalesce(last_crew_end, Event.updated_at) < cutoff)
+
+
+def archive_events(event_ids):
+    """
+    Move events and everything that hangs off them into the archive tables,
+    with one INSERT ... SELECT and one DELETE per table, in the caller's transaction.
+
+    :return: {table name: rows moved}
+    """
+    now = datetime.utcnow()
+    rows = event_rows(event_ids)
+    moved = {}
+    for name, table in ARCHIVE_TABLES.items():
+        source = MODELS[name].__table__
+        names = [column.name for column in source.columns] + ['archived_at']
+        columns = [*source.columns, literal(now)]
+        if 'event_id' in table.c and 'event_id' not in source.c:
+            # Show numbers can be reused once the event is archived; keep the event's id.
+            names.append('event_id')
+            columns.append(select(Event.id).where(Event.show_number == source.c.show_number).scalar_subquery())
+        result = db.session.execute(insert(table).from_select(names, select(*columns).where(rows[name])))
+        moved[name] = result.rowcount
+    # Pending digests and unfinished uploads are deleted without a copy.
+    delete_rows(rows)
+    return moved
+
+
+def archived_event(event_id):
+    """An archived event with its crews, assignments, shifts, notes, expenses and documents, or None."""
+    tables = ARCHIVE_TABLES
+    event = db.session.execute(select(tables['event']).where(tables['event'].c.id == event_id)).first()
+    if event is None:
+        return None
+    crews = db.session.execute(select(tables['crew']).where(
+        tables['crew'].c.event_id == event_id).order_by(tables['crew'].c.start_time)).all()
+    assignments = db.session.execute(select(tables['crew_assignment']).where(
+        tables['crew_assignment'].c.crew_id.in_([crew.id for crew in crews]))).all()
+    shifts = db.session.execute(select(tables['shift']).where(or_(
+        tables['shift'].c.crew_assignment_id.in_([assignment.id for assignment in assignments]),
+        tables['shift'].c.event_id == event_id)).order_by(tables['shift'].c.start)).all()
+    return {
+        'event': event,
+        'crews': crews,
+        'assignments': assignments,
+        'shifts': shifts,
+        'notes': db.session.execute(select(tables['note']).where(
+            tables['note'].c.event_id == event_id).order_by(tables['note'].c.created_at)).all(),
+        'expenses': db.session.execute(select(tables['expense']).where(
+            tables['expense'].c.event_id == event_id).order_by(tables['expense'].c.date)).all(),
+        'documents': db.session.execute(select(tables['document']).where(
+            tables['document'].c.event_id == event_id)).all(),
+    }
+
+
+def archived_events(prefix='', after=None, per_page=50):
+    """One page of archived events, newest show first, keyset-paginated on show number."""
+    table = ARCHIVE_TABLES['event']
+    query = select(table).order_by(table.c.show_number.desc()).limit(per_page + 1)
+    if prefix.isdigit():
+        query = query.where(table.c.show_number == int(prefix))
+    elif prefix:
+        query = query.where(func.lower(table.c.show_name).startswith(prefix.lower(), autoescape=True))
+    if after is not None:
+        query = query.where(table.c.show_number < after)
+    events = db.session.execute(query).all()
+    return {'events': events[:per_page], 'next': events[per_page - 1].show_number if len(events) > per_page else None}
+
+
+@click.group('archive')
+def archive_cli():
+    """Move past events out of the hot tables."""
+
+
+@archive_cli.command('events')
+@click.option('--older-than-days', type=int, default=730, show_default=True,
+              help='Archive inactive events whose last crew ended more than this many days ago.')
+@click.option('--batch-size', type=int, default=100, show_default=True, help='Events moved per transaction.')
+@click.option('--limit', type=int, default=None, help='Stop after this many events.')
+@click.option('--dry-run', is_flag=True, help='Only count the events that would be archived.')
+@with_appcontext
+def archive_events_command(older_than_days, batch_size, limit, dry_run):
+    """Move old inactive events and their crews, assignments, shifts, notes, expenses and documents into the archive tables."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    if dry_run:
+        count = db.session.execute(select(func.count()).select_from(archivable(cutoff).subquery())).scalar()
+        click.echo(f'{min(count, limit) if limit else count} events would be archived.')
+        return
+    totals = {}
+    archived = 0
+    while limit is None or archived < limit:
+        size = min(batch_size, limit - archived) if limit else batch_size
+        event_ids = db.session.execute(archivable(cutoff).order_by(Event.id).limit(size)).scalars().all()
+        if not event_ids:
+            break
+        try:
+            moved = archive_events(event_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Archiving events %s failed', event_ids)
+            raise
+        for name, count in moved.items():
+            totals[name] = totals.get(name, 0) + count
+        archived += len(event_ids)
+        click.echo(f'Archived {archived} events...')
+    click.echo('Moved ' + ', '.join(f'{count} {name} rows' for name, count in totals.items()) if totals
+               else 'Nothing to archive.')
+
+
+def register_commands(app):
+    app.cli.add_command(archive_cli)
@@ -0,0 +1,344 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, delete
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import CrewAssignment, Crew, Worker, Event, Location
+from .staffing import OPEN_STATUSES, assign
+from .deletion import delete_events
+from . import transactions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Open seats for one role on one crew.
+Opening = namedtuple('Opening', 'crew_id role count start_time end_time')
+
+
+def openings(start, end):
+    """Unfilled role seats on crews starting in [start, end), by crew start time."""
+    crews = db.session.execute(select(Crew.id, Crew.roles, Crew.start_time, Crew.end_time).where(
+        Crew.start_time >= start, Crew.start_time < end).order_by(Crew.start_time, Crew.id)).all()
+    filled = {(crew_id, role): count for crew_id, role, count in db.session.execute(select(
+        CrewAssignment.crew_id, CrewAssignment.role, func.count()
+    ).join(Crew, CrewAssignment.crew_id == Crew.id).where(
+        Crew.start_time >= start, Crew.start_time < end, CrewAssignment.status.in_(OPEN_STATUSES)
+    ).group_by(CrewAssignment.crew_id, CrewAssignment.role)).all()}
+    result = []
+    for crew in crews:
+        for role, count in json.loads(crew.roles).items():
+            missing = count - filled.get((crew.id, role), 0)
+            if missing > 0:
+                result.append(Opening(crew.id, role, missing, crew.start_time, crew.end_time))
+    return result
+
+
+def candidates(start, end):
+    """
+    Active workers and what they are already booked for around [start, end).
+
+    :return: ({worker id: set of roles}, {worker id: [(start, end), ...]})
+    """
+    workers = {}
+    for worker_id, capabilities in db.session.execute(select(Worker.id, Worker.role_capabilities).where(
+            Worker.active.is_(True))).all():
+        roles = {role for role, capable in (capabilities or {}).items() if capable}
+        if roles:
+            workers[worker_id] = roles
+    # Crews can run past `end`; a day's margin catches bookings they overlap.
+    booked = {}
+    for worker_id, crew_start, crew_end in db.session.execute(select(
+        CrewAssignment.worker_id, CrewAssignment.start_time, CrewAssignment.end_time
+    ).where(
+        CrewAssignment.status.in_(OPEN_STATUSES),
+        CrewAssignment.end_time > start, CrewAssignment.start_time < end + timedelta(days=1)
+    )).all():
+        booked.setdefault(worker_id, []).append((crew_start, crew_end))
+    return workers, booked
+
+
+def _groups(openings):
+    """Split openings into runs of crews that all overlap each other, in start order."""
+    groups, group_end = [], None
+    for opening in sorted(openings, key=lambda opening: (opening.start_time, opening.crew_id)):
+        if groups and opening.start_time < group_end:
+            groups[-1].append(opening)
+            group_end = min(group_end, opening.end_time)
+        else:
+            groups.append([opening])
+            group_end = opening.end_time
+    return groups
+
+
+def _hours(start, end):
+    return (end - start).total_seconds() / 3600
+
+
+def _match(group, ranked, options_for):
+    """
+    Seat workers on a group of overlapping openings, at most one seat each.
+
+    Workers are tried cheapest first and kept when an augmenting path finds them
+    a seat. The cost is per worker, so this gives a maximum matching of least
+    total cost. That is the min-cost flow optimum for the group.
+
+    :return: list of seated worker ids per opening.
+    """
+    seats = [[] for _ in group]
+    needed = sum(opening.count for opening in group)
+    options = {}
+
+    def augment(worker_id, visited):
+        for index in options[worker_id]:
+            if index in visited:
+                continue
+            visited.add(index)
+            if len(seats[index]) < group[index].count:
+                seats[index].append(worker_id)
+                return True
+            for position, other in enumerate(seats[index]):
+                if augment(other, visited):
+                    seats[index][position] = worker_id
+                    return True
+        return False
+
+    for worker_id in ranked:
+        if not needed:
+            break
+        options[worker_id] = options_for(worker_id)
+        if options[worker_id] and augment(worker_id, set()):
+            needed -= 1
+    return seats
+
+
+def solve(openings, workers, booked=None):
+    """
+    Propose workers for open seats. Each seat gets an active worker capable of the
+    role who is free for the whole crew. Work goes to whoever has the fewest
+    booked hours so far, then the fewest shifts.
+
+    Crews are handled in start order, in runs that all overlap each other. Each
+    run is matched exactly (see _match); across runs, each run sees the
+    hours and bookings proposed for the runs before it.
+
+    :param openings: Opening tuples, as from openings().
+    :param workers: {worker id: set of roles}.
+    :param booked: {worker id: [(start, end), ...]} of existing bookings.
+    :return: list of (crew_id, role, worker_id).
+    """
+    busy = {worker_id: list(intervals) for worker_id, intervals in (booked or {}).items()}
+    hours = {worker_id: sum(_hours(start, end) for start, end in intervals) for worker_id, intervals in busy.items()}
+    shifts = {worker_id: len(intervals) for worker_id, intervals in busy.items()}
+    by_role = {}
+    for worker_id, roles in workers.items():
+        for role in roles:
+            by_role.setdefault(role, []).append(worker_id)
+
+    proposals = []
+    for group in _groups(openings):
+        indexes = {}
+        for index, opening in enumerate(group):
+            indexes.setdefault(opening.role, []).append(index)
+        pool = {worker_id for role in indexes for worker_id in by_role.get(role, ())}
+        ranked = sorted(pool, key=lambda worker_id: (hours.get(worker_id, 0), shifts.get(worker_id, 0), worker_id))
+
+        def options_for(worker_id):
+            intervals = busy.get(worker_id, ())
+            return [index for role in workers[worker_id] for index in indexes.get(role, ())
+                    if not any(start < group[index].end_time and group[index].start_time < end for start, end in intervals)]
+
+        for opening, seated in zip(group, _match(group, ranked, options_for)):
+            for worker_id in seated:
+                proposals.append((opening.crew_id, opening.role, worker_id))
+                busy.setdefault(worker_id, []).append((opening.start_time, opening.end_time))
+                hours[worker_id] = hours.get(worker_id, 0) + _hours(opening.start_time, opening.end_time)
+                shifts[worker_id] = shifts.get(worker_id, 0) + 1
+    return proposals
+
+
+def propose(start, end):
+    """
+    A staffing proposal for crews starting in [start, end), for an admin to review.
+
+    :return: dict with 'proposals' as (crew_id, role, worker_id), 'seats' open before
+        and 'seconds' spent solving.
+    """
+    found = openings(start, end)
+    workers, booked = candidates(start, end)
+    began = time.perf_counter()
+    proposals = solve(found, workers, booked)
+    return {'proposals': proposals, 'seats': sum(opening.count for opening in found),
+            'seconds': time.perf_counter() - began}
+
+
+def synthetic(slots, workers, roles=8, days=30, seed=0):
+    """Random openings and workers for benchmarking solve(); about `slots` seats in total."""
+    rng = random.Random(seed)
+    role_names = [f'Role {number}' for number in range(roles)]
+    origin = datetime(2030, 1, 1)
+    found, seats, crew_id = [], 0, 0
+    while seats < slots:
+        crew_id += 1
+        start = origin + timedelta(days=rng.randrange(days), hours=rng.randrange(6, 20))
+        end = start + timedelta(hours=rng.choice([4, 5, 8, 10]))
+        for role in rng.sample(role_names, rng.randint(1, 3)):
+            count = rng.randint(1, 3)
+            found.append(Opening(crew_id, role, count, start, end))
+            seats += count
+    pool = {worker_id: set(rng.sample(role_names, rng.randint(1, 3))) for worker_id in range(1, workers + 1)}
+    booked = {}
+    for worker_id in rng.sample(range(1, workers + 1), workers // 4):
+        start = origin + timedelta(days=rng.randrange(days), hours=rng.randrange(6, 20))
+        booked[worker_id] = [(start, start + timedelta(hours=8))]
+    return found, pool, booked
+
+
+@click.group('staffing')
+def staffing_cli():
+    """Propose workers for unfilled crew roles."""
+
+
+@staffing_cli.command('propose')
+@click.option('--days', type=int, default=14, show_default=True, help='Crews starting within this many days.')
+@click.option('--stage', is_flag=True, help='Offer the proposed assignments instead of only listing them.')
+@with_appcontext
+def propose_command(days, stage):
+    """Propose, and optionally offer, assignments for upcoming unfilled roles."""
+    start = datetime.utcnow()
+    result = propose(start, start + timedelta(days=days))
+    for crew_id, role, worker_id in result['proposals']:
+        click.echo(f'crew {crew_id}\t{role}\tworker {worker_id}')
+    click.echo(f"Proposed {len(result['proposals'])} of {result['seats']} open seats in {result['seconds']:.2f}s.")
+    if stage and result['proposals']:
+        results = transactions.run(lambda: assign(result['proposals']))
+        click.echo(f"Offered {sum(1 for item in results if item['assignment_id'])} assignments.")
+
+
+@staffing_cli.command('benchmark')
+@click.option('--slots', type=int, default=5000, show_default=True, help='Open seats to fill.')
+@click.option('--workers', type=int, default=2000, show_default=True)
+@click.option('--seed', type=int, default=0, show_default=True)
+def benchmark_command(slots, workers, seed):
+    """Time the solver on random data; needs no database."""
+    found, pool, booked = synthetic(slots, workers, seed=seed)
+    began = time.perf_counter()
+    proposals = solve(found, pool, booked)
+    seconds = time.perf_counter() - began
+    worked = {}
+    durations = {(opening.crew_id, opening.role): _hours(opening.start_time, opening.end_time) for opening in found}
+    for crew_id, role, worker_id in proposals:
+        worked[worker_id] = worked.get(worker_id, 0) + durations[(crew_id, role)]
+    seats = sum(opening.count for opening in found)
+    click.echo(f'{seats} seats on {len({opening.crew_id for opening in found})} crews, {workers} workers')
+    click.echo(f'Filled {len(proposals)} seats ({100 * len(proposals) / seats:.1f}%) in {seconds:.2f}s')
+    if worked:
+        click.echo(f'Hours per staffed worker: min {min(worked.values()):.0f}, max {max(worked.values()):.0f}, '
+                   f'mean {sum(worked.values()) / len(worked):.1f}; {workers - len(worked)} workers unused')
+
+
+
+def _loadtest_fixture(crews, seats, workers):
+    """A throwaway event whose crews overlap in pairs, and workers who can fill every role."""
+    tag = uuid.uuid4().hex[:8]
+    people = [Worker(first_name='Load', last_name=f'Test {number}', email=f'loadtest-{tag}-{number}@example.invalid',
+                     active=True, role_capabilities={'Audio': True, 'Video': True}) for number in range(workers)]
+    location = Location(name=f'Load test {tag}', address='-')
+    db.session.add_all(people + [location])
+    db.session.flush()
+    event = Event(show_name=f'Load test {tag}', show_number=(db.session.scalar(select(func.max(Event.show_number))) or 0) + 1,
+                  account_manager_id=people[0].id, location_id=location.id, active=False)
+    db.session.add(event)
+    db.session.flush()
+    origin = datetime.utcnow() + timedelta(days=365)
+    for number in range(crews):
+        start = origin + timedelta(hours=3 * (number // 2))
+        db.session.add(Crew(event_id=event.id, start_time=start, end_time=start + timedelta(hours=4),
+                            roles=json.dumps({'Audio': seats, 'Video': seats}), shift_type='Load test', description=tag))
+    db.session.commit()
+    return event.id, location.id, [person.id for person in people]
+
+
+def _violations(event_id):
+    """(over-assigned crew roles, double-booked pairs of assignments) on an event."""
+    counts = db.session.execute(select(Crew.roles, CrewAssignment.role, func.count()).join(
+        CrewAssignment, CrewAssignment.crew_id == Crew.id).where(
+        Crew.event_id == event_id, CrewAssignment.status.in_(OPEN_STATUSES)
+    ).group_by(Crew.id, Crew.roles, CrewAssignment.role)).all()
+    over = sum(1 for roles, role, count in counts if count > json.loads(roles)[role])
+    first, second = aliased(CrewAssignment), aliased(CrewAssignment)
+    first_crew, second_crew = aliased(Crew), aliased(Crew)
+    double = db.session.scalar(select(func.count()).select_from(first).join(
+        first_crew, first.crew_id == first_crew.id).join(
+        second, (second.worker_id == first.worker_id) & (second.id > first.id)).join(
+        second_crew, second.crew_id == second_crew.id).where(
+        first_crew.event_id == event_id, second_crew.event_id == event_id,
+        first.status.in_(OPEN_STATUSES), second.status.in_(OPEN_STATUSES),
+        first_crew.start_time < second_crew.end_time, second_crew.start_time < first_crew.end_time))
+    return over, double
+
+
+@staffing_cli.command('loadtest')
+@click.option('--threads', type=int, default=8, show_default=True, help='Concurrent assigners.')
+@click.option('--requests', 'total', type=int, default=400, show_default=True, help='Assignments attempted in all.')
+@click.option('--crews', type=int, default=10, show_default=True)
+@click.option('--seats', type=int, default=2, show_default=True, help='Seats per role on each crew.')
+@click.option('--workers', type=int, default=40, show_default=True)
+@with_appcontext
+def loadtest_command(threads, total, crews, seats, workers):
+    """
+    Assign random workers to a throwaway event's crews from many threads at once,
+    then check that no role was over-assigned and nobody was double-booked.
+    The event, its crews and the workers are deleted afterwards.
+    """
+    app = current_app._get_current_object()
+    event_id, location_id, worker_ids = _loadtest_fixture(crews, seats, workers)
+    crew_ids = db.session.scalars(select(Crew.id).where(Crew.event_id == event_id)).all()
+    counters = Counter()
+    counters_lock = threading.Lock()
+
+    def assigner(number):
+        rng = random.Random(number)
+        with app.app_context():
+            for _ in range(total // threads + (number < total % threads)):
+                triple = (rng.choice(crew_ids), rng.choice(['Audio', 'Video']), rng.choice(worker_ids))
+                retries = []
+                try:
+                    result, = transactions.run(lambda: assign([triple]), on_retry=retries.append)
+                    outcome = 'created' if result['assignment_id'] is not None else 'refused'
+                except Exception as e:
+                    logger.warning('Load test assignment %s failed: %s', triple, e)
+                    outcome = 'failed'
+                with counters_lock:
+                    counters[outcome] += 1
+                    counters['retries'] += len(retries)
+
+    began = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(assigner, range(threads)))
+        seconds = time.perf_counter() - began
+        over, double = _violations(event_id)
+    finally:
+        delete_events([event_id])
+        db.session.execute(delete(Worker).where(Worker.id.in_(worker_ids)), execution_options={'synchronize_session': False})
+        db.session.execute(delete(Location).where(Location.id == location_id), execution_options={'synchronize_session': False})
+        db.session.commit()
+    done = counters['created'] + counters['refused'] + counters['failed']
+    click.echo(f"{done} attempts from {threads} threads in {seconds:.2f}s ({done / seconds:.0f}/s): "
+               f"{counters['created']} created, {counters['refused']} refused, {counters['failed']} failed, "
+               f"{counters['retries']} retries")
+    click.echo(f'Over-assigned roles: {over}; double-booked pairs: {double} (of {crews * 2 * seats} seats)')
+    if over or double:
+        raise click.ClickException('Capacity was violated under contention.')
+
+def register_commands(app):
+    app.cli.add_command(staffing_cli)
@@ -0,0 +1,270 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from collections import Counter
+from sqlalchemy import event, select, update, delete, func, case
+from app import db
+from app.models import ARCHIVE_TABLES, Blob, Document, Expense
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Paths stored on Document.path / Expense.receipt_* that live in the store.
+PREFIX = 'blobs/'
+
+
+def upload_dir():
+    return current_app.config.get('UPLOAD_STORE') or os.path.join(current_app.instance_path, 'uploads')
+
+
+def legacy_upload_dir():
+    """Where uploads were kept before they moved out of the static folder."""
+    return os.path.join(current_app.root_path, 'static', 'uploads')
+
+
+def relpath(key):
+    """Sharded path of a blob relative to the uploads folder, e.g. blobs/3f/a2/3fa2...pdf."""
+    return f'{PREFIX}{key[:2]}/{key[2:4]}/{key}'
+
+
+def is_blob(path):
+    return bool(path) and path.startswith(PREFIX)
+
+
+def _hash_to_temp(stream):
+    tmp_dir = os.path.join(upload_dir(), PREFIX, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def _add_reference(key, digest, size):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        blob = db.session.get(Blob, key, with_for_update=True)
+        if blob is None:
+            db.session.add(Blob(key=key, sha256=digest, size=size, refcount=1))
+        else:
+            blob.refcount += 1
+        db.session.flush()
+        return
+    # The upsert holds the row lock until the caller commits, so a concurrent
+    # purge of the same key cannot unlink the file underneath this upload.
+    db.session.execute(insert(Blob).values(
+        key=key, sha256=digest, size=size, refcount=1, created_at=datetime.utcnow()
+    ).on_conflict_do_update(index_elements=['key'], set_={'refcount': Blob.refcount + 1}))
+
+
+def store(stream, filename, expected_sha256=None):
+    """
+    Stream an upload into the store, hashing as it is written, and take a
+    reference to it in the caller's transaction.
+
+    :param stream: Readable binary file object, e.g. FileStorage.stream.
+    :param filename: Original name; only its extension is kept.
+    :param expected_sha256: Hex digest the content must match; ValueError otherwise.
+    :return: Path relative to the uploads folder, for Document.path or Expense.receipt_filename.
+    """
+    tmp_path, digest, size = _hash_to_temp(stream)
+    if expected_sha256 and digest != expected_sha256.lower():
+        os.remove(tmp_path)
+        raise ValueError(f'Checksum mismatch: expected {expected_sha256}, got {digest}')
+    key = digest + os.path.splitext(filename)[1].lower()
+    try:
+        _add_reference(key, digest, size)
+        final_path = os.path.join(upload_dir(), relpath(key))
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relpath(key)
+
+
+def release(path):
+    """
+    Drop one reference to a stored file; once the caller commits and nothing
+    references it any more, the file is deleted.
+
+    :return: False for paths outside the store (legacy uploads), which the caller handles.
+    """
+    if not is_blob(path):
+        return False
+    key = path.rsplit('/', 1)[1]
+    db.session.execute(update(Blob).where(Blob.key == key).values(refcount=Blob.refcount - 1))
+    db.session.info.setdefault('released_blobs', set()).add(key)
+    return True
+
+
+def release_all(paths):
+    """
+    release() for many paths with a single UPDATE.
+
+    :return: The paths outside the store, which the caller handles.
+    """
+    counts = Counter(path.rsplit('/', 1)[1] for path in paths if path and is_blob(path))
+    if counts:
+        db.session.execute(update(Blob).where(Blob.key.in_(counts)).values(
+            refcount=Blob.refcount - case(counts, value=Blob.key, else_=0)))
+        db.session.info.setdefault('released_blobs', set()).update(counts)
+    return [path for path in paths if path and not is_blob(path)]
+
+
+def discard_files(paths):
+    """Delete files or folders outside the store (legacy uploads, derived files) once the caller commits."""
+    db.session.info.setdefault('discarded_files', set()).update(paths)
+
+
+def purge(keys):
+    """Delete the files and rows of any of `keys` that are no longer referenced."""
+    uploads = upload_dir()
+    removed = 0
+    with db.engine.begin() as conn:
+        for key in keys:
+            refcount = conn.execute(select(Blob.refcount).where(Blob.key == key).with_for_update()).scalar()
+            if refcount is None or refcount > 0:
+                continue
+            file_path = os.path.join(uploads, relpath(key))
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            conn.execute(delete(Blob).where(Blob.key == key))
+            removed += 1
+    return removed
+
+
+def init_app(app, db):
+    @event.listens_for(db.session, 'after_commit')
+    def purge_released(session):
+        keys = session.info.pop('released_blobs', None)
+        if keys:
+            try:
+                purge(keys)
+            except Exception as e:
+                # Left for `flask blobs gc`.
+                logger.warning('Could not purge released blobs %s: %s', keys, e)
+
+        for path in session.info.pop('discarded_files', ()):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning('Could not remove %s: %s', path, e)
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def forget_released(session, previous_transaction):
+        session.info.pop('released_blobs', None)
+        session.info.pop('discarded_files', None)
+
+
+def referenced_keys():
+    paths = [path for path, in db.session.query(Document.path)]
+    for row in db.session.query(Expense.receipt_filename, Expense.receipt_display_path, Expense.receipt_thumbnail_path):
+        paths += row
+    # Archived rows keep their files.
+    documents, expenses = ARCHIVE_TABLES['document'], ARCHIVE_TABLES['expense']
+    paths += [path for path, in db.session.query(documents.c.path)]
+    for row in db.session.query(expenses.c.receipt_filename, expenses.c.receipt_display_path,
+                                expenses.c.receipt_thumbnail_path):
+        paths += row
+    counts = {}
+    for path in filter(is_blob, paths):
+        key = path.rsplit('/', 1)[1]
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+@click.group('blobs')
+def blobs_cli():
+    """Maintain the content-addressed upload store."""
+
+
+@blobs_cli.command('gc')
+@click.option('--grace', type=int, default=3600, help='Leave temp and unknown files younger than this many seconds.')
+@click.option('--recount', is_flag=True, help='Rebuild reference counts from Document and Expense rows first '
+                                              '(repairs leaks; run while no uploads are in flight).')
+@with_appcontext
+def gc_command(grace, recount):
+    """Delete unreferenced blobs, orphaned files and stale temp files."""
+    if recount:
+        counts = referenced_keys()
+        for blob in Blob.query.all():
+            blob.refcount = counts.get(blob.key, 0)
+        db.session.commit()
+    removed = purge([key for key, in db.session.query(Blob.key).filter(Blob.refcount <= 0)])
+
+    known = {key for key, in db.session.query(Blob.key)}
+    root = os.path.join(upload_dir(), PREFIX)
+    cutoff = time.time() - grace
+    orphans = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            file_path = os.path.join(directory, name)
+            in_tmp = os.path.basename(directory) == 'tmp'
+            if (in_tmp or name not in known) and os.path.getmtime(file_path) < cutoff:
+                os.remove(file_path)
+                orphans += 1
+    click.echo(f'Removed {removed} unreferenced blobs and {orphans} orphaned files.')
+
+
+@blobs_cli.command('import-legacy')
+@click.option('--remove-originals', is_flag=True, help='Delete each original file once nothing points at it.')
+@with_appcontext
+def import_legacy_command(remove_originals):
+    """Move documents and receipts saved under their original filenames into the store."""
+    uploads = upload_dir()
+    sources = [(document, 'path', os.path.join(uploads, document.path))
+               for document in Document.query.all() if not is_blob(document.path)]
+    sources += [(expense, 'receipt_filename', os.path.join(current_app.config['UPLOAD_FOLDER'], expense.receipt_filename))
+                for expense in Expense.query.filter(Expense.receipt_filename.isnot(None)).all()
+                if not is_blob(expense.receipt_filename)]
+    imported = missing = 0
+    originals = set()
+    for row, column, source in sources:
+        if not os.path.exists(source):
+            missing += 1
+            continue
+        with open(source, 'rb') as f:
+            setattr(row, column, store(f, source))
+        originals.add(source)
+        imported += 1
+    db.session.commit()
+    if remove_originals:
+        for source in originals:
+            os.remove(source)
+    saved = db.session.query(func.count(Blob.key)).scalar()
+    click.echo(f'Imported {imported} files into {saved} blobs ({missing} missing on disk).')
+
+
+def register_commands(app):
+    app.cli.add_command(blobs_cli)
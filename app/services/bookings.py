@@ -0,0 +1,110 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, event, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import CrewAssignment, Crew
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPEN = "status IN ('offered', 'accepted')"
+# Raised by the SQLite trigger; the Postgres constraint raises exclusion_violation (23P01).
+DOUBLE_BOOKING = 'double booking'
+
+# A worker's offered and accepted assignments may not overlap. The crew's times
+# are copied onto each assignment so the check is a single index probe.
+PG_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE crew_assignment ADD CONSTRAINT ex_crew_assignment_double_booking '
+    f'EXCLUDE USING gist (worker_id WITH =, tsrange(start_time, end_time) WITH &&) WHERE ({OPEN})',
+    'CREATE OR REPLACE FUNCTION crew_assignment_copy_crew_times() RETURNS trigger AS $$ BEGIN '
+    'UPDATE crew_assignment SET start_time = NEW.start_time, end_time = NEW.end_time WHERE crew_id = NEW.id; '
+    'RETURN NULL; END $$ LANGUAGE plpgsql',
+    'CREATE TRIGGER crew_copy_times AFTER UPDATE OF start_time, end_time ON crew FOR EACH ROW '
+    'EXECUTE FUNCTION crew_assignment_copy_crew_times()',
+]
+_SQLITE_OVERLAP = (f"SELECT RAISE(ABORT, '{DOUBLE_BOOKING}') FROM crew_assignment WHERE worker_id = NEW.worker_id "
+                   f"AND {OPEN} AND start_time < NEW.end_time AND end_time > NEW.start_time")
+SQLITE_DDL = [
+    f"CREATE TRIGGER IF NOT EXISTS crew_assignment_double_booking_insert BEFORE INSERT ON crew_assignment "
+    f"WHEN NEW.{OPEN} BEGIN {_SQLITE_OVERLAP}; END",
+    f"CREATE TRIGGER IF NOT EXISTS crew_assignment_double_booking_update "
+    f"BEFORE UPDATE OF worker_id, status, start_time, end_time ON crew_assignment "
+    f"WHEN NEW.{OPEN} BEGIN {_SQLITE_OVERLAP} AND id <> NEW.id; END",
+    "CREATE TRIGGER IF NOT EXISTS crew_copy_times AFTER UPDATE OF start_time, end_time ON crew BEGIN "
+    "UPDATE crew_assignment SET start_time = NEW.start_time, end_time = NEW.end_time WHERE crew_id = NEW.id; END",
+]
+
+# Databases built with create_all() get the same constraint and triggers as migrated ones.
+for _statement in PG_DDL:
+    event.listen(CrewAssignment.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in SQLITE_DDL:
+    event.listen(CrewAssignment.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(CrewAssignment.__table__, 'before_drop',
+             DDL('DROP FUNCTION IF EXISTS crew_assignment_copy_crew_times() CASCADE').execute_if(dialect='postgresql'))
+
+
+def init_app(app, db):
+    @event.listens_for(db.session, 'before_flush')
+    def copy_crew_times(session, flush_context, instances):
+        # New assignments take their crew's times, however they were created.
+        pending = [obj for obj in session.new if isinstance(obj, CrewAssignment) and obj.start_time is None]
+        if not pending:
+            return
+        times = {}
+        crew_ids = {obj.crew_id for obj in pending if obj.crew_id is not None}
+        if crew_ids:
+            with session.no_autoflush:
+                times = {crew_id: (start, end) for crew_id, start, end in session.execute(select(
+                    Crew.id, Crew.start_time, Crew.end_time).where(Crew.id.in_(crew_ids))).all()}
+        for obj in pending:
+            if obj.crew_id is None:
+                obj.start_time, obj.end_time = obj.assigned_crew.start_time, obj.assigned_crew.end_time
+            else:
+                obj.start_time, obj.end_time = times.get(obj.crew_id, (None, None))
+
+
+def is_double_booking(error):
+    orig = getattr(error, 'orig', None)
+    return getattr(orig, 'pgcode', None) == '23P01' or DOUBLE_BOOKING in str(orig)
+
+
+def conflicts(limit=None):
+    """
+    Pairs of open assignments that book a worker twice, judged by the crews' own
+    times so it also works on a database the constraint has not been added to yet.
+
+    :return: rows of (worker_id, first assignment id, second assignment id).
+    """
+    first, second = aliased(CrewAssignment), aliased(CrewAssignment)
+    first_crew, second_crew = aliased(Crew), aliased(Crew)
+    query = select(first.worker_id, first.id, second.id).join(
+        first_crew, first.crew_id == first_crew.id).join(
+        second, (second.worker_id == first.worker_id) & (second.id > first.id)).join(
+        second_crew, second.crew_id == second_crew.id).where(
+        first.status.in_(['offered', 'accepted']), second.status.in_(['offered', 'accepted']),
+        first_crew.start_time < second_crew.end_time, second_crew.start_time < first_crew.end_time
+    ).order_by(first.worker_id, first.id, second.id)
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).all()
+
+
+@click.group('bookings')
+def bookings_cli():
+    """Check workers for double bookings."""
+
+
+@bookings_cli.command('conflicts')
+@with_appcontext
+def conflicts_command():
+    """List offered/accepted assignments that overlap for the same worker; they must be resolved before migrating."""
+    rows = conflicts()
+    for worker_id, first_id, second_id in rows:
+        click.echo(f'worker {worker_id}: assignments {first_id} and {second_id} overlap')
+    click.echo(f'{len(rows)} double bookings.')
+
+
+def register_commands(app):
+    app.cli.add_command(bookings_cli)
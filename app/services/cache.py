@@ -0,0 +1,296 @@
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from sqlalchemy import event
+from .replica import reading_replica
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LRUBackend:
+    """In-process LRU store. Only safe when the app runs as a single process."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        # Counters are kept outside the LRU so eviction can never reset a generation.
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+
+class SQLiteBackend:
+    """
+    Shared store in a local SQLite file, visible to every gunicorn worker on
+    the same host. Values are pickled; counters live in their own table so
+    that increments are atomic across processes.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counter (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connection(self):
+        # Connections are per thread and per process; a forked worker opens its own.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+        )
+        if random.random() < 0.01:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def incr(self, key):
+        # The increment and the read-back must be one step, or two processes can
+        # get the same number back.
+        conn = self._connection()
+        upsert = ('INSERT INTO counter (key, value) VALUES (?, 1) '
+                  'ON CONFLICT(key) DO UPDATE SET value = value + 1')
+        if sqlite3.sqlite_version_info >= (3, 35):
+            return conn.execute(upsert + ' RETURNING value', (key,)).fetchone()[0]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(upsert, (key,))
+            value = conn.execute('SELECT value FROM counter WHERE key = ?', (key,)).fetchone()[0]
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return value
+
+    def get_counter(self, key):
+        row = self._connection().execute('SELECT value FROM counter WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache')
+        conn.execute('DELETE FROM counter')
+
+
+class RedisBackend:
+    """Shared store on any Redis-protocol server (Redis, Valkey, KeyDB)."""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def get_counter(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class Cache:
+    """
+    Namespaced cache with cross-worker invalidation.
+
+    Every namespace has a generation counter kept in the backend. Keys embed
+    the current generation, so bumping the counter invalidates the whole
+    namespace for every process that shares the backend. Namespaces are tied
+    to tables and bumped automatically when a commit touches those tables.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.backend = None
+        self.default_ttl = 300
+        self.prefix = 'showbase'
+        self._tables = {}
+        self._listening = False
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        self.backend = self._make_backend(app.config)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        self.prefix = app.config.get('CACHE_KEY_PREFIX', 'showbase')
+        app.extensions['cache'] = self
+        if db is not None and not self._listening:
+            self._listen(db)
+            self._listening = True
+
+    @staticmethod
+    def _make_backend(config):
+        backend = config.get('CACHE_BACKEND', 'sqlite')
+        if backend == 'redis':
+            return RedisBackend(config['CACHE_URL'])
+        if backend == 'sqlite':
+            path = config.get('CACHE_URL') or os.path.join(tempfile.gettempdir(), 'showbase-cache.sqlite')
+            return SQLiteBackend(path, config.get('CACHE_MAX_ENTRIES', 10000))
+        if backend == 'memory':
+            return LRUBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+        raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+
+    def register(self, namespace, tables):
+        """Invalidate `namespace` whenever a commit writes to any of `tables`."""
+        for table in tables:
+            self._tables.setdefault(table, set()).add(namespace)
+
+    def _generation(self, namespace):
+        return self.backend.get_counter(f'{self.prefix}:gen:{namespace}')
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:{self._generation(namespace)}:{key!r}'
+
+    def get(self, namespace, key):
+        return self.backend.get(self._key(namespace, key))
+
+    def set(self, namespace, key, value, ttl=None):
+        self.backend.set(self._key(namespace, key), value, ttl or self.default_ttl)
+
+    def get_or_set(self, namespace, key, func, ttl=None):
+        full_key = self._key(namespace, key)
+        value = self.backend.get(full_key)
+        if value is None:
+            value = func()
+            # A lagging replica's rows would outlive the read-your-writes window
+            # here and be served to everyone, so only the primary fills the cache.
+            if not reading_replica():
+                self.backend.set(full_key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.incr(f'{self.prefix}:gen:{namespace}')
+            logger.debug('Cache namespace invalidated: %s', namespace)
+
+    def invalidate_tables(self, tables):
+        namespaces = set()
+        for table in tables:
+            namespaces |= self._tables.get(table, set())
+        self.invalidate(*namespaces)
+
+    def memoize(self, namespace, tables=(), ttl=None):
+        """
+        Cache a function's return value per argument tuple.
+
+        Return values must be picklable plain data (tuples, dicts, strings),
+        never ORM instances, since they are shared between processes.
+        """
+        self.register(namespace, tables)
+
+        def decorator(func):
+            @wraps(func)
+            def wrapped(*args, **kwargs):
+                key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+                return self.get_or_set(namespace, key, lambda: func(*args, **kwargs), ttl)
+            return wrapped
+        return decorator
+
+    def _listen(self, db):
+        @event.listens_for(db.session, 'after_flush')
+        def collect_written_tables(session, flush_context):
+            tables = session.info.setdefault('cache_tables', set())
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+                table = getattr(obj, '__tablename__', None)
+                if table:
+                    tables.add(table)
+
+        @event.listens_for(db.session, 'do_orm_execute')
+        def collect_bulk_tables(orm_execute_state):
+            if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+                mapper = orm_execute_state.bind_mapper
+                if mapper is not None:
+                    orm_execute_state.session.info.setdefault('cache_tables', set()).add(mapper.local_table.name)
+
+        @event.listens_for(db.session, 'after_commit')
+        def invalidate_written_tables(session):
+            tables = session.info.pop('cache_tables', None)
+            if tables:
+                self.invalidate_tables(tables)
+
+        @event.listens_for(db.session, 'after_soft_rollback')
+        def discard_written_tables(session, previous_transaction):
+            if not session.in_transaction():
+                session.info.pop('cache_tables', None)
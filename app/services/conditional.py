@@ -0,0 +1,94 @@
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+from flask import request, session, make_response, current_app
+from flask_login import current_user
+from sqlalchemy import func
+from app import db
+from app.models import CrewAssignment, Crew, Event, Location, Shift, Expense
+
+
+def time_bucket(seconds=300):
+    """Coarse clock component for pages whose content depends on 'now'."""
+    return int(time.time() // seconds)
+
+
+def row_stamp(query, *columns):
+    """
+    Return a cheap (count, max(column), ...) tuple for the rows behind a page.
+
+    :param query: A query already filtered down to the rows the page renders.
+    :param columns: Columns whose maximum changes when a row is added or updated.
+    """
+    entities = [func.count()] + [func.max(column) for column in columns]
+    return tuple(query.with_entities(*entities).order_by(None).one())
+
+
+def shift_stamp(query):
+    """row_stamp() of the shifts in `query` and the crews, events and locations their reports show."""
+    shifts = query.with_entities(Shift.id).order_by(None).subquery()
+    joined = db.session.query(Shift).join(shifts, Shift.id == shifts.c.id).outerjoin(
+        CrewAssignment, CrewAssignment.id == Shift.crew_assignment_id).outerjoin(
+        Crew, Crew.id == CrewAssignment.crew_id).outerjoin(
+        Event, Event.show_number == Shift.show_number).outerjoin(Location, Location.id == Event.location_id)
+    return row_stamp(joined, Shift.id, Crew.updated_at, Event.updated_at, Location.updated_at)
+
+
+def expense_stamp(query):
+    """row_stamp() of the expenses in `query` and the events and locations their reports show."""
+    expenses = query.with_entities(Expense.id).order_by(None).subquery()
+    joined = db.session.query(Expense).join(expenses, Expense.id == expenses.c.id).outerjoin(
+        Event, Event.show_number == Expense.show_number).outerjoin(Location, Location.id == Event.location_id)
+    return row_stamp(joined, Expense.id, Expense.receipt_updated_at, Event.updated_at, Location.updated_at)
+
+
+def make_etag(stamps):
+    viewer = current_user.get_id() if current_user.is_authenticated else None
+    key = repr((
+        request.endpoint,
+        request.full_path,
+        viewer,
+        session.get('csrf_token'),
+        session.get('view_as_employee'),
+        session.get('view_as_account_manager'),
+        stamps,
+    ))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def conditional(stamp_func):
+    """
+    Answer GET requests with 304 Not Modified when the page's version stamps
+    are unchanged, before the view runs any of its own queries or templates.
+
+    :param stamp_func: Called with the view arguments; returns a tuple of values
+                       (counts, max ids, updated_at stamps) describing the data
+                       the view renders.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Pending flashes are rendered once, so the page must not be skipped.
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            stamps = tuple(stamp_func(*args, **kwargs))
+            etag = make_etag(stamps)
+            last_modified = max((s for s in stamps if isinstance(s, datetime)), default=None)
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
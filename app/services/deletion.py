@@ -0,0 +1,197 @@
+import os
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete, func, or_, union_all
+from app import db
+from app.models import (Event, Crew, CrewAssignment, Shift, Note, Expense, Document, OfferNotification,
+                        UploadSession)
+from . import blobstore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def event_rows(event_ids):
+    """
+    WHERE clauses selecting the rows that belong to `event_ids`, keyed by table name.
+    Shifts and expenses hang off the event's show number as well as its crews.
+    """
+    crews = select(Crew.id).where(Crew.event_id.in_(event_ids))
+    assignments = select(CrewAssignment.id).where(CrewAssignment.crew_id.in_(crews))
+    shows = select(Event.show_number).where(Event.id.in_(event_ids))
+    return {
+        'event': Event.id.in_(event_ids),
+        'crew': Crew.event_id.in_(event_ids),
+        'crew_assignment': CrewAssignment.crew_id.in_(crews),
+        'shift': or_(Shift.crew_assignment_id.in_(assignments), Shift.show_number.in_(shows)),
+        'note': Note.event_id.in_(event_ids),
+        'expense': Expense.show_number.in_(shows),
+        'document': Document.event_id.in_(event_ids),
+        'offer_notification': OfferNotification.crew_assignment_id.in_(assignments),
+        'upload_session': UploadSession.event_id.in_(event_ids),
+    }
+
+
+# Children before parents; every subquery in event_rows() still finds the rows it goes through.
+DELETE_ORDER = [
+    ('offer_notification', OfferNotification), ('upload_session', UploadSession), ('shift', Shift),
+    ('crew_assignment', CrewAssignment), ('crew', Crew), ('note', Note), ('expense', Expense),
+    ('document', Document), ('event', Event),
+]
+
+
+def delete_rows(rows):
+    """
+    One bulk DELETE per table, in dependency order, in the caller's transaction.
+
+    :param rows: {table name: WHERE clause}, as from event_rows(); missing tables are skipped.
+    :return: {table name: rows deleted}
+    """
+    deleted = {}
+    for name, model in DELETE_ORDER:
+        if name in rows:
+            result = db.session.execute(delete(model).where(rows[name]), execution_options={'synchronize_session': False})
+            deleted[name] = result.rowcount
+    return deleted
+
+
+def _release_files(rows):
+    """Drop the references the doomed documents and receipts hold on stored files; other files go after commit."""
+    documents = db.session.execute(select(Document.id, Document.path).where(rows['document'])).all()
+    receipts = db.session.execute(select(
+        Expense.receipt_filename, Expense.receipt_display_path, Expense.receipt_thumbnail_path
+    ).where(rows['expense'], Expense.receipt_filename.isnot(None))).all()
+    uploads = blobstore.upload_dir()
+    legacy_receipts = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    files = [os.path.join(uploads, 'derived', str(document_id)) for document_id, _ in documents]
+    files += [os.path.join(uploads, path) for path in blobstore.release_all([path for _, path in documents])]
+    files += [os.path.join(legacy_receipts, path) for path in blobstore.release_all([path for row in receipts for path in row])]
+    blobstore.discard_files(files)
+
+
+def delete_events(event_ids):
+    """
+    Delete events with their crews, assignments, shifts, expenses, notes and documents
+    using a fixed number of statements however big they are. Files go once the caller commits.
+
+    :return: {table name: rows deleted}
+    """
+    rows = event_rows(event_ids)
+    _release_files(rows)
+    return delete_rows(rows)
+
+
+def delete_crews(crew_ids):
+    """Delete crews with their assignments, the shifts worked on them and pending offer digests."""
+    assignments = select(CrewAssignment.id).where(CrewAssignment.crew_id.in_(crew_ids))
+    return delete_rows({
+        'offer_notification': OfferNotification.crew_assignment_id.in_(assignments),
+        'shift': Shift.crew_assignment_id.in_(assignments),
+        'crew_assignment': CrewAssignment.crew_id.in_(crew_ids),
+        'crew': Crew.id.in_(crew_ids),
+    })
+
+
+def event_size(event_id):
+    """Rows hanging off an event's crews; cheap, as it only counts through indexes."""
+    crews = select(Crew.id).where(Crew.event_id == event_id)
+    return db.session.execute(select(func.count()).select_from(union_all(
+        crews,
+        select(CrewAssignment.id).where(CrewAssignment.crew_id.in_(crews)),
+    ).subquery())).scalar()
+
+
+def request_purge(event):
+    """Hide an event at once and leave deleting it to `flask events purge`."""
+    event.active = False
+    event.purge_requested_at = datetime.utcnow()
+
+
+def delete_event(event, background=False):
+    """
+    Delete an event now, or hide it and leave it to `flask events purge` when
+    asked to or when it is too big to delete within one request.
+
+    :return: True if the event was left for the background purge.
+    """
+    if background or event_size(event.id) > current_app.config['EVENT_PURGE_THRESHOLD']:
+        request_purge(event)
+        return True
+    delete_events([event.id])
+    return False
+
+
+def purge_pending(batch_size):
+    """
+    Delete one slice of the oldest event waiting to be purged and commit.
+
+    Crews go `batch_size` at a time so no transaction holds locks on a huge
+    event for long; the last slice deletes the event and its remaining rows.
+
+    :return: The id of the event worked on, or None if nothing is waiting.
+    """
+    event_id = db.session.execute(select(Event.id).where(Event.purge_requested_at.isnot(None)).order_by(
+        Event.purge_requested_at).limit(1)).scalar()
+    if event_id is None:
+        return None
+    crew_ids = db.session.execute(select(Crew.id).where(Crew.event_id == event_id).limit(batch_size)).scalars().all()
+    if len(crew_ids) == batch_size:
+        delete_crews(crew_ids)
+    else:
+        delete_events([event_id])
+        logger.info('Purged event %s', event_id)
+    db.session.commit()
+    return event_id
+
+
+@click.group('events')
+def events_cli():
+    """Delete events in bulk."""
+
+
+@events_cli.command('delete')
+@click.argument('event_ids', type=int, nargs=-1, required=True)
+@click.option('--background', is_flag=True, help='Only mark the events; `flask events purge` deletes them.')
+@with_appcontext
+def delete_command(event_ids, background):
+    """Delete events and everything that belongs to them."""
+    if background:
+        for event in Event.query.filter(Event.id.in_(event_ids)):
+            request_purge(event)
+        db.session.commit()
+        click.echo(f'Marked {len(event_ids)} events for purging.')
+        return
+    deleted = delete_events(list(event_ids))
+    db.session.commit()
+    click.echo('Deleted ' + ', '.join(f'{count} {name} rows' for name, count in deleted.items() if count))
+
+
+@events_cli.command('purge')
+@click.option('--batch-size', type=int, default=None, help='Crews deleted per transaction (default EVENT_PURGE_BATCH_SIZE).')
+@click.option('--poll-interval', type=float, default=None,
+              help='Keep running, sleeping this many seconds when nothing is waiting.')
+@with_appcontext
+def purge_command(batch_size, poll_interval):
+    """Finish deleting events marked for a background purge."""
+    batch_size = batch_size or current_app.config['EVENT_PURGE_BATCH_SIZE']
+    while True:
+        try:
+            event_id = purge_pending(batch_size)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Purge batch failed: %s', e)
+            event_id = None
+            if poll_interval is None:
+                raise
+        if event_id is None:
+            if poll_interval is None:
+                break
+            time.sleep(poll_interval)
+    click.echo('No events left to purge.')
+
+
+def register_commands(app):
+    app.cli.add_command(events_cli)
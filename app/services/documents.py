@@ -0,0 +1,225 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, and_
+from app import db
+from app.models import Document
+from .blobstore import upload_dir
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+OFFICE_EXTENSIONS = {'.docx', '.xlsx', '.doc', '.xls', '.pptx'}
+# Text is stored for search; anything past this is not worth indexing.
+MAX_TEXT_CHARS = 200_000
+
+
+# --- Runs in the process pool: plain files in, plain dict out, no app or DB. ---
+
+def _to_pdf(source, output_dir):
+    ext = os.path.splitext(source)[1].lower()
+    target = os.path.join(output_dir, 'document.pdf')
+    if ext == '.pdf':
+        shutil.copyfile(source, target)
+    elif ext in IMAGE_EXTENSIONS:
+        from PIL import Image, ImageOps
+        with Image.open(source) as image:
+            ImageOps.exif_transpose(image).convert('RGB').save(target, 'PDF', resolution=150)
+    elif ext in OFFICE_EXTENSIONS and shutil.which('soffice'):
+        with tempfile.TemporaryDirectory() as workdir:
+            subprocess.run(['soffice', '--headless', '--convert-to', 'pdf', '--outdir', workdir, source],
+                           check=True, capture_output=True, timeout=180,
+                           env={**os.environ, 'HOME': workdir})
+            converted = os.path.join(workdir, os.path.splitext(os.path.basename(source))[0] + '.pdf')
+            shutil.move(converted, target)
+    else:
+        return None
+    return target
+
+
+def _stamp(pdf_path, metadata):
+    """Write event metadata into the PDF and annotate the first page with the show it belongs to."""
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.annotations import FreeText
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter(clone_from=reader)
+    writer.add_metadata({
+        '/Title': metadata['name'],
+        '/Subject': f"{metadata['show_name']} (show {metadata['show_number']})",
+        '/Keywords': f"showbase event:{metadata['event_id']} show:{metadata['show_number']}",
+    })
+    if writer.pages:
+        box = writer.pages[0].mediabox
+        label = f"Show {metadata['show_number']}: {metadata['show_name']}"
+        writer.add_annotation(page_number=0, annotation=FreeText(
+            text=label, rect=(box.left + 12, box.top - 26, box.left + 12 + 6 * len(label), box.top - 10),
+            font_size='9pt', border_color=None, background_color='ffffcc'))
+    with open(pdf_path, 'wb') as f:
+        writer.write(f)
+    return len(reader.pages), '\n'.join((page.extract_text() or '') for page in reader.pages)[:MAX_TEXT_CHARS]
+
+
+def _thumbnail(source, pdf_path, output_dir, size):
+    target = os.path.join(output_dir, 'thumbnail.png')
+    if os.path.splitext(source)[1].lower() in IMAGE_EXTENSIONS:
+        from PIL import Image, ImageOps
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            image.save(target, 'PNG')
+        return target
+    if pdf_path and shutil.which('pdftoppm'):
+        subprocess.run(['pdftoppm', '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(size),
+                        pdf_path, target[:-len('.png')]], check=True, capture_output=True, timeout=60)
+        return target
+    return None
+
+
+def process_file(source, output_dir, metadata, thumbnail_size=320):
+    """
+    Convert `source` to PDF, stamp it with event metadata, render a first-page
+    thumbnail and extract its text. Safe to run in a worker process.
+
+    :return: dict with absolute 'pdf_path' and 'thumbnail_path' (or None),
+             'page_count' and 'text'.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pdf_path = _to_pdf(source, output_dir)
+    page_count, text = _stamp(pdf_path, metadata) if pdf_path else (None, None)
+    return {
+        'pdf_path': pdf_path,
+        'thumbnail_path': _thumbnail(source, pdf_path, output_dir, thumbnail_size),
+        'page_count': page_count,
+        'text': text,
+    }
+
+
+# --- Runs in the worker's main process. ---
+
+def _claim(limit, failed_before=None):
+    """
+    Mark up to `limit` documents as processing and return them.
+
+    :param failed_before: Also claim documents that failed before this time.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config['DOCUMENT_PROCESSING_TIMEOUT'])
+    statuses = [Document.status == 'pending',
+                and_(Document.status == 'processing', Document.updated_at < stale)]
+    if failed_before:
+        statuses.append(and_(Document.status == 'failed', Document.updated_at < failed_before))
+    query = Document.query.filter(or_(*statuses)).order_by(Document.id).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+    documents = query.all()
+    for document in documents:
+        document.status = 'processing'
+    db.session.commit()
+    return documents
+
+
+def _job(document):
+    uploads = upload_dir()
+    event = document.event
+    metadata = {'name': document.name, 'event_id': document.event_id,
+                'show_name': event.show_name, 'show_number': event.show_number}
+    return (os.path.join(uploads, document.path), os.path.join(uploads, 'derived', str(document.id)),
+            metadata, current_app.config['DOCUMENT_THUMBNAIL_SIZE'])
+
+
+def process_pending(executor, limit=None, failed_before=None):
+    """
+    Run one batch of pending documents through `executor`.
+
+    :param failed_before: Also retry documents that failed before this time.
+    :return: (processed, failed) counts.
+    """
+    documents = _claim(limit or current_app.config['DOCUMENT_BATCH_SIZE'], failed_before)
+    futures = {executor.submit(process_file, *_job(document)): document.id for document in documents}
+    uploads = upload_dir()
+    processed = failed = 0
+    for future in as_completed(futures):
+        document = db.session.get(Document, futures[future])
+        if document is None:
+            continue  # deleted while it was being processed
+        try:
+            result = future.result()
+        except Exception as e:
+            document.status = 'failed'
+            document.processing_error = str(e)
+            failed += 1
+            logger.warning('Processing document %s failed: %s', document.id, e)
+        else:
+            document.status = 'ready'
+            document.pdf_path = result['pdf_path'] and os.path.relpath(result['pdf_path'], uploads)
+            document.thumbnail_path = result['thumbnail_path'] and os.path.relpath(result['thumbnail_path'], uploads)
+            document.page_count = result['page_count']
+            document.text_content = result['text']
+            document.processing_error = None
+            processed += 1
+        document.processed_at = datetime.utcnow()
+        db.session.commit()
+    return processed, failed
+
+
+def make_executor(workers=None):
+    return ProcessPoolExecutor(max_workers=workers or current_app.config['DOCUMENT_WORKERS'])
+
+
+@click.group('documents')
+def documents_cli():
+    """Background processing for uploaded event documents."""
+
+
+@documents_cli.command('process')
+@click.option('--retry-failed', is_flag=True, help='Also reprocess documents that failed before.')
+@click.option('--workers', type=int, default=None)
+@with_appcontext
+def process_command(retry_failed, workers):
+    """Process every pending document, then exit."""
+    total_processed = total_failed = 0
+    # Documents that fail again are stamped after this, so each is retried once.
+    failed_before = datetime.utcnow() if retry_failed else None
+    with make_executor(workers) as executor:
+        while True:
+            processed, failed = process_pending(executor, failed_before=failed_before)
+            total_processed += processed
+            total_failed += failed
+            if not processed and not failed:
+                break
+    click.echo(f'Processed {total_processed}, failed {total_failed}.')
+
+
+@documents_cli.command('worker')
+@click.option('--workers', type=int, default=None)
+@click.option('--poll-interval', type=float, default=None, help='Seconds to sleep when nothing is pending.')
+@with_appcontext
+def worker_command(workers, poll_interval):
+    """Process uploads and receipts continuously (the Procfile `docworker` process)."""
+    from .receipts import process_pending as process_receipts
+    poll_interval = poll_interval or current_app.config['DOCUMENT_POLL_INTERVAL']
+    logger.info('Document worker started')
+    with make_executor(workers) as executor:
+        while True:
+            try:
+                processed, failed = process_pending(executor)
+                receipts_processed, receipts_failed = process_receipts(executor)
+                processed += receipts_processed
+                failed += receipts_failed
+            except Exception as e:
+                db.session.rollback()
+                logger.exception('Document processing batch failed: %s', e)
+                processed = failed = 0
+            if not processed and not failed:
+                time.sleep(poll_interval)
+
+
+def register_commands(app):
+    app.cli.add_command(documents_cli)
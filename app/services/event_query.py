@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from flask import url_for
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Event, Crew
+from app.utils import account_manager_choices, location_choices
+import logging
+
+logger = logging.getLogger(__name__)
+
+PER_PAGE = 50
+MAX_PER_PAGE = 200
+FILTERS = ('active', 'account_manager_id', 'location_id', 'crews_from', 'crews_to', 'prefix')
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(args):
+    """
+    Read event filters from query string arguments; unknown or malformed values are ignored.
+
+    :param args: e.g. request.args, with any of active=yes|no, account_manager_id, location_id,
+        crews_from and crews_to (YYYY-MM-DD, inclusive) and prefix.
+    :return: dict of the filters that were set.
+    """
+    active = {'yes': True, 'true': True, '1': True, 'no': False, 'false': False, '0': False}.get(
+        (args.get('active') or '').lower())
+    filters = {
+        'active': active,
+        'account_manager_id': args.get('account_manager_id', type=int),
+        'location_id': args.get('location_id', type=int),
+        'crews_from': _date(args.get('crews_from')),
+        'crews_to': _date(args.get('crews_to')),
+        'prefix': (args.get('prefix') or '').strip(),
+    }
+    return {name: value for name, value in filters.items() if value is not None and value != ''}
+
+
+def _prefix_condition(prefix):
+    lowered = prefix.lower()
+    escaped = lowered.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    name = func.lower(Event.show_name)
+    condition = name.like(escaped + '%', escape='\\')
+    if db.engine.dialect.name != 'postgresql':
+        # SQLite only turns LIKE into an index range on NOCASE columns; spell the range out.
+        condition = condition & (name >= lowered) & (name < lowered[:-1] + chr(ord(lowered[-1]) + 1))
+    if prefix.isdigit():
+        return or_(Event.show_number == int(prefix), condition)
+    return condition
+
+
+def filtered_events(filters):
+    """Event query narrowed down by the filters from parse_filters(), unordered."""
+    # Events waiting for a background purge are already gone as far as users are concerned.
+    query = Event.query.filter(Event.purge_requested_at.is_(None))
+    if 'active' in filters:
+        query = query.filter(Event.active == filters['active'])
+    if 'account_manager_id' in filters:
+        query = query.filter(Event.account_manager_id == filters['account_manager_id'])
+    if 'location_id' in filters:
+        query = query.filter(Event.location_id == filters['location_id'])
+    if 'crews_from' in filters or 'crews_to' in filters:
+        # Events with at least one crew starting in the range, found through ix_crew_start_time.
+        crews = select(Crew.event_id)
+        if 'crews_from' in filters:
+            crews = crews.where(Crew.start_time >= filters['crews_from'])
+        if 'crews_to' in filters:
+            crews = crews.where(Crew.start_time < filters['crews_to'] + timedelta(days=1))
+        query = query.filter(Event.id.in_(crews))
+    if filters.get('prefix'):
+        query = query.filter(_prefix_condition(filters['prefix']))
+    return query
+
+
+def page_events(filters, after=None, before=None, per_page=PER_PAGE, descending=True):
+    """
+    One page of filtered events, keyset-paginated on show number so every page costs the same.
+
+    :param after: Show number the page starts after (the previous page's 'next').
+    :param before: Show number the page ends before (the next page's 'previous').
+    :param descending: Newest shows first.
+    :return: dict with 'events', and 'next' / 'previous' cursors or None at either end.
+    """
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    forward = before is None
+    query = filtered_events(filters).options(joinedload(Event.account_manager), joinedload(Event.location))
+    if after is not None:
+        query = query.filter(Event.show_number < after if descending else Event.show_number > after)
+    if before is not None:
+        query = query.filter(Event.show_number > before if descending else Event.show_number < before)
+    # Paging backwards walks the index the other way and flips the page afterwards.
+    order = Event.show_number.desc() if descending == forward else Event.show_number.asc()
+    events = query.order_by(order).limit(per_page + 1).all()
+    more = len(events) > per_page
+    events = events[:per_page]
+    if not forward:
+        events.reverse()
+    first = events[0].show_number if events else None
+    last = events[-1].show_number if events else None
+    if forward:
+        return {'events': events, 'next': last if more else None,
+                'previous': first if after is not None else None, 'per_page': per_page}
+    return {'events': events, 'next': last, 'previous': first if more else None, 'per_page': per_page}
+
+
+def page_args(args):
+    """The page arguments of page_events() from the query string."""
+    return {
+        'after': args.get('after', type=int),
+        'before': args.get('before', type=int),
+        'per_page': args.get('per_page', PER_PAGE, type=int),
+    }
+
+
+def listing(args):
+    """Template context for an event list page: one page plus the filter form's values and choices."""
+    context = page_events(parse_filters(args), **page_args(args))
+    context['filter_args'] = {name: args[name] for name in FILTERS if args.get(name)}
+    context['account_manager_choices'] = account_manager_choices()
+    context['location_choices'] = location_choices()
+    return context
+
+
+def describe(event):
+    return {
+        'id': event.id,
+        'show_name': event.show_name,
+        'show_number': event.show_number,
+        'active': bool(event.active),
+        'account_manager': {'id': event.account_manager_id, 'name': event.account_manager_name},
+        'location': {'id': event.location_id, 'name': event.location.name},
+        'url': url_for('events.view_event', event_id=event.id),
+    }
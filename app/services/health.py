@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from sqlalchemy import text
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Checks run on a small dedicated pool so a hung connection attempt can be
+# abandoned after HEALTHCHECK_TIMEOUT instead of blocking the request worker.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='healthcheck')
+
+_checks = {}
+
+
+def register_check(name, func):
+    """
+    Register a readiness check.
+
+    :param name: Name reported in the /healthz payload.
+    :param func: Called outside the app context with (app, timeout); returns a
+                 dict of details and raises on failure.
+    """
+    _checks[name] = func
+
+
+def check_database(app, timeout):
+    with app.app_context():
+        engine = db.engine
+    return ping(engine, timeout)
+
+
+def ping(engine, timeout):
+    """Run a trivial query on `engine`, bounded by a server-side statement timeout."""
+    with engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text("SELECT set_config('statement_timeout', :ms, true)"), {'ms': str(int(timeout * 1000))})
+        conn.execute(text('SELECT 1'))
+    return {'pool': engine.pool.status()}
+
+
+register_check('database', check_database)
+
+
+def run_checks(timeout=None):
+    """Run every registered check with a hard deadline; returns (healthy, report)."""
+    app = current_app._get_current_object()
+    timeout = timeout or app.config.get('HEALTHCHECK_TIMEOUT', 2.0)
+    report = {}
+    healthy = True
+    for name, func in _checks.items():
+        started = time.perf_counter()
+        future = _executor.submit(func, app, timeout)
+        try:
+            details = future.result(timeout=timeout)
+            report[name] = {'status': 'ok', **(details or {})}
+        except FutureTimeoutError:
+            healthy = False
+            report[name] = {'status': 'timeout'}
+        except Exception as e:
+            healthy = False
+            report[name] = {'status': 'error', 'error': str(e)}
+            logger.warning('Health check %s failed: %s', name, e)
+        report[name]['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return healthy, report
@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, inspect
+from app import cache
+from app.models import CrewAssignment, Crew, Event, Expense, Shift
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Change events go into the shared cache backend as a numbered log, so every
+# gunicorn worker on the host (or every host, with Redis) streams the same
+# sequence. Each entry is a small dict; clients fetch whatever else they need.
+
+
+def _assignment(row, status=None):
+    return {'type': 'assignment', 'id': row.id, 'crew_id': row.crew_id, 'worker_id': row.worker_id,
+            'role': row.role, 'status': status or row.status}
+
+
+def _describe(obj, status=None):
+    if isinstance(obj, CrewAssignment):
+        return _assignment(obj, status)
+    if isinstance(obj, Crew):
+        return {'type': 'crew', 'id': obj.id, 'event_id': obj.event_id}
+    if isinstance(obj, Event):
+        return {'type': 'event', 'id': obj.id, 'active': bool(obj.active)}
+    if isinstance(obj, Expense):
+        return {'type': 'expense', 'id': obj.id, 'worker_id': obj.worker_id, 'show_number': obj.show_number}
+    if isinstance(obj, Shift):
+        return {'type': 'shift', 'id': obj.id, 'worker_id': obj.worker_id}
+    return None
+
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+def init_app(app, db):
+    # Open /live/events streams in this process; see LIVE_MAX_STREAMS.
+    app.extensions['live'] = threading.BoundedSemaphore(app.config['LIVE_MAX_STREAMS'])
+
+    @event.listens_for(db.session, 'after_flush')
+    def collect_changes(session, flush_context):
+        pending = session.info.setdefault('live_events', [])
+        for obj in session.new:
+            if not isinstance(obj, Event):
+                pending.append(_describe(obj))
+        for obj in session.dirty:
+            if (isinstance(obj, CrewAssignment) and _changed(obj, 'status')) or (
+                    isinstance(obj, Event) and _changed(obj, 'active')):
+                pending.append(_describe(obj))
+        for obj in session.deleted:
+            if isinstance(obj, CrewAssignment):
+                pending.append(_describe(obj, status='revoked'))
+        session.info['live_events'] = [item for item in pending if item is not None]
+
+    @event.listens_for(db.session, 'after_commit')
+    def publish_changes(session):
+        for item in session.info.pop('live_events', None) or ():
+            publish(item)
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def discard_changes(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop('live_events', None)
+
+
+def _key(number):
+    return f'{cache.prefix}:live:{number}'
+
+
+def queue_assignments(session, rows):
+    """
+    Publish status changes made with bulk UPDATEs, which the flush hooks never see,
+    once `session` commits.
+
+    :param rows: CrewAssignments or rows with id, crew_id, worker_id, role and status.
+    """
+    session.info.setdefault('live_events', []).extend(_assignment(row) for row in rows)
+
+
+def publish(item):
+    try:
+        number = cache.backend.incr(f'{cache.prefix}:live:seq')
+        cache.backend.set(_key(number), item, current_app.config['LIVE_EVENT_TTL'])
+    except Exception as e:
+        # Live updates are a convenience; the change itself is already committed.
+        logger.warning('Could not publish live event %s: %s', item, e)
+
+
+def latest():
+    return cache.backend.get_counter(f'{cache.prefix}:live:seq')
+
+
+def read(after, last, limit=500):
+    """
+    Entries numbered after `after` up to `last`.
+
+    :return: list of (number, item); item is None for an entry not written yet or expired.
+    """
+    return [(number, cache.backend.get(_key(number))) for number in range(after + 1, min(last, after + limit) + 1)]
+
+
+def visible(item, user):
+    """
+    Whether a user may see a change event.
+
+    :param user: dict with 'id', 'is_admin' and 'is_account_manager'.
+    """
+    if user['is_admin']:
+        return True
+    if item['type'] in ('assignment', 'expense', 'shift'):
+        return item['worker_id'] == user['id']
+    return user['is_account_manager']
+
+
+def _message(number, item):
+    return f"id: {number}\nevent: {item['type']}\ndata: {json.dumps(item, separators=(',', ':'))}\n\n"
+
+
+def stream(user, last_id, config):
+    """
+    Server-sent events for one client: the visible change events after `last_id`,
+    then new ones as they are published, until LIVE_STREAM_SECONDS have passed.
+    The browser reconnects on its own and resumes from the last id it saw.
+
+    Runs without a database connection; `user` is captured before streaming starts.
+    """
+    deadline = time.monotonic() + config['LIVE_STREAM_SECONDS']
+    newest = latest()
+    cursor = last_id if last_id is not None and last_id <= newest else newest
+    yield f"retry: {int(config['LIVE_RETRY_MILLISECONDS'])}\n\n"
+    if last_id is not None and newest - last_id > config['LIVE_BACKLOG']:
+        # Too far behind to catch up event by event; the page should reload its data.
+        yield f'id: {newest}\nevent: reset\ndata: {{}}\n\n'
+        cursor = newest
+    gap_since, heartbeat = None, time.monotonic()
+    while time.monotonic() < deadline:
+        for number, item in read(cursor, latest()):
+            if item is None:
+                # Numbered but not written yet (or already expired): give the writer a moment, then skip it.
+                gap_since = gap_since or time.monotonic()
+                if time.monotonic() - gap_since < config['LIVE_POLL_INTERVAL'] * 3:
+                    break
+            gap_since = None
+            cursor = number
+            if item is not None and visible(item, user):
+                heartbeat = time.monotonic()
+                yield _message(number, item)
+        if time.monotonic() - heartbeat >= config['LIVE_HEARTBEAT_SECONDS']:
+            heartbeat = time.monotonic()
+            yield ': keep-alive\n\n'
+        time.sleep(config['LIVE_POLL_INTERVAL'])
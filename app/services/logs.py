@@ -0,0 +1,114 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from flask.logging import default_handler
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through at most `rate` records per `period` seconds from each call
+    site at or below `level`; the next record that passes reports how many
+    were dropped.
+    """
+
+    def __init__(self, rate, period=1.0, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self.level = level
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > self.level or not self.rate:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed and isinstance(record.args, tuple):
+                    # Without args the message is never %-formatted, so a literal % in it
+                    # must be escaped once the count turns it into a format string.
+                    msg = str(record.msg) if record.args else str(record.msg).replace('%', '%%')
+                    record.msg = f'{msg} (%d similar messages suppressed)'
+                    record.args = record.args + (suppressed,)
+                return True
+            if window[1] < self.rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def parse_levels(spec):
+    """Parse 'app=INFO,sqlalchemy.engine=WARNING' into {logger name: level}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+# Records are queued by the request thread and formatted and written by a
+# listener thread, so slow stream writes never block a request.
+_queue_handler = None
+_listener = None
+
+
+def _start_listener(handlers):
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child():
+    # Threads do not survive fork (gunicorn preloads the app in the master),
+    # so each worker starts its own listener on a fresh queue.
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(_stop_listener)
+
+
+def configure_logging(app):
+    """
+    Route all logging through one queue-backed root handler.
+
+    :param app: Reads LOG_LEVEL (root), LOG_LEVELS (per-logger overrides),
+                LOG_FORMAT and LOG_SAMPLE_RATE (max DEBUG records per second
+                from one call site; 0 disables sampling).
+    """
+    global _queue_handler
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        _stop_listener()
+        root.removeHandler(_queue_handler)
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(app.config.get('LOG_FORMAT')))
+    _queue_handler = QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(SamplingFilter(app.config.get('LOG_SAMPLE_RATE', 0)))
+    _start_listener([stream_handler])
+
+    root.addHandler(_queue_handler)
+    root.setLevel(app.config.get('LOG_LEVEL', 'WARNING').upper())
+    for name, level in parse_levels(app.config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+    # app.logger propagates to the root handler instead of writing directly.
+    app.logger.removeHandler(default_handler)
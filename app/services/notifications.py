@@ -0,0 +1,125 @@
+import json
+from datetime import datetime, timedelta
+from flask import current_app, url_for, has_request_context
+from itsdangerous import URLSafeTimedSerializer as Serializer
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import CrewAssignment, Crew, OfferNotification, Worker
+from . import outbox
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def init_app(app, db):
+    @event.listens_for(db.session, 'before_flush')
+    def collect_offers(session, flush_context, instances):
+        # Every new offer, whichever route creates it, waits for the next digest.
+        for obj in list(session.new):
+            if isinstance(obj, CrewAssignment) and obj.status in (None, 'offered'):
+                session.add(OfferNotification(crew_assignment=obj))
+
+
+def make_offer_token(assignment):
+    s = Serializer(current_app.config['SECRET_KEY'], salt='offer-response')
+    return s.dumps({'assignment_id': assignment.id, 'worker_id': assignment.worker_id})
+
+
+def load_offer_token(token):
+    """Return the CrewAssignment a signed accept/reject link refers to, or None if invalid or expired."""
+    s = Serializer(current_app.config['SECRET_KEY'], salt='offer-response')
+    try:
+        data = s.loads(token, max_age=current_app.config['OFFER_LINK_MAX_AGE'])
+    except Exception:
+        return None
+    return CrewAssignment.query.filter_by(id=data['assignment_id'], worker_id=data['worker_id']).first()
+
+
+def due_worker_ids(now):
+    """Workers whose offers have been quiet for OFFER_DIGEST_WINDOW, or waiting longer than OFFER_DIGEST_MAX_DELAY."""
+    window = timedelta(seconds=current_app.config['OFFER_DIGEST_WINDOW'])
+    max_delay = timedelta(seconds=current_app.config['OFFER_DIGEST_MAX_DELAY'])
+    rows = db.session.query(CrewAssignment.worker_id).join(
+        OfferNotification, OfferNotification.crew_assignment_id == CrewAssignment.id
+    ).group_by(CrewAssignment.worker_id).having(or_(
+        func.max(OfferNotification.created_at) <= now - window,
+        func.min(OfferNotification.created_at) <= now - max_delay
+    )).all()
+    return [worker_id for worker_id, in rows]
+
+
+def _digest_payload(worker, offers):
+    return {
+        'worker': {'id': worker.id, 'name': f'{worker.first_name} {worker.last_name}', 'email': worker.email},
+        'offers': [{
+            'assignment_id': offer.id,
+            'event': offer.assigned_crew.event.show_name,
+            'role': offer.role,
+            'start': offer.assigned_crew.start_time.isoformat(),
+            'end': offer.assigned_crew.end_time.isoformat(),
+            'accept_url': url_for('base.respond_offer', token=make_offer_token(offer), action='accept', _external=True),
+            'reject_url': url_for('base.respond_offer', token=make_offer_token(offer), action='reject', _external=True),
+        } for offer in offers],
+    }
+
+
+def _digest_body(payload):
+    lines = [f"Hi {payload['worker']['name']},", '', 'You have the following open shift offers:', '']
+    for offer in payload['offers']:
+        lines += [
+            f"{offer['event']} - {offer['role']}, {offer['start']} to {offer['end']}",
+            f"  Accept: {offer['accept_url']}",
+            f"  Reject: {offer['reject_url']}",
+            '',
+        ]
+    return '\n'.join(lines)
+
+
+def _enqueue_digest(worker, offers):
+    payload = _digest_payload(worker, offers)
+    subject = f'{len(offers)} shift offer{"s" if len(offers) != 1 else ""} waiting for you'
+    if current_app.config['OFFER_DIGEST_CHANNEL'] == 'webhook':
+        outbox.enqueue(current_app.config['OFFER_DIGEST_WEBHOOK_URL'], subject, json.dumps(payload),
+                       kind='offer_digest', channel='webhook')
+    else:
+        outbox.enqueue(worker.email, subject, _digest_body(payload), kind='offer_digest')
+
+
+def flush_digests(now=None):
+    """
+    Turn every due worker's collected offers into one digest in the outbox.
+
+    :return: Number of digests queued.
+    """
+    if not has_request_context():
+        # Digest links are absolute; build them against the public URL.
+        with current_app.test_request_context(base_url=current_app.config['EXTERNAL_URL']):
+            return flush_digests(now)
+
+    now = now or datetime.utcnow()
+    queued = 0
+    for worker_id in due_worker_ids(now):
+        notifications = OfferNotification.query.join(CrewAssignment).filter(CrewAssignment.worker_id == worker_id)
+        if db.engine.dialect.name == 'postgresql':
+            notifications = notifications.with_for_update(of=OfferNotification, skip_locked=True)
+        notifications = notifications.all()
+        if not notifications:
+            continue
+        # List everything still open for the worker, not just the new offers.
+        offers = CrewAssignment.query.join(Crew, CrewAssignment.crew_id == Crew.id).options(
+            joinedload(CrewAssignment.assigned_crew).joinedload(Crew.event)
+        ).filter(
+            CrewAssignment.worker_id == worker_id,
+            CrewAssignment.status == 'offered',
+            Crew.start_time >= now
+        ).order_by(Crew.start_time).all()
+        if offers:
+            _enqueue_digest(Worker.query.get(worker_id), offers)
+            queued += 1
+        for notification in notifications:
+            db.session.delete(notification)
+    db.session.commit()
+    if queued:
+        logger.info('Queued %s offer digests', queued)
+    return queued
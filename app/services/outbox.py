@@ -0,0 +1,189 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_mail import Message
+from app import db, mail
+from app.models import OutboxMessage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(recipient, subject, body, kind='email', channel='email'):
+    """
+    Add a message to the outbox in the caller's transaction; it is only sent
+    once that transaction commits.
+
+    :param recipient: Destination address, or URL for the 'webhook' channel.
+    :param body: Plain-text email body, or a JSON document for 'webhook'.
+    :param kind: Short label used for filtering and metrics, e.g. 'password_reset'.
+    :param channel: 'email' or 'webhook'.
+    """
+    message = OutboxMessage(kind=kind, channel=channel, recipient=recipient, subject=subject, body=body)
+    db.session.add(message)
+    return message
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, doubling up to OUTBOX_RETRY_MAX_SECONDS."""
+    base = current_app.config['OUTBOX_RETRY_BASE_SECONDS']
+    return min(base * 2 ** (attempts - 1), current_app.config['OUTBOX_RETRY_MAX_SECONDS'])
+
+
+def _claim(batch_size):
+    query = OutboxMessage.query.filter(
+        OutboxMessage.status == 'pending',
+        OutboxMessage.available_at <= datetime.utcnow()
+    ).order_by(OutboxMessage.id).limit(batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        # Several workers can drain concurrently without sending a row twice.
+        query = query.with_for_update(skip_locked=True)
+    return query.all()
+
+
+def _fail(message, error):
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+        message.status = 'failed'
+        logger.error('Giving up on outbox message %s to %s: %s', message.id, message.recipient, error)
+    else:
+        message.available_at = datetime.utcnow() + timedelta(seconds=backoff(message.attempts))
+        logger.warning('Outbox message %s failed (attempt %s), retrying: %s', message.id, message.attempts, error)
+
+
+@contextmanager
+def smtp_transport():
+    """Yield a send(message) callable that reuses one SMTP connection."""
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    with mail.connect() as conn:
+        yield lambda message: conn.send(
+            Message(message.subject, sender=sender, recipients=[message.recipient], body=message.body))
+
+
+@contextmanager
+def webhook_transport():
+    """Yield a send(message) callable that POSTs JSON bodies over one keep-alive connection per host."""
+    connections = {}
+
+    def send(message):
+        url = urlsplit(message.recipient)
+        key = (url.scheme, url.netloc)
+        if key not in connections:
+            connection_class = HTTPSConnection if url.scheme == 'https' else HTTPConnection
+            connections[key] = connection_class(url.netloc, timeout=10)
+        try:
+            connections[key].request('POST', url.path + (f'?{url.query}' if url.query else ''),
+                                     body=message.body.encode(), headers={'Content-Type': 'application/json'})
+            response = connections[key].getresponse()
+            response.read()
+        except Exception:
+            connections.pop(key).close()
+            raise
+        if response.status >= 400:
+            raise RuntimeError(f'{message.recipient} returned HTTP {response.status}')
+
+    try:
+        yield send
+    finally:
+        for connection in connections.values():
+            connection.close()
+
+
+TRANSPORTS = {'email': smtp_transport, 'webhook': webhook_transport}
+
+
+def _deliver(messages, transport):
+    handled = set()
+    sent = failed = 0
+    try:
+        with transport() as send:
+            for message in messages:
+                handled.add(message.id)
+                try:
+                    send(message)
+                except Exception as e:
+                    _fail(message, e)
+                    failed += 1
+                    continue
+                message.status = 'sent'
+                message.sent_at = datetime.utcnow()
+                sent += 1
+    except Exception as e:
+        # Could not open (or lost) the connection; retry whatever was not attempted.
+        for message in messages:
+            if message.id not in handled:
+                _fail(message, e)
+                failed += 1
+    return sent, failed
+
+
+def drain(batch_size=None):
+    """
+    Send one batch of due messages, one connection per channel.
+
+    :return: (sent, failed) counts for the batch.
+    """
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    messages = _claim(batch_size)
+    sent = failed = 0
+    for channel, transport in TRANSPORTS.items():
+        batch = [message for message in messages if message.channel == channel]
+        if batch:
+            channel_sent, channel_failed = _deliver(batch, transport)
+            sent += channel_sent
+            failed += channel_failed
+    db.session.commit()
+    return sent, failed
+
+
+@click.group('outbox')
+def outbox_cli():
+    """Send queued emails and webhooks. Try email against a local sink with
+    `python -m aiosmtpd -n -l localhost:1025` and MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false."""
+
+
+@outbox_cli.command('drain')
+@click.option('--batch-size', type=int, default=None)
+@with_appcontext
+def drain_command(batch_size):
+    """Send everything currently due, then exit."""
+    from .notifications import flush_digests
+    flush_digests()
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = drain(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if not sent and not failed:
+            break
+    click.echo(f'Sent {total_sent}, failed {total_failed}.')
+
+
+@outbox_cli.command('worker')
+@click.option('--poll-interval', type=float, default=None, help='Seconds to sleep when the outbox is empty.')
+@with_appcontext
+def worker_command(poll_interval):
+    """Drain the outbox continuously (the Procfile `worker` process)."""
+    from .notifications import flush_digests
+    poll_interval = poll_interval or current_app.config['OUTBOX_POLL_INTERVAL']
+    logger.info('Outbox worker started')
+    while True:
+        try:
+            flush_digests()
+            sent, failed = drain()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Outbox drain failed: %s', e)
+            sent = failed = 0
+        if not sent and not failed:
+            time.sleep(poll_interval)
+
+
+def register_commands(app):
+    app.cli.add_command(outbox_cli)
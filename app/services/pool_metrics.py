@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A checkout slower than this counts as having waited for a free connection.
+CONTENDED_WAIT_MS = 10
+# How often a worker republishes its snapshot to the shared cache.
+PUBLISH_INTERVAL = 5
+
+
+class PoolStats:
+    """Per-process counters for one connection pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.contended_checkouts = 0
+        self.overflow_checkouts = 0
+        self.peak_checked_out = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.started_at = time.time()
+
+    def incr(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_checkout(self, wait_ms, checked_out, pool_size):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if wait_ms >= CONTENDED_WAIT_MS:
+                self.contended_checkouts += 1
+            if checked_out > pool_size:
+                self.overflow_checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def snapshot(self, pool):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'pool_size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'timeouts': self.timeouts,
+                'contended_checkouts': self.contended_checkouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'peak_checked_out': self.peak_checked_out,
+                'avg_wait_ms': round(self.total_wait_ms / self.checkouts, 2) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 2),
+                'uptime_s': round(time.time() - self.started_at),
+            }
+
+
+# Stats are keyed by the pool's connection creator, which survives
+# engine.dispose() recreating the pool, so counters are not reset by it.
+_stats = {}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that counts pool events and times how long each checkout waits."""
+
+    def __init__(self, creator, *args, **kwargs):
+        recreated = '_dispatch' in kwargs
+        super().__init__(creator, *args, **kwargs)
+        self.stats = _stats.setdefault(creator, PoolStats())
+        if not recreated:
+            # A recreated pool copies these listeners from its predecessor.
+            stats = self.stats
+            event.listen(self, 'connect', lambda *args: stats.incr('connects'))
+            event.listen(self, 'invalidate', lambda *args: stats.incr('invalidations'))
+            event.listen(self, 'soft_invalidate', lambda *args: stats.incr('soft_invalidations'))
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.incr('timeouts')
+            logger.warning('Timed out waiting for a pooled connection: %s', self.status())
+            raise
+        self.stats.record_checkout((time.perf_counter() - started) * 1000, self.checkedout(), self.size())
+        return record
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self.stats.incr('checkins')
+        _maybe_publish(self)
+
+
+_last_published = {}
+
+
+def _maybe_publish(pool):
+    """Share this worker's snapshot so the metrics page can show every worker."""
+    now = time.time()
+    if now - _last_published.get(id(pool), 0) < PUBLISH_INTERVAL:
+        return
+    _last_published[id(pool)] = now
+    from app import cache
+    if cache.backend is None:
+        return
+    try:
+        cache.backend.set(f'{cache.prefix}:pool_metrics:{os.getpid()}', pool.stats.snapshot(pool), ttl=PUBLISH_INTERVAL * 6)
+        registry_key = f'{cache.prefix}:pool_metrics:pids'
+        pids = set(cache.backend.get(registry_key) or ())
+        if os.getpid() not in pids:
+            cache.backend.set(registry_key, pids | {os.getpid()}, ttl=3600)
+    except Exception as e:
+        logger.warning('Could not publish pool metrics: %s', e)
+
+
+def collect(engine):
+    """Return this worker's live snapshot plus the latest one from every other worker."""
+    from app import cache
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return []
+    _last_published.pop(id(pool), None)
+    _maybe_publish(pool)
+    snapshots = {os.getpid(): pool.stats.snapshot(pool)}
+    for pid in cache.backend.get(f'{cache.prefix}:pool_metrics:pids') or ():
+        if pid not in snapshots:
+            snapshot = cache.backend.get(f'{cache.prefix}:pool_metrics:{pid}')
+            if snapshot:
+                snapshots[pid] = snapshot
+    return sorted(snapshots.values(), key=lambda s: s['pid'])
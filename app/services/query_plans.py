@@ -0,0 +1,200 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, func, text
+from app import db
+from app.models import Worker, Location, Event, Crew, CrewAssignment, Shift, Expense, Note
+from . import event_query
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hot_queries(worker_id, event_id, now):
+    """
+    The queries behind the busiest pages, built the same way as in their views.
+
+    :return: {name: (statement, tables that must be reached through an index)}
+    """
+    period_start = now - timedelta(weeks=2)
+    return {
+        # base.home
+        'home.upcoming_shifts': (select(CrewAssignment).join(Crew).where(
+            CrewAssignment.worker_id == worker_id,
+            CrewAssignment.status.in_(['offered', 'accepted']),
+            Crew.start_time >= now
+        ).order_by(Crew.start_time), {'crew_assignment', 'crew'}),
+        'home.pay_period_shifts': (select(CrewAssignment).join(Crew).where(
+            CrewAssignment.worker_id == worker_id,
+            Crew.start_time >= period_start,
+            Crew.end_time <= now
+        ), {'crew_assignment', 'crew'}),
+        'home.pay_period_expenses': (select(Expense).where(
+            Expense.worker_id == worker_id,
+            Expense.date >= period_start,
+            Expense.date <= now
+        ), {'expense'}),
+        # admin.view_all_shifts
+        'admin.view_all_shifts': (select(CrewAssignment).join(Crew).where(
+            CrewAssignment.status.in_(['offered', 'accepted']),
+            Crew.start_time >= now
+        ).order_by(Crew.start_time), {'crew', 'crew_assignment'}),
+        # misc.timesheet
+        'misc.timesheet': (select(Shift).where(Shift.worker_id == worker_id).order_by(Shift.start), {'shift'}),
+        # utils.get_crew_assignments
+        'get_crew_assignments': (select(Crew, CrewAssignment, Worker).join(
+            CrewAssignment, Crew.id == CrewAssignment.crew_id
+        ).join(
+            Worker, CrewAssignment.worker_id == Worker.id
+        ).where(Crew.event_id == event_id), {'crew', 'crew_assignment', 'worker'}),
+        # events.view_event
+        'events.view_event_notes': (select(Note).where(Note.event_id == event_id), {'note'}),
+        # utils.create_event_report('active')
+        'event_report.active': (event_query.filtered_events({'active': True}).with_entities(
+            Event.id).order_by(Event.show_number.desc()).limit(50).statement, {'event'}),
+        # event_query.page_events, behind every event listing
+        'event_listing.account_manager': (event_query.filtered_events({'account_manager_id': worker_id}).with_entities(
+            Event.id).order_by(Event.show_number.desc()).limit(50).statement, {'event'}),
+        'event_listing.location': (event_query.filtered_events({'location_id': 1}).with_entities(
+            Event.id).order_by(Event.show_number.desc()).limit(50).statement, {'event'}),
+        'event_listing.prefix': (event_query.filtered_events({'prefix': 'plan'}).with_entities(
+            Event.id).order_by(Event.show_number.desc()).limit(50).statement, {'event'}),
+        # Worker.is_available and staffing.check
+        'staffing.double_booking': (select(CrewAssignment.id).where(
+            CrewAssignment.worker_id == worker_id,
+            CrewAssignment.status.in_(['offered', 'accepted']),
+            CrewAssignment.start_time < now + timedelta(hours=8),
+            CrewAssignment.end_time > now
+        ), {'crew_assignment'}),
+    }
+
+
+def explain(conn, statement):
+    """
+    Return the plan of `statement` as a list of (table, uses_index) pairs, one per table access.
+    Walking a whole index just to filter it counts as a scan; walking a partial index does not.
+    """
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if conn.dialect.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if conn.dialect.name == 'postgresql':
+        plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        accesses = []
+
+        def walk(node):
+            if 'Relation Name' in node:
+                searched = 'Index Cond' in node or 'Recheck Cond' in node or 'Filter' not in node
+                accesses.append((node['Relation Name'], node['Node Type'] != 'Seq Scan' and searched))
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return accesses
+    if conn.dialect.name == 'sqlite':
+        partial = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'").scalars())
+        accesses = []
+        for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params):
+            # e.g. "SEARCH crew USING INDEX ix_crew_start_time (start_time>?)" or "SCAN shift"
+            detail = row[-1].split()
+            if detail[0] in ('SCAN', 'SEARCH'):
+                accesses.append((detail[1], detail[0] == 'SEARCH' or bool(partial.intersection(detail))))
+        return accesses
+    raise click.ClickException(f'EXPLAIN is not supported for {conn.dialect.name}')
+
+
+def seed(conn, rows):
+    """Insert `rows` crew assignments' worth of synthetic data in the caller's transaction."""
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.utcnow()
+    # Crews start an hour apart and last six, and go to the workers in turn, so with
+    # at least six workers nobody's assignments overlap (see bookings.py).
+    workers = max(rows // 20, 6)
+    events = max(rows // 10, 2)
+    worker_ids = conn.execute(insert(Worker).returning(Worker.id, sort_by_parameter_order=True), [
+        {'first_name': 'Plan', 'last_name': str(i), 'email': f'plan-{tag}-{i}@example.invalid'} for i in range(workers)
+    ]).scalars().all()
+    location_id = conn.execute(insert(Location).returning(Location.id),
+                               [{'name': f'plan-{tag}', 'address': '-'}]).scalar()
+    show_base = (conn.execute(select(func.max(Event.show_number))).scalar() or 0) + 1
+    event_ids = conn.execute(insert(Event).returning(Event.id, sort_by_parameter_order=True), [
+        {'show_name': f'plan-{tag}', 'show_number': show_base + i, 'account_manager_id': worker_ids[0],
+         'location_id': location_id, 'active': i % 5 == 0} for i in range(events)
+    ]).scalars().all()
+    times = [(now + timedelta(hours=i - rows // 2), now + timedelta(hours=i - rows // 2 + 6)) for i in range(rows)]
+    crew_ids = conn.execute(insert(Crew).returning(Crew.id, sort_by_parameter_order=True), [
+        {'event_id': event_ids[i % events], 'start_time': start, 'end_time': end,
+         'roles': '{}', 'shift_type': 'Show', 'description': '-'}
+        for i, (start, end) in enumerate(times)
+    ]).scalars().all()
+    # Core inserts skip the session hook that copies the crew's times.
+    assignment_ids = conn.execute(insert(CrewAssignment).returning(CrewAssignment.id, sort_by_parameter_order=True), [
+        {'crew_id': crew_id, 'worker_id': worker_ids[i % workers], 'role': 'Audio',
+         'status': ('offered', 'accepted', 'rejected', 'completed')[i % 4],
+         'start_time': times[i][0], 'end_time': times[i][1]}
+        for i, crew_id in enumerate(crew_ids)
+    ]).scalars().all()
+    conn.execute(insert(Shift), [
+        {'start': now + timedelta(hours=i), 'end': now + timedelta(hours=i + 6), 'show_number': show_base + i % events,
+         'account_manager_id': worker_ids[0], 'worker_id': worker_ids[i % workers], 'crew_assignment_id': assignment_id}
+        for i, assignment_id in enumerate(assignment_ids)
+    ])
+    conn.execute(insert(Expense), [
+        {'date': (now - timedelta(days=i % 365)).date(), 'account_manager_id': worker_ids[0],
+         'show_number': show_base + i % events, 'worker_id': worker_ids[i % workers], 'net': 1, 'hst': 0}
+        for i in range(rows)
+    ])
+    conn.execute(insert(Note), [
+        {'content': '-', 'event_id': event_ids[i % events], 'worker_id': worker_ids[0]} for i in range(rows)
+    ])
+    conn.execute(text('ANALYZE'))
+    return worker_ids[0], event_ids[0]
+
+
+@click.group('query-plans')
+def query_plans_cli():
+    """Check that the hot queries stay on their indexes."""
+
+
+@query_plans_cli.command('check')
+@click.option('--seed', 'seed_rows', type=int, default=0,
+              help='Insert this many rows of synthetic data first; it is rolled back afterwards.')
+@click.option('--verbose', is_flag=True, help='Print every table access, not just the failures.')
+@with_appcontext
+def check_command(seed_rows, verbose):
+    """EXPLAIN the hot queries and fail if any of them reads a table sequentially."""
+    failures = []
+    with db.engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            if seed_rows:
+                worker_id, event_id = seed(conn, seed_rows)
+            else:
+                worker_id = conn.execute(select(func.min(Worker.id))).scalar() or 1
+                event_id = conn.execute(select(func.min(Event.id))).scalar() or 1
+            if conn.dialect.name == 'postgresql':
+                # Small tables are cheaper to scan than to index, so the planner would
+                # scan them anyway; this makes a scan mean "no usable index".
+                conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            for name, (statement, indexed_tables) in hot_queries(worker_id, event_id, datetime.utcnow()).items():
+                for table, uses_index in explain(conn, statement):
+                    if verbose:
+                        click.echo(f'{name}: {table} {"index" if uses_index else "SEQUENTIAL SCAN"}')
+                    if table in indexed_tables and not uses_index:
+                        failures.append(f'{name}: sequential scan on {table}')
+        finally:
+            transaction.rollback()
+    for failure in failures:
+        click.echo(failure, err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo('All hot queries use indexes.')
+
+
+def register_commands(app):
+    app.cli.add_command(query_plans_cli)
@@ -0,0 +1,172 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, and_
+from app import db
+from app.models import Expense
+from . import blobstore
+from .documents import make_executor
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
+
+
+# --- Runs in the process pool: plain files in, plain dict out, no app or DB. ---
+
+def normalize_receipt(source, output_dir, display_size=1600, thumbnail_size=160, quality=80):
+    """
+    Make an upright, downscaled JPEG of a receipt photo and a small thumbnail.
+    Re-encoding drops EXIF, including the GPS position phones record.
+
+    :return: dict with absolute 'display_path' (None when the original is
+             already smaller, or is a PDF) and 'thumbnail_path' (or None).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    display_path = os.path.join(output_dir, 'display.jpg')
+    thumbnail_path = os.path.join(output_dir, 'thumbnail.jpg')
+    if os.path.splitext(source)[1].lower() in IMAGE_EXTENSIONS:
+        from PIL import Image, ImageOps
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            display = image.copy()
+            display.thumbnail((display_size, display_size))
+            display.save(display_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+            image.thumbnail((thumbnail_size, thumbnail_size))
+            image.save(thumbnail_path, 'JPEG', quality=quality, optimize=True)
+        if os.path.getsize(display_path) >= os.path.getsize(source):
+            display_path = None
+        return {'display_path': display_path, 'thumbnail_path': thumbnail_path}
+    if shutil.which('pdftoppm'):
+        subprocess.run(['pdftoppm', '-jpeg', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(thumbnail_size),
+                        source, thumbnail_path[:-len('.jpg')]], check=True, capture_output=True, timeout=60)
+        return {'display_path': None, 'thumbnail_path': thumbnail_path}
+    return {'display_path': None, 'thumbnail_path': None}
+
+
+# --- Runs in the worker's main process. ---
+
+def source_path(receipt_filename):
+    """Absolute path of a receipt; ones saved before the blob store live in UPLOAD_FOLDER."""
+    if blobstore.is_blob(receipt_filename):
+        return os.path.join(blobstore.upload_dir(), receipt_filename)
+    return os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), receipt_filename)
+
+
+def _claim(limit, failed_before=None):
+    """
+    Mark up to `limit` receipts as processing and return their expenses.
+
+    :param failed_before: Also claim receipts that failed before this time.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config['DOCUMENT_PROCESSING_TIMEOUT'])
+    statuses = [Expense.receipt_status == 'pending',
+                and_(Expense.receipt_status == 'processing', Expense.receipt_updated_at < stale)]
+    if failed_before:
+        statuses.append(and_(Expense.receipt_status == 'failed', Expense.receipt_updated_at < failed_before))
+    query = Expense.query.filter(or_(*statuses)).order_by(Expense.id).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+    expenses = query.all()
+    for expense in expenses:
+        expense.receipt_status = 'processing'
+        expense.receipt_updated_at = datetime.utcnow()
+    db.session.commit()
+    return expenses
+
+
+def _replace(expense, column, file_path):
+    """Store `file_path` (or nothing) in the blob store as `column`, releasing what was there."""
+    new_path = None
+    if file_path:
+        with open(file_path, 'rb') as f:
+            new_path = blobstore.store(f, file_path)
+    old_path = getattr(expense, column)
+    if old_path:
+        blobstore.release(old_path)
+    setattr(expense, column, new_path)
+
+
+def _attach(expense, result):
+    _replace(expense, 'receipt_thumbnail_path', result['thumbnail_path'])
+    if result['display_path'] and not current_app.config['RECEIPT_KEEP_ORIGINAL'] \
+            and blobstore.is_blob(expense.receipt_filename):
+        # The display version becomes the receipt; the full-size photo goes.
+        _replace(expense, 'receipt_filename', result['display_path'])
+        _replace(expense, 'receipt_display_path', None)
+    else:
+        _replace(expense, 'receipt_display_path', result['display_path'])
+
+
+def process_pending(executor, limit=None, failed_before=None):
+    """
+    Run one batch of pending receipts through `executor`.
+
+    :param failed_before: Also retry receipts that failed before this time.
+    :return: (processed, failed) counts.
+    """
+    config = current_app.config
+    expenses = _claim(limit or config['DOCUMENT_BATCH_SIZE'], failed_before)
+    processed = failed = 0
+    with tempfile.TemporaryDirectory(prefix='receipts-') as workdir:
+        futures = {executor.submit(normalize_receipt, source_path(expense.receipt_filename),
+                                   os.path.join(workdir, str(expense.id)), config['RECEIPT_DISPLAY_SIZE'],
+                                   config['RECEIPT_THUMBNAIL_SIZE'], config['RECEIPT_JPEG_QUALITY']): expense.id
+                   for expense in expenses}
+        for future in as_completed(futures):
+            expense = db.session.get(Expense, futures[future])
+            if expense is None:
+                continue
+            try:
+                _attach(expense, future.result())
+            except Exception as e:
+                db.session.rollback()
+                expense = db.session.get(Expense, futures[future])
+                if expense is None:
+                    continue
+                expense.receipt_status = 'failed'
+                expense.receipt_processing_error = str(e)
+                failed += 1
+                logger.warning('Processing receipt for expense %s failed: %s', expense.id, e)
+            else:
+                expense.receipt_status = 'ready'
+                expense.receipt_processing_error = None
+                processed += 1
+            expense.receipt_updated_at = datetime.utcnow()
+            db.session.commit()
+    return processed, failed
+
+
+@click.group('receipts')
+def receipts_cli():
+    """Background processing for expense receipts."""
+
+
+@receipts_cli.command('process')
+@click.option('--retry-failed', is_flag=True, help='Also reprocess receipts that failed before.')
+@click.option('--workers', type=int, default=None)
+@with_appcontext
+def process_command(retry_failed, workers):
+    """Process every pending receipt, then exit. `flask documents worker` does this continuously."""
+    total_processed = total_failed = 0
+    # Receipts that fail again are stamped after this, so each is retried once.
+    failed_before = datetime.utcnow() if retry_failed else None
+    with make_executor(workers) as executor:
+        while True:
+            processed, failed = process_pending(executor, failed_before=failed_before)
+            total_processed += processed
+            total_failed += failed
+            if not processed and not failed:
+                break
+    click.echo(f'Processed {total_processed}, failed {total_failed}.')
+
+
+def register_commands(app):
+    app.cli.add_command(receipts_cli)
@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import request, session, has_app_context, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+_route = ContextVar('db_route', default='primary')
+
+
+def _is_write(clause):
+    return clause is not None and (
+        getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+    )
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica bind while a replica route is
+    active. Flushes, DML statements and SELECT ... FOR UPDATE always go to
+    the primary, and everything does when no replica is configured.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _route.get() == REPLICA_BIND and not self._flushing
+                and not _is_write(clause) and REPLICA_BIND in self._db.engines):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def replica_reads():
+    """Route reads inside the block to the replica (used by CLI exports and backups)."""
+    token = _route.set(REPLICA_BIND)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def reading_replica():
+    """
+    True while reads are routed to a configured replica. Anything read then may
+    lag the primary, so it must not be written to caches the primary path shares.
+    """
+    return (_route.get() == REPLICA_BIND and has_app_context()
+            and REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}))
+
+
+def wrote_recently():
+    """True while the user is inside the read-your-writes window after a commit."""
+    return has_request_context() and session.get('_primary_until', 0) > time.time()
+
+
+def read_only(view):
+    """
+    Serve a view's GET requests from the replica.
+
+    POSTs, and any request shortly after this user committed a write, stay
+    on the primary so users always see their own changes despite replica lag.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or wrote_recently():
+            return view(*args, **kwargs)
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapped
+
+
+def init_app(app, db):
+    @event.listens_for(db.session, 'after_flush')
+    def mark_write(db_session, flush_context):
+        db_session.info['wrote'] = True
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def mark_bulk_write(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            orm_execute_state.session.info['wrote'] = True
+
+    @event.listens_for(db.session, 'after_commit')
+    def pin_to_primary(db_session):
+        if db_session.info.pop('wrote', False) and has_request_context():
+            session['_primary_until'] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+    if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+        from .health import register_check, ping
+
+        def check_replica(app, timeout):
+            with app.app_context():
+                engine = db.engines[REPLICA_BIND]
+            return ping(engine, timeout)
+
+        register_check('replica', check_replica)
@@ -0,0 +1,103 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from app import db
+from app.models import CrewAssignment, Crew, Event, Location
+from . import live
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = {'accept': 'accepted', 'reject': 'rejected'}
+MAX_DECISIONS = 200
+
+
+class DecisionError(ValueError):
+    """A malformed batch of offer decisions; reported to the client as a 400."""
+
+
+def schedule(worker_id, now=None):
+    """
+    A worker's open offers and accepted upcoming shifts as plain dicts, from one
+    query that returns only the columns shown.
+
+    :return: dict with 'offers' and 'upcoming', each ordered by start time.
+    """
+    now = now or datetime.utcnow()
+    rows = db.session.execute(select(
+        CrewAssignment.id, CrewAssignment.role, CrewAssignment.status,
+        Crew.id.label('crew_id'), Crew.start_time, Crew.end_time, Crew.shift_type,
+        Event.id.label('event_id'), Event.show_name, Event.show_number, Location.name.label('location')
+    ).join(Crew, CrewAssignment.crew_id == Crew.id).join(Event, Crew.event_id == Event.id).join(
+        Location, Event.location_id == Location.id
+    ).where(
+        CrewAssignment.worker_id == worker_id,
+        CrewAssignment.status.in_(['offered', 'accepted']),
+        Crew.start_time >= now
+    ).order_by(Crew.start_time, CrewAssignment.id)).all()
+    items = {'offered': [], 'accepted': []}
+    for row in rows:
+        items[row.status].append({
+            'id': row.id,
+            'role': row.role,
+            'status': row.status,
+            'start': row.start_time.isoformat(),
+            'end': row.end_time.isoformat(),
+            'shift_type': row.shift_type,
+            'crew_id': row.crew_id,
+            'event': {'id': row.event_id, 'name': row.show_name, 'number': row.show_number},
+            'location': row.location,
+        })
+    return {'worker_id': worker_id, 'as_of': now.isoformat(), 'offers': items['offered'], 'upcoming': items['accepted']}
+
+
+def parse_decisions(data):
+    """
+    Validate a request body of the form
+    {"decisions": [{"assignment_id": 1, "action": "accept" | "reject"}, ...]}.
+
+    :return: {assignment_id: new status}
+    """
+    decisions = data.get('decisions') if isinstance(data, dict) else None
+    if not isinstance(decisions, list) or not decisions:
+        raise DecisionError('decisions must be a non-empty list')
+    if len(decisions) > MAX_DECISIONS:
+        raise DecisionError(f'At most {MAX_DECISIONS} decisions per request')
+    parsed = {}
+    for decision in decisions:
+        assignment_id = decision.get('assignment_id') if isinstance(decision, dict) else None
+        action = decision.get('action') if isinstance(decision, dict) else None
+        if not isinstance(assignment_id, int) or action not in ACTIONS:
+            raise DecisionError('Each decision needs an integer assignment_id and an action of accept or reject')
+        if parsed.get(assignment_id, ACTIONS[action]) != ACTIONS[action]:
+            raise DecisionError(f'Conflicting decisions for assignment {assignment_id}')
+        parsed[assignment_id] = ACTIONS[action]
+    return parsed
+
+
+def decide(worker_id, decisions):
+    """
+    Apply accept/reject decisions in the caller's transaction. Only the worker's
+    own rows that are still 'offered' change, so a retried or stale request
+    cannot undo a decision or touch a revoked offer.
+
+    :param decisions: {assignment_id: 'accepted' | 'rejected'}, as from parse_decisions().
+    :return: One {'assignment_id', 'status', 'changed'} dict per decision; status is None
+        for assignments that do not exist or belong to someone else.
+    """
+    changed = set()
+    for status in ('accepted', 'rejected'):
+        ids = [assignment_id for assignment_id, wanted in decisions.items() if wanted == status]
+        if ids:
+            changed.update(db.session.execute(update(CrewAssignment).where(
+                CrewAssignment.id.in_(ids),
+                CrewAssignment.worker_id == worker_id,
+                CrewAssignment.status == 'offered'
+            ).values(status=status).returning(CrewAssignment.id),
+                execution_options={'synchronize_session': False}).scalars())
+    rows = db.session.execute(select(
+        CrewAssignment.id, CrewAssignment.status, CrewAssignment.crew_id, CrewAssignment.worker_id, CrewAssignment.role
+    ).where(CrewAssignment.id.in_(list(decisions)), CrewAssignment.worker_id == worker_id)).all()
+    live.queue_assignments(db.session, [row for row in rows if row.id in changed])
+    current = {row.id: row.status for row in rows}
+    return [{'assignment_id': assignment_id, 'status': current.get(assignment_id), 'changed': assignment_id in changed}
+            for assignment_id in decisions]
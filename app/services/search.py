@@ -0,0 +1,176 @@
+import re
+import click
+from flask import session, url_for
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, select, func, literal, literal_column, union_all, or_, and_, true, table, column
+from app import db
+from app.models import Note, HelpTicket, Document, Crew, CrewAssignment
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Searchable tables and the columns indexed for each; the last column is the one snippets come from.
+SOURCES = {
+    'note': (Note, ('content',)),
+    'help_ticket': (HelpTicket, ('subject', 'content')),
+    'document': (Document, ('name', 'text_content')),
+}
+LABELS = {'note': 'Notes', 'help_ticket': 'Help tickets', 'document': 'Documents'}
+REGCONFIG = "'english'::regconfig"
+# Highlight markers that cannot occur in user text; swapped for <mark> after escaping.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def _pg_text(columns, prefix=''):
+    return " || ' ' || ".join(f"coalesce({prefix}{name}, '')" for name in columns)
+
+
+def pg_ddl(name, columns):
+    return [f"CREATE INDEX IF NOT EXISTS ix_{name}_search ON {name} USING gin (to_tsvector({REGCONFIG}, {_pg_text(columns)}))"]
+
+
+def sqlite_ddl(name, columns):
+    # External-content FTS5 table kept in step with its source table by triggers.
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    fts = f'{name}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{name}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {cols} ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+# Databases built with create_all() get the same search indexes as migrated ones.
+for _name, (_model, _columns) in SOURCES.items():
+    for _statement in pg_ddl(_name, _columns):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+    for _statement in sqlite_ddl(_name, _columns):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_model.__table__, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_name}_fts').execute_if(dialect='sqlite'))
+
+
+def fts5_query(text):
+    """Turn free text into an FTS5 query: every word (or "quoted phrase") must match."""
+    terms = re.findall(r'"[^"]+"|\w+', text)
+    return ' '.join('"' + term.strip('"').replace('"', '""') + '"' for term in terms)
+
+
+def _visibility(kind, user):
+    staff_view = not session.get('view_as_employee', False)
+    if kind == 'note':
+        if (user.is_admin or user.is_account_manager) and staff_view:
+            return true()
+        # Technical directors also see the AM-and-TD notes of events they work on.
+        td_events = select(Crew.event_id).join(CrewAssignment, CrewAssignment.crew_id == Crew.id).where(
+            CrewAssignment.worker_id == user.id, CrewAssignment.role == 'TD', CrewAssignment.status != 'rejected')
+        return and_(Note.account_manager_only.isnot(True),
+                    or_(Note.account_manager_and_td_only.isnot(True), Note.event_id.in_(td_events)))
+    if kind == 'help_ticket':
+        return true() if user.is_admin and staff_view else HelpTicket.worker_id == user.id
+    return true()
+
+
+def _matches(kind, text, user):
+    """SELECT kind, id, rank for the visible rows of one source matching `text`."""
+    model, columns = SOURCES[kind]
+    if db.engine.dialect.name == 'postgresql':
+        vector = literal_column(f'to_tsvector({REGCONFIG}, {_pg_text(columns, kind + ".")})')
+        query = func.websearch_to_tsquery(literal_column(REGCONFIG), text)
+        return select(literal(kind).label('kind'), model.id.label('id'), func.ts_rank_cd(vector, query).label('rank')).where(
+            vector.op('@@')(query), _visibility(kind, user))
+    fts = table(f'{kind}_fts', column('rowid'))
+    return select(literal(kind).label('kind'), model.id.label('id'),
+                  (-func.bm25(literal_column(fts.name))).label('rank')).join(fts, fts.c.rowid == model.id).where(
+        literal_column(fts.name).op('MATCH')(fts5_query(text)), _visibility(kind, user))
+
+
+def _snippets(kind, ids, text):
+    model, columns = SOURCES[kind]
+    if db.engine.dialect.name == 'postgresql':
+        options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=2, MinWords=5, MaxWords=20'
+        snippet = func.ts_headline(literal_column(REGCONFIG), func.coalesce(getattr(model, columns[-1]), ''),
+                                   func.websearch_to_tsquery(literal_column(REGCONFIG), text), options)
+        rows = db.session.execute(select(model.id, snippet).where(model.id.in_(ids)))
+    else:
+        fts = table(f'{kind}_fts', column('rowid'))
+        snippet = func.snippet(literal_column(fts.name), len(columns) - 1, MARK_START, MARK_END, '…', 24)
+        rows = db.session.execute(select(fts.c.rowid, snippet).where(
+            literal_column(fts.name).op('MATCH')(fts5_query(text)), fts.c.rowid.in_(ids)))
+    return {row_id: highlight(snippet or '') for row_id, snippet in rows}
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet)).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _result(kind, obj, snippet):
+    if kind == 'note':
+        return {'kind': kind, 'title': f'Note on {obj.event.show_name}', 'snippet': snippet,
+                'url': url_for('events.view_event', event_id=obj.event_id), 'date': obj.created_at}
+    if kind == 'help_ticket':
+        return {'kind': kind, 'title': obj.subject, 'snippet': snippet, 'url': None, 'date': None}
+    return {'kind': kind, 'title': f'{obj.name} ({obj.event.show_name})', 'snippet': snippet,
+            'url': url_for('files.document', document_id=obj.id), 'date': obj.uploaded_at}
+
+
+def search(text, user, kinds=None, page=1, per_page=20):
+    """
+    Ranked full-text search over everything `user` may see.
+
+    :param kinds: Subset of SOURCES to search; all of them by default.
+    :return: dict with 'results' for the page, 'total', 'page' and 'per_page'.
+    """
+    kinds = [kind for kind in (kinds or SOURCES) if kind in SOURCES]
+    if not text.strip() or not kinds or (db.engine.dialect.name != 'postgresql' and not fts5_query(text)):
+        return {'results': [], 'total': 0, 'page': page, 'per_page': per_page}
+    matches = union_all(*(_matches(kind, text, user) for kind in kinds)).subquery()
+    total = db.session.execute(select(func.count()).select_from(matches)).scalar()
+    rows = db.session.execute(select(matches.c.kind, matches.c.id).order_by(
+        matches.c.rank.desc(), matches.c.kind, matches.c.id.desc()
+    ).limit(per_page).offset((page - 1) * per_page)).all()
+
+    results = []
+    by_kind = {}
+    for kind, row_id in rows:
+        by_kind.setdefault(kind, []).append(row_id)
+    loaded = {}
+    for kind, ids in by_kind.items():
+        model = SOURCES[kind][0]
+        snippets = _snippets(kind, ids, text)
+        for obj in model.query.filter(model.id.in_(ids)):
+            loaded[kind, obj.id] = _result(kind, obj, snippets.get(obj.id, ''))
+    for kind, row_id in rows:
+        if (kind, row_id) in loaded:
+            results.append(loaded[kind, row_id])
+    return {'results': results, 'total': total, 'page': page, 'per_page': per_page}
+
+
+@click.group('search')
+def search_cli():
+    """Maintain the full-text search indexes."""
+
+
+@search_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Create any missing search indexes and rebuild the SQLite FTS tables from their source rows."""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        for name, (model, columns) in SOURCES.items():
+            for statement in (pg_ddl if dialect == 'postgresql' else sqlite_ddl)(name, columns):
+                conn.exec_driver_sql(statement)
+            if dialect == 'sqlite':
+                conn.exec_driver_sql(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')")
+    click.echo(f'Search indexes ready ({dialect}).')
+
+
+def register_commands(app):
+    app.cli.add_command(search_cli)
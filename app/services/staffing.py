@@ -0,0 +1,168 @@
+import json
+from collections import Counter
+from sqlalchemy import select, func, text
+from app import db
+from app.models import CrewAssignment, Crew, Worker
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('offered', 'accepted')
+MAX_ASSIGNMENTS = 500
+
+
+class AssignmentError(ValueError):
+    """A malformed bulk assignment request; reported to the client as a 400."""
+
+
+def parse_assignments(data):
+    """
+    Validate a request body of the form
+    {"assignments": [{"crew_id": 1, "role": "Audio", "worker_id": 2}, ...]}.
+
+    :return: list of (crew_id, role, worker_id) in request order.
+    """
+    items = data.get('assignments') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise AssignmentError('assignments must be a non-empty list')
+    if len(items) > MAX_ASSIGNMENTS:
+        raise AssignmentError(f'At most {MAX_ASSIGNMENTS} assignments per request')
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise AssignmentError('Each assignment must be an object')
+        crew_id, role, worker_id = item.get('crew_id'), item.get('role'), item.get('worker_id')
+        if not isinstance(crew_id, int) or not isinstance(worker_id, int) or not isinstance(role, str) or not role:
+            raise AssignmentError('Each assignment needs an integer crew_id and worker_id and a role')
+        parsed.append((crew_id, role, worker_id))
+    return parsed
+
+
+def _overlaps(a, b):
+    return a.start_time < b.end_time and b.start_time < a.end_time
+
+
+def lock(crew_ids, worker_ids):
+    """
+    Hold the crews and workers about to be assigned until the transaction ends,
+    so concurrent assigners check and insert one after the other for the same
+    crew or worker, and in parallel for everything else.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # FOR NO KEY UPDATE, in id order: it does not block the foreign key checks
+        # of other inserts, and two batches cannot deadlock on each other.
+        for model, ids in ((Crew, crew_ids), (Worker, worker_ids)):
+            db.session.execute(select(model.id).where(model.id.in_(ids)).order_by(model.id).with_for_update(key_share=True))
+    else:
+        # SQLite has no row locks; a write takes the database lock for the rest of the transaction.
+        db.session.execute(text('UPDATE crew SET id = id WHERE 0 = 1'))
+
+
+def check(requests):
+    """
+    Check (crew_id, role, worker_id) triples against each other and the database
+    with four queries however many there are: crews, open slots per role,
+    workers, and the workers' open assignments in the batch's time span.
+    The crews and workers stay locked until the caller's transaction ends.
+
+    :return: One error string, or None if it can be assigned, per triple.
+    """
+    crew_ids = {crew_id for crew_id, _, _ in requests}
+    worker_ids = {worker_id for _, _, worker_id in requests}
+    lock(crew_ids, worker_ids)
+    crews = {crew.id: crew for crew in db.session.execute(select(
+        Crew.id, Crew.roles, Crew.start_time, Crew.end_time).where(Crew.id.in_(crew_ids))).all()}
+    required = {crew_id: json.loads(crew.roles) for crew_id, crew in crews.items()}
+    filled = Counter({(crew_id, role): count for crew_id, role, count in db.session.execute(select(
+        CrewAssignment.crew_id, CrewAssignment.role, func.count()
+    ).where(CrewAssignment.crew_id.in_(crew_ids), CrewAssignment.status.in_(OPEN_STATUSES)).group_by(
+        CrewAssignment.crew_id, CrewAssignment.role)).all()})
+    workers = {worker.id: worker for worker in db.session.execute(select(
+        Worker.id, Worker.active, Worker.role_capabilities).where(Worker.id.in_(worker_ids))).all()}
+    booked = {}
+    if crews:
+        start = min(crew.start_time for crew in crews.values())
+        end = max(crew.end_time for crew in crews.values())
+        for row in db.session.execute(select(
+            CrewAssignment.worker_id, CrewAssignment.start_time, CrewAssignment.end_time
+        ).where(
+            CrewAssignment.worker_id.in_(worker_ids),
+            CrewAssignment.status.in_(OPEN_STATUSES),
+            CrewAssignment.start_time < end, CrewAssignment.end_time > start
+        )).all():
+            booked.setdefault(row.worker_id, []).append(row)
+
+    errors = []
+    for crew_id, role, worker_id in requests:
+        crew, worker = crews.get(crew_id), workers.get(worker_id)
+        if crew is None:
+            errors.append('Crew not found')
+        elif worker is None or not worker.active:
+            errors.append('Worker not found or inactive')
+        elif role not in required[crew_id]:
+            errors.append(f'The crew does not need {role}')
+        elif not (worker.role_capabilities or {}).get(role):
+            errors.append(f'The worker cannot work {role}')
+        elif filled[(crew_id, role)] >= required[crew_id][role]:
+            errors.append(f'{role} is already fulfilled')
+        elif any(_overlaps(crew, other) for other in booked.get(worker_id, [])):
+            errors.append('The worker is already booked at that time')
+        else:
+            errors.append(None)
+            # Later triples in the same batch see this one as taken.
+            filled[(crew_id, role)] += 1
+            booked.setdefault(worker_id, []).append(crew)
+    return errors
+
+
+def assign(requests, all_or_nothing=False):
+    """
+    Offer crews' roles to workers in the caller's transaction; commit it through
+    transactions.run() so that losing a lock race retries instead of failing.
+
+    :param requests: (crew_id, role, worker_id) triples, as from parse_assignments().
+    :param all_or_nothing: Create nothing if any triple fails its checks.
+    :return: One {'crew_id', 'role', 'worker_id', 'assignment_id', 'error'} dict per triple.
+    """
+    errors = check(requests)
+    create = not (all_or_nothing and any(errors))
+    assignments = [CrewAssignment(crew_id=crew_id, role=role, worker_id=worker_id, status='offered')
+                   if error is None and create else None
+                   for (crew_id, role, worker_id), error in zip(requests, errors)]
+    db.session.add_all([assignment for assignment in assignments if assignment is not None])
+    # One batched INSERT; the before_flush hook queues the offer digests as usual.
+    db.session.flush()
+    return [{
+        'crew_id': crew_id, 'role': role, 'worker_id': worker_id,
+        'assignment_id': assignment.id if assignment is not None else None,
+        'error': error if error or create else 'Not assigned; other assignments in the batch failed',
+    } for (crew_id, role, worker_id), error, assignment in zip(requests, errors, assignments)]
+
+
+def open_roles(crews):
+    """
+    The unfulfilled crew requests board: one dict per crew role that is short of
+    workers or still has offers out, in the order of `crews`.
+    """
+    roles = []
+    for crew in crews:
+        for role, required_count in crew.get_roles().items():
+            assignments = [{
+                'id': assignment.id,
+                'status': assignment.status,
+                'worker_name': f'{assignment.worker.first_name} {assignment.worker.last_name}',
+            } for assignment in crew.crew_assignments if assignment.role == role]
+            assigned_count = crew.get_assigned_role_count(role)
+            if assigned_count < required_count or any(assignment['status'] == 'offered' for assignment in assignments):
+                roles.append({
+                    'crew_id': crew.id,
+                    'event_name': crew.event.show_name,
+                    'description': crew.description,
+                    'role': role,
+                    'required_count': required_count,
+                    'assigned_count': assigned_count,
+                    'start_time': crew.start_time,
+                    'end_time': crew.end_time,
+                    'assignments': assignments,
+                })
+    return roles
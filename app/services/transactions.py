@@ -0,0 +1,49 @@
+import random
+import time
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from app import db
+from . import bookings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# serialization_failure and deadlock_detected: the transaction lost a race and can simply run again.
+RETRYABLE_PGCODES = {'40001', '40P01'}
+
+
+def is_conflict(error):
+    """Whether a database error means another transaction got in the way, rather than a bug."""
+    orig = getattr(error, 'orig', None)
+    if getattr(orig, 'pgcode', None) in RETRYABLE_PGCODES:
+        return True
+    # A booking committed under us since the checks ran; running again reports it properly.
+    return 'database is locked' in str(orig) or bookings.is_double_booking(error)
+
+
+def run(work, attempts=None, on_retry=None):
+    """
+    Call `work()` and commit, running both again after a conflict.
+
+    `work` must do all its reads and writes through db.session, as everything
+    it did is rolled back before the next attempt.
+
+    :param attempts: Tries before giving up (default TRANSACTION_RETRY_ATTEMPTS).
+    :param on_retry: Called with the error before each retry.
+    :return: What `work()` returned on the attempt that committed.
+    """
+    config = current_app.config
+    attempts = attempts or config['TRANSACTION_RETRY_ATTEMPTS']
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except DBAPIError as e:
+            db.session.rollback()
+            if attempt == attempts or not is_conflict(e):
+                raise
+            logger.info('Transaction conflict (attempt %s of %s), retrying: %s', attempt, attempts, e.orig)
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(random.uniform(0, config['TRANSACTION_RETRY_BASE_SECONDS'] * 2 ** attempt))
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+from app import db
+from app.forms import DOCUMENT_EXTENSIONS
+from app.models import Document, UploadSession
+from . import blobstore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(ValueError):
+    """A request that does not fit the upload session; reported to the client as a 4xx."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_dir(upload_id):
+    # Outside blobs/ so `flask blobs gc` never sweeps a paused upload.
+    return os.path.join(blobstore.upload_dir(), 'partial', upload_id)
+
+
+def _chunk_path(upload, index):
+    return os.path.join(chunk_dir(upload.id), f'{index:06d}')
+
+
+def expected_length(upload, index):
+    if index == upload.chunk_count - 1:
+        return upload.size - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def received_chunks(upload):
+    try:
+        names = os.listdir(chunk_dir(upload.id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def describe(upload):
+    return {
+        'id': upload.id,
+        'event_id': upload.event_id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': [] if upload.document_id else received_chunks(upload),
+        'document_id': upload.document_id,
+    }
+
+
+def initiate(event, worker, filename, size, sha256=None):
+    """
+    Start a chunked upload of a document for `event`.
+
+    :param size: Total size in bytes, fixed for the life of the upload.
+    :param sha256: Optional hex digest of the whole file, checked on completion.
+    """
+    filename = secure_filename(filename or '')
+    if not filename or os.path.splitext(filename)[1].lower().lstrip('.') not in DOCUMENT_EXTENSIONS:
+        raise UploadError('Documents only!')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    if size > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError('File is too large', status=413)
+    upload = UploadSession(id=uuid.uuid4().hex, event_id=event.id, worker_id=worker.id, filename=filename,
+                           size=size, chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'], sha256=sha256)
+    db.session.add(upload)
+    db.session.commit()
+    os.makedirs(chunk_dir(upload.id), exist_ok=True)
+    return upload
+
+
+def write_chunk(upload, index, stream, sha256=None):
+    """
+    Stream chunk number `index` to disk. Sending the same chunk again replaces it.
+
+    :param stream: The raw request body; read in pieces, never buffered whole.
+    :param sha256: Optional hex digest of the chunk.
+    """
+    if upload.document_id:
+        raise UploadError('Upload is already complete', status=409)
+    if not 0 <= index < upload.chunk_count:
+        raise UploadError(f'Chunk index must be between 0 and {upload.chunk_count - 1}')
+    length = expected_length(upload, index)
+    directory = chunk_dir(upload.id)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while written <= length:
+                piece = stream.read(min(blobstore.CHUNK_SIZE, length + 1 - written))
+                if not piece:
+                    break
+                digest.update(piece)
+                out.write(piece)
+                written += len(piece)
+        if written != length:
+            raise UploadError(f'Chunk {index} must be {length} bytes, got {written}')
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise UploadError(f'Chunk {index} checksum mismatch')
+        os.replace(tmp_path, _chunk_path(upload, index))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # Keeps the session from expiring while chunks are still arriving.
+    upload.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+class _ChunkReader:
+    """Read the chunk files of an upload back to back as one stream."""
+
+    def __init__(self, paths):
+        self._paths = iter(paths)
+        self._file = None
+
+    def read(self, size=-1):
+        while True:
+            if self._file is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b''
+                self._file = open(path, 'rb')
+            data = self._file.read(size)
+            if data:
+                return data
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def complete(upload, sha256=None):
+    """
+    Assemble the chunks into a pending Document. Completing twice returns the same document.
+
+    :param sha256: Hex digest of the whole file; overrides the one given when the upload started.
+    """
+    if upload.document_id:
+        return db.session.get(Document, upload.document_id)
+    missing = sorted(set(range(upload.chunk_count)) - set(received_chunks(upload)))
+    if missing:
+        raise UploadError(f'Missing chunks: {missing[:20]}', status=409)
+    reader = _ChunkReader(_chunk_path(upload, index) for index in range(upload.chunk_count))
+    try:
+        path = blobstore.store(reader, upload.filename, expected_sha256=sha256 or upload.sha256)
+    except ValueError as e:
+        raise UploadError(str(e))
+    finally:
+        reader.close()
+    document = Document(name=upload.filename, path=path, event_id=upload.event_id, status='pending')
+    db.session.add(document)
+    db.session.flush()
+    upload.document_id = document.id
+    db.session.commit()
+    shutil.rmtree(chunk_dir(upload.id), ignore_errors=True)
+    return document
+
+
+def discard(upload):
+    db.session.delete(upload)
+    db.session.commit()
+    shutil.rmtree(chunk_dir(upload.id), ignore_errors=True)
+
+
+@click.group('uploads')
+def uploads_cli():
+    """Maintain chunked document uploads."""
+
+
+@uploads_cli.command('cleanup')
+@click.option('--max-age', type=int, default=None, help='Seconds of inactivity before an upload is dropped '
+                                                        '(default UPLOAD_SESSION_TTL).')
+@with_appcontext
+def cleanup_command(max_age):
+    """Drop abandoned and completed uploads and their chunk files."""
+    max_age = max_age or current_app.config['UPLOAD_SESSION_TTL']
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in expired:
+        discard(upload)
+    known = {upload_id for upload_id, in db.session.query(UploadSession.id)}
+    root = os.path.join(blobstore.upload_dir(), 'partial')
+    orphans = 0
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        if name not in known and os.path.getmtime(os.path.join(root, name)) < time.time() - max_age:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            orphans += 1
+    click.echo(f'Removed {len(expired)} uploads and {orphans} orphaned chunk folders.')
+
+
+@uploads_cli.command('relocate')
+@with_appcontext
+def relocate_command():
+    """Move uploads from app/static/uploads into UPLOAD_STORE, where only the files endpoints serve them."""
+    source, target = blobstore.legacy_upload_dir(), blobstore.upload_dir()
+    moved = skipped = 0
+    for folder, _, names in os.walk(source):
+        for name in names:
+            relative = os.path.relpath(os.path.join(folder, name), source)
+            destination = os.path.join(target, relative)
+            if os.path.exists(destination):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(os.path.join(folder, name), destination)
+            moved += 1
+    click.echo(f'Moved {moved} files to {target}; {skipped} already there were left in {source}.')
+
+
+def register_commands(app):
+    app.cli.add_command(uploads_cli)
@@ -0,0 +1,94 @@
+// Resumable, chunked document uploads (see app/routes/uploads.py).
+// Forms marked with data-chunked-upload send their file in chunks that are
+// retried on network errors; submitting the same file again resumes it.
+(function () {
+    function request(method, url, body, headers) {
+        return fetch(url, {
+            method: method,
+            body: body,
+            credentials: 'same-origin',
+            headers: Object.assign({'X-CSRFToken': window.csrf_token}, headers || {})
+        });
+    }
+
+    async function json(response) {
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(data.error || response.statusText);
+            // Client errors will not get better by retrying.
+            error.fatal = response.status >= 400 && response.status < 500 && response.status !== 408 && response.status !== 429;
+            throw error;
+        }
+        return data;
+    }
+
+    async function withRetry(send, attempts) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await send();
+            } catch (error) {
+                if (error.fatal || attempt + 1 >= (attempts || 10)) throw error;
+                await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 30000)));
+            }
+        }
+    }
+
+    async function sha256Hex(blob) {
+        if (!window.crypto || !crypto.subtle) return null;  // only available on https and localhost
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function uploadDocument(file, eventId, onProgress) {
+        const resumeKey = `upload:${eventId}:${file.name}:${file.size}:${file.lastModified}`;
+        let upload = null;
+        if (localStorage.getItem(resumeKey)) {
+            upload = await request('GET', `/uploads/${localStorage.getItem(resumeKey)}`).then(json).catch(() => null);
+        }
+        if (!upload) {
+            upload = await withRetry(() => request('POST', '/uploads',
+                JSON.stringify({event_id: eventId, filename: file.name, size: file.size}),
+                {'Content-Type': 'application/json'}).then(json));
+            localStorage.setItem(resumeKey, upload.id);
+        }
+
+        const received = new Set(upload.received);
+        let done = received.size;
+        for (let index = 0; index < upload.chunk_count && !upload.document_id; index++) {
+            if (received.has(index)) continue;
+            const chunk = file.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size);
+            const checksum = await sha256Hex(chunk);
+            await withRetry(() => request('PUT', `/uploads/${upload.id}/chunks/${index}`, chunk,
+                checksum ? {'X-Chunk-SHA256': checksum} : {}).then(response => response.ok || json(response)));
+            onProgress(++done / upload.chunk_count);
+        }
+
+        const result = await withRetry(() => request('POST', `/uploads/${upload.id}/complete`, '{}',
+            {'Content-Type': 'application/json'}).then(json));
+        localStorage.removeItem(resumeKey);
+        return result;
+    }
+
+    window.uploadDocument = uploadDocument;
+
+    document.querySelectorAll('form[data-chunked-upload]').forEach(form => {
+        form.addEventListener('submit', async event => {
+            const input = form.querySelector('input[type=file]');
+            if (!window.fetch || !input.files.length) return;  // fall back to the plain form post
+            event.preventDefault();
+            const progress = form.querySelector('.progress');
+            const bar = progress.querySelector('.progress-bar');
+            progress.style.display = '';
+            form.querySelectorAll('[type=submit]').forEach(button => button.disabled = true);
+            try {
+                await uploadDocument(input.files[0], Number(form.dataset.eventId), fraction => {
+                    bar.style.width = `${Math.round(fraction * 100)}%`;
+                });
+                location.reload();
+            } catch (error) {
+                alert(`Upload failed: ${error.message}. Submit the same file again to resume.`);
+                form.querySelectorAll('[type=submit]').forEach(button => button.disabled = false);
+            }
+        });
+    });
+})();
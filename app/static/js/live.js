@@ -0,0 +1,114 @@
+// Live updates from /live/events (app/routes/live.py) instead of re-rendering
+// pages on a timer. Each change event is re-dispatched on document as
+// `live:<type>` (e.g. offers.js listens for live:assignment), then only the
+// parts of the page it affects are fetched again and swapped in:
+//   data-live-row="<kind>-<id>"    rows re-rendered by /live/rows (an assignment
+//                                  event also matches its crew's rows, a crew its event's)
+//   data-live-append="<kinds>"     where /live/rows adds rows of these kinds that
+//                                  are not on the page yet, e.g. a newly short crew
+//   data-live-refresh="<types>"    regions reloaded from their data-live-url
+//                                  fragment endpoint, e.g. a report after a new expense
+(function () {
+    if (!window.EventSource || !window.fetch) return;
+    if (!document.querySelector('[data-live-row], [data-live-append], [data-live-refresh], [data-assignment-id]')) return;
+
+    const staleRows = new Set();
+    const newRows = new Map();
+    const staleRegions = new Set();
+    let timer = null;
+
+    function keys(item) {
+        const found = [`${item.type}-${item.id}`];
+        if (item.type === 'assignment') found.push(`crew-${item.crew_id}`);
+        if (item.type === 'crew') found.push(`event-${item.event_id}`);
+        return found;
+    }
+
+    function onPage(key) {
+        return document.querySelector(`[data-live-row="${key}"]`);
+    }
+
+    function markStale(item) {
+        keys(item).forEach(key => {
+            if (onPage(key)) {
+                staleRows.add(key);
+                return;
+            }
+            document.querySelectorAll('[data-live-append]').forEach(region => {
+                if (region.dataset.liveAppend.split(' ').includes(key.split('-')[0])) newRows.set(key, region);
+            });
+        });
+        document.querySelectorAll('[data-live-refresh][data-live-url]').forEach(region => {
+            if (region.dataset.liveRefresh.split(' ').includes(item.type)) staleRegions.add(region);
+        });
+        if (staleRows.size || newRows.size || staleRegions.size) {
+            clearTimeout(timer);
+            timer = setTimeout(() => refresh().catch(error => console.error('Live update failed:', error)), 300);
+        }
+    }
+
+    function parseRows(html) {
+        const template = document.createElement('template');
+        template.innerHTML = html;
+        return Array.from(template.content.children);
+    }
+
+    async function refreshRows(stale, added) {
+        const wanted = stale.concat(Array.from(added.keys()));
+        if (!wanted.length) return;
+        const response = await fetch(`/live/rows?keys=${encodeURIComponent(wanted.join(','))}`, {credentials: 'same-origin'});
+        if (!response.ok) return;
+        const rows = await response.json();
+        stale.filter(key => key in rows && onPage(key)).forEach(key => {
+            const current = Array.from(document.querySelectorAll(`[data-live-row="${key}"]`));
+            parseRows(rows[key]).forEach(row => current[0].before(row));
+            current.forEach(row => row.remove());
+        });
+        added.forEach((region, key) => {
+            if (rows[key] && !onPage(key)) parseRows(rows[key]).forEach(row => region.append(row));
+        });
+    }
+
+    async function refreshRegion(region) {
+        const response = await fetch(region.dataset.liveUrl, {credentials: 'same-origin'});
+        if (response.ok) region.innerHTML = await response.text();
+    }
+
+    async function refresh() {
+        const stale = Array.from(staleRows);
+        const added = new Map(newRows);
+        const regions = Array.from(staleRegions);
+        staleRows.clear();
+        newRows.clear();
+        staleRegions.clear();
+        await Promise.all([refreshRows(stale, added), ...regions.map(refreshRegion)]);
+    }
+
+    // EventSource retries dropped connections by itself, but gives up for good on
+    // an error status such as the 503 sent when the server has no stream to spare.
+    // Reconnect after a growing pause then, resuming from the last event seen.
+    let lastId = '';
+    let delay = 5000;
+
+    function connect() {
+        const source = new EventSource('/live/events' + (lastId ? `?last_id=${lastId}` : ''));
+        source.onopen = () => { delay = 5000; };
+        source.onerror = () => {
+            if (source.readyState !== EventSource.CLOSED) return;
+            setTimeout(connect, delay + Math.random() * delay);
+            delay = Math.min(delay * 2, 120000);
+        };
+        ['assignment', 'crew', 'event', 'expense', 'shift'].forEach(type => {
+            source.addEventListener(type, message => {
+                lastId = message.lastEventId;
+                const item = JSON.parse(message.data);
+                document.dispatchEvent(new CustomEvent(`live:${type}`, {detail: item}));
+                markStale(item);
+            });
+        });
+        // Too far behind to replay what was missed.
+        source.addEventListener('reset', () => location.reload());
+    }
+
+    connect();
+})();
@@ -0,0 +1,68 @@
+// Accept or reject offers on the home page through the JSON API (app/routes/api.py)
+// instead of a form post and a full page reload per offer. Without fetch the
+// plain forms still work.
+(function () {
+    const container = document.getElementById('upcoming-shifts');
+    if (!container || !window.fetch) return;
+    const toolbar = container.querySelector('[data-offer-toolbar]');
+
+    function updateToolbar() {
+        toolbar.style.display = container.querySelector('[data-offer-select]') ? '' : 'none';
+    }
+
+    function showResult(result) {
+        const item = container.querySelector(`[data-assignment-id="${result.assignment_id}"]`);
+        if (!item) return;
+        item.querySelectorAll('[data-offer-action], [data-offer-select]').forEach(element => element.remove());
+        const label = document.createElement('span');
+        label.className = 'label ' + (result.status === 'accepted' ? 'label-success' : 'label-default');
+        label.textContent = result.changed ? result.status : `no longer open (${result.status || 'withdrawn'})`;
+        item.querySelector('.shift-actions').prepend(label);
+    }
+
+    async function decide(decisions) {
+        const response = await fetch('/api/v1/offers/decisions', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': window.csrf_token},
+            body: JSON.stringify({decisions: decisions})
+        });
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) throw new Error(data.error || response.statusText);
+        data.results.forEach(showResult);
+        updateToolbar();
+    }
+
+    function fail(error) {
+        alert(`Could not save your answer: ${error.message}`);
+    }
+
+    container.querySelectorAll('form[data-offer-action]').forEach(form => {
+        form.addEventListener('submit', event => {
+            event.preventDefault();
+            const item = form.closest('[data-assignment-id]');
+            decide([{assignment_id: Number(item.dataset.assignmentId), action: form.dataset.offerAction}]).catch(fail);
+        });
+    });
+
+    toolbar.querySelectorAll('[data-offer-batch]').forEach(button => {
+        button.addEventListener('click', () => {
+            const decisions = Array.from(container.querySelectorAll('[data-offer-select]:checked'), checkbox => ({
+                assignment_id: Number(checkbox.closest('[data-assignment-id]').dataset.assignmentId),
+                action: button.dataset.offerBatch
+            }));
+            if (decisions.length) decide(decisions).catch(fail);
+        });
+    });
+
+    // Offers answered elsewhere (another tab, an offer link) or revoked by an admin.
+    document.addEventListener('live:assignment', event => {
+        const item = container.querySelector(`[data-assignment-id="${event.detail.id}"]`);
+        if (item && item.querySelector('[data-offer-action]') && event.detail.status !== 'offered') {
+            showResult({assignment_id: event.detail.id, status: event.detail.status, changed: true});
+            updateToolbar();
+        }
+    });
+
+    updateToolbar();
+})();
@@ -32,5 +32,17 @@ def update_database_from_backup(backup_file):
     except Exception as e:
         click.echo(f"An error occurred while reading the backup file: {e}")
 
+@click.command("backup-db")
+@click.argument('backup_file')
+@with_appcontext
+def backup_database(backup_file):
+    """Export the database to a JSON backup file, reading from the replica if configured."""
+    from app.utils import backup_database_to_json
+    if backup_database_to_json(backup_file):
+        click.echo(f"Database backup saved to {backup_file}")
+    else:
+        raise SystemExit(1)
+
 def register_commands(app):
     app.cli.add_command(update_database_from_backup)
+    app.cli.add_command(backup_database)
@@ -1,21 +1,24 @@
 import os
 import json
 from datetime import datetime, timedelta
-import pandas as pd
 from flask import current_app, url_for
-from .models import Expense, Event, Location, Shift, Worker, Crew, CrewAssignment
-from app import db
+from flask_wtf.csrf import generate_csrf
+from markupsafe import escape
+from .models import Expense, Location, Shift, Worker, Crew, CrewAssignment, Role
+from app import db, cache
+from app.services.replica import replica_reads
 import logging
 
 ROLES = ['TD', 'Video', 'Audio', 'Lighting', 'Staging', 'Stagehand', 'Lift Op', 'Driver']
 
 ALLOWED_EXTENSIONS = ['pdf', 'png', 'jpg', 'jpeg', 'gif']
 
+from sqlalchemy import text
 from sqlalchemy.orm import class_mapper
 logger = logging.getLogger(__name__)
 
 def get_crew_assignments(event_id):
-    logger.debug(f"Retrieving crew assignments for event: {event_id}")
+    logger.debug("Retrieving crew assignments for event: %s", event_id)
     assignments = db.session.query(Crew, CrewAssignment, Worker).join(
         CrewAssignment, Crew.id == CrewAssignment.crew_id
     ).join(
@@ -24,7 +27,7 @@ def get_crew_assignments(event_id):
         Crew.event_id == event_id
     ).all()
 
-    logger.debug(f"Raw Assignments: {assignments}")
+    logger.debug("Raw Assignments: %s", assignments)
     
     crew_dict = {}
     for crew, crew_assignment, worker in assignments:
@@ -40,66 +43,85 @@ def get_crew_assignments(event_id):
         })
 
     crew_assignments = list(crew_dict.values())
-    logger.debug(f"Crew assignments retrieved: {crew_assignments}")
+    logger.debug("Crew assignments retrieved: %s", crew_assignments)
     return crew_assignments
 
 def backup_database_to_json(file_path):
     try:
         data = {}
 
-        # Loop through all tables
-        for table in db.metadata.sorted_tables:
-            table_name = table.name
-            data[table_name] = []
-            model_class = db.Model._decl_class_registry.get(table_name.capitalize())
-            if model_class:
-                # Query all data from the table
-                records = model_class.query.all()
-                for record in records:
-                    record_dict = {c.key: getattr(record, c.key) for c in class_mapper(model_class).columns}
-                    data[table_name].append(record_dict)
+        models = {mapper.local_table.name: mapper.class_ for mapper in db.Model.registry.mappers}
+
+        # Read from the replica when one is configured
+        with replica_reads():
+            # Loop through all tables
+            for table in db.metadata.sorted_tables:
+                table_name = table.name
+                data[table_name] = []
+                model_class = models.get(table_name)
+                if model_class:
+                    # Query all data from the table
+                    records = model_class.query.all()
+                    for record in records:
+                        record_dict = {c.key: getattr(record, c.key) for c in class_mapper(model_class).columns}
+                        data[table_name].append(record_dict)
 
         # Write to JSON file
         with open(file_path, 'w') as f:
             json.dump(data, f, indent=4, default=str)
 
-        current_app.logger.info(f"Database backup saved to {file_path}")
+        current_app.logger.info("Database backup saved to %s", file_path)
         return True
 
     except Exception as e:
-        current_app.logger.error(f"Error backing up database: {e}")
+        current_app.logger.error("Error backing up database: %s", e)
         return False
     
+def _from_backup(model_class, record_dict):
+    """Turn the strings backup_database_to_json wrote for dates and times back into Python values."""
+    record_dict = dict(record_dict)
+    for column in class_mapper(model_class).columns:
+        value = record_dict.get(column.key)
+        if isinstance(value, str) and isinstance(column.type, (db.DateTime, db.Date)):
+            parsed = datetime.fromisoformat(value)
+            record_dict[column.key] = parsed if isinstance(column.type, db.DateTime) else parsed.date()
+    return record_dict
+
 def restore_database_from_json(file_path):
     try:
         with open(file_path, 'r') as f:
             data = json.load(f)
 
-        # Disable foreign key checks
-        db.engine.execute('SET FOREIGN_KEY_CHECKS=0;')
-
-        # Loop through all tables
-        for table_name, records in data.items():
-            model_class = db.Model._decl_class_registry.get(table_name.capitalize())
-            if model_class:
-                # Delete all existing records in the table
-                db.session.query(model_class).delete()
-                db.session.commit()
-                
-                # Insert records from JSON
-                for record_dict in records:
-                    record = model_class(**record_dict)
-                    db.session.add(record)
-                db.session.commit()
-
-        # Enable foreign key checks
-        db.engine.execute('SET FOREIGN_KEY_CHECKS=1;')
-
-        current_app.logger.info(f"Database restored from {file_path}")
+        models = {mapper.local_table.name: mapper.class_ for mapper in db.Model.registry.mappers}
+        tables = [table.name for table in db.metadata.sorted_tables
+                  if table.name in data and table.name in models]
+        # MySQL only; the setting lasts for the connection, so everything below runs in one transaction
+        mysql = db.engine.dialect.name == 'mysql'
+
+        if mysql:
+            db.session.execute(text('SET FOREIGN_KEY_CHECKS=0'))
+
+        # Delete all existing records, children first. Core statements, so the
+        # ORM listeners (offer digests, outbox, live updates) stay out of it.
+        for table_name in reversed(tables):
+            db.session.execute(models[table_name].__table__.delete())
+
+        # Insert records from JSON, parents first
+        for table_name in tables:
+            records = [_from_backup(models[table_name], record_dict) for record_dict in data[table_name]]
+            if records:
+                db.session.execute(models[table_name].__table__.insert(), records)
+
+        if mysql:
+            db.session.execute(text('SET FOREIGN_KEY_CHECKS=1'))
+        db.session.commit()
+
+        current_app.logger.info("Database restored from %s", file_path)
         return True
 
     except Exception as e:
-        current_app.logger.error(f"Error restoring database: {e}")
+        db.session.rollback()
+        current_app.logger.error("Error restoring database: %s", e)
         return False
 
 def allowed_file(filename):
@@ -111,7 +133,38 @@ def get_account_managers():
 def get_locations():
     return Location.query.all()
 
+# Reference data used to fill form choices on most pages. Cached as plain
+# tuples so every gunicorn worker can share them.
+@cache.memoize('reference', tables=('worker',))
+def account_manager_choices():
+    return [(am.id, f'{am.first_name} {am.last_name}') for am in get_account_managers()]
+
+@cache.memoize('reference', tables=('worker',))
+def worker_choices():
+    return [(worker.id, f'{worker.first_name} {worker.last_name}') for worker in Worker.query.all()]
+
+@cache.memoize('reference', tables=('location',))
+def location_choices():
+    return [(loc.id, loc.name) for loc in get_locations()]
+
+@cache.memoize('reference', tables=('role',))
+def role_choices():
+    return [(role.id, role.name) for role in Role.query.all()]
+
+# Rendered report fragments are invalidated by writes to any table they read.
+cache.register('reports', ('crew', 'crew_assignment', 'event', 'location', 'expense', 'shift', 'worker'))
+
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+def with_csrf(fragment):
+    """Fill the per-session CSRF token into a cached, shared HTML fragment."""
+    return fragment.replace(CSRF_PLACEHOLDER, generate_csrf())
+
 def create_time_report_ch(shifts):
+    # pandas is only imported when a report is actually rendered; it roughly
+    # doubles the cold-start time of every worker and CLI command otherwise.
+    import pandas as pd
+
     data = {
         'Date': [],
         'Show': [],
@@ -133,7 +186,20 @@ def create_time_report_ch(shifts):
 
     return report_html
 
+def receipt_cell(expense):
+    if not expense.receipt_filename:
+        return ''
+    link = url_for('files.receipt', expense_id=expense.id, variant='display')
+    if expense.receipt_thumbnail_path:
+        thumbnail = url_for('files.receipt', expense_id=expense.id, variant='thumbnail')
+        return f'<a href="{link}" target="_blank"><img src="{thumbnail}" alt="Receipt" class="img-thumbnail" loading="lazy"></a>'
+    if expense.receipt_status in ('pending', 'processing'):
+        return f'<a href="{link}" target="_blank">View</a> <span class="label label-default">Processing</span>'
+    return f'<a href="{link}" target="_blank">View</a>'
+
 def create_expense_report_ch(expenses):
+    import pandas as pd
+
     data = {
         'Receipt Number': [],
         'Date': [],
@@ -142,38 +208,47 @@ def create_expense_report_ch(expenses):
         'Net': [],
         'HST': [],
         'Total': [],
+        'Receipt': [],
     }
 
     for expense in expenses:
-        current_app.logger.debug(f"Processing expense: {expense}")
-        data['Receipt Number'].append(expense.receipt_number)
+        current_app.logger.debug("Processing expense: %s", expense)
+        data['Receipt Number'].append(escape(expense.receipt_number))
         data['Date'].append(expense.date.strftime('%Y-%m-%d') if isinstance(expense.date, datetime) else expense.date)
-        data['Show'].append(f'{expense.account_manager}, {expense.show_name}/{expense.show_number}, {expense.details}')
-        data['Location'].append(expense.event.location if expense.event else "Unknown location")
+        data['Show'].append(escape(f'{expense.account_manager}, {expense.show_name}/{expense.show_number}, {expense.details}'))
+        data['Location'].append(escape(expense.event.location if expense.event else "Unknown location"))
         data['Net'].append(expense.net)
         data['HST'].append(expense.hst)
         data['Total'].append(expense.net + expense.hst)
+        data['Receipt'].append(receipt_cell(expense))
 
     expense_report = pd.DataFrame(data)
-    current_app.logger.debug(f"Expense report DataFrame: {expense_report}")
+    current_app.logger.debug("Expense report DataFrame: %s", expense_report)
 
     try:
         expense_report['Date'] = pd.to_datetime(expense_report['Date'], format='%Y-%m-%d')
     except Exception as e:
-        current_app.logger.error(f"Error converting dates: {e}")
+        current_app.logger.error("Error converting dates: %s", e)
 
-    report_html = expense_report.to_html(index=False, classes='table table-striped table-hover')
+    # Text columns are escaped above so the receipt links can be rendered as HTML.
+    report_html = expense_report.to_html(index=False, classes='table table-striped table-hover', escape=False)
 
     return report_html
 
-from flask_wtf.csrf import generate_csrf
+@cache.memoize('reports')
+def create_event_report(filter_option='all', after=None, before=None):
+    """
+    One page of the event report, newest shows first.
+
+    :return: (report HTML, next cursor, previous cursor), cursors as from page_events().
+    """
+    import pandas as pd
+    from app.services.event_query import page_events
 
-def create_event_report(filter_option='all'):
     current_app.logger.debug("Creating event report with filter: %s", filter_option)
-    if filter_option == 'active':
-        events = Event.query.filter_by(active=True).order_by(Event.show_number).all()
-    else:
-        events = Event.query.order_by(Event.show_number).all()
+    filters = {'active': True} if filter_option == 'active' else {}
+    page = page_events(filters, after=after, before=before)
+    events = page['events']
 
     current_app.logger.debug("Events fetched: %s", events)
 
@@ -200,10 +275,9 @@ def create_event_report(filter_option='all'):
         view_button = f'<a href="{url_for("events.view_event", event_id=event.id)}" class="btn btn-info">View Details</a>'
         edit_button = f'<a href="{url_for("events.edit_event", event_id=event.id)}" class="btn btn-warning">Edit</a>'
 
-        csrf_token = generate_csrf()  # Generate CSRF token for each form
         delete_form = (
             f'<form id="delete-event-form-{event.id}" action="{url_for("events.delete_event", event_id=event.id)}" method="POST" style="display: inline;">'
-            f'<input type="hidden" name="csrf_token" value="{csrf_token}">'
+            f'<input type="hidden" name="csrf_token" value="{CSRF_PLACEHOLDER}">'
             f'<button type="button" class="btn btn-danger" onclick="confirm_delete({event.id})">Delete</button>'
             f'</form>'
         )
@@ -213,7 +287,7 @@ def create_event_report(filter_option='all'):
     event_report = pd.DataFrame(data)
     report_html = event_report.to_html(index=False, classes='table table-bordered table-striped table-hover', escape=False)
 
-    return report_html
+    return report_html, page['next'], page['previous']
 
 def get_pay_periods(start_date, num_periods):
     pay_periods = []
@@ -273,10 +347,10 @@ def assign_past_crew_assignment(worker_id, event_id, start_time, end_time, role,
         db.session.add(crew_assignment)
         db.session.commit()
 
-        current_app.logger.info(f"Assigned past crew assignment: {crew_assignment}")
+        current_app.logger.info("Assigned past crew assignment: %s", crew_assignment)
         return crew_assignment
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Error assigning past crew assignment: {e}")
+        current_app.logger.error("Error assigning past crew assignment: %s", e)
         return None
@@ -13,33 +13,123 @@ DATABASE_URL = fix_postgres_dialect(os.getenv("DATABASE_URL"))
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set or is invalid")
 
+# Optional read replica for report and listing queries. Locally this can be
+# any second database holding a copy of the primary's data.
+REPLICA_DATABASE_URL = fix_postgres_dialect(os.getenv("REPLICA_DATABASE_URL"))
+
+def engine_options(url):
+    """Connection pool settings for Postgres; other databases keep SQLAlchemy's defaults."""
+    if not url.startswith('postgresql'):
+        return {}
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Recycle before typical load balancer / failover idle cutoffs and
+        # ping on checkout so stale connections are replaced, not handed out.
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'connect_args': {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5))},
+    }
+    statement_timeout = os.getenv('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout:
+        options['connect_args']['options'] = f'-c statement_timeout={int(statement_timeout)}'
+    return options
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(DATABASE_URL)
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': REPLICA_DATABASE_URL, **engine_options(REPLICA_DATABASE_URL)}
+    } if REPLICA_DATABASE_URL else {}
+    # After a user commits a write their reads stay on the primary this long,
+    # so replica lag never hides their own changes; seconds.
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
     UPLOAD_FOLDER = 'uploads'
+    # Documents, receipts and their derived files; kept out of app/static so only
+    # the authorized files blueprint can serve them. Defaults to instance/uploads.
+    UPLOAD_STORE = os.getenv('UPLOAD_STORE')
     ALLOWED_EXTENSIONS = {'pdf', 'jpeg', 'jpg', 'png'}
-    MAIL_SERVER = 'smtp.googlemail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # Point these at a local sink (e.g. `python -m aiosmtpd -n -l localhost:1025`
+    # with MAIL_PORT=1025 MAIL_USE_TLS=false) to test the outbox worker.
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.googlemail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.getenv('EMAIL_USER')
     MAIL_PASSWORD = os.getenv('EMAIL_PASS')
-    MAIL_DEFAULT_SENDER = os.getenv('EMAIL_USER')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('EMAIL_USER') or 'noreply@demo.com')
+    # Emails are queued in the outbox table and sent by `flask outbox worker`.
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', 30))
+    OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('OUTBOX_RETRY_MAX_SECONDS', 3600))
+    # New offers are collected per worker and sent as one digest once no new
+    # offer has arrived for OFFER_DIGEST_WINDOW seconds (capped by MAX_DELAY).
+    OFFER_DIGEST_WINDOW = int(os.getenv('OFFER_DIGEST_WINDOW', 120))
+    OFFER_DIGEST_MAX_DELAY = int(os.getenv('OFFER_DIGEST_MAX_DELAY', 900))
+    OFFER_DIGEST_CHANNEL = os.getenv('OFFER_DIGEST_CHANNEL', 'email')  # or 'webhook'
+    OFFER_DIGEST_WEBHOOK_URL = os.getenv('OFFER_DIGEST_WEBHOOK_URL', 'http://localhost:5000/hooks/offer_digest')
+    OFFER_LINK_MAX_AGE = int(os.getenv('OFFER_LINK_MAX_AGE', 7 * 24 * 3600))
+    # Uploaded documents are converted, stamped and thumbnailed by `flask documents worker`.
+    DOCUMENT_WORKERS = int(os.getenv('DOCUMENT_WORKERS', os.cpu_count() or 2))
+    DOCUMENT_BATCH_SIZE = int(os.getenv('DOCUMENT_BATCH_SIZE', 8))
+    DOCUMENT_POLL_INTERVAL = float(os.getenv('DOCUMENT_POLL_INTERVAL', 2))
+    DOCUMENT_PROCESSING_TIMEOUT = int(os.getenv('DOCUMENT_PROCESSING_TIMEOUT', 600))
+    DOCUMENT_THUMBNAIL_SIZE = int(os.getenv('DOCUMENT_THUMBNAIL_SIZE', 320))
+    # Large documents are uploaded in chunks that survive dropped connections.
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
+    # Receipt photos are rotated, downscaled and thumbnailed by the same worker.
+    RECEIPT_DISPLAY_SIZE = int(os.getenv('RECEIPT_DISPLAY_SIZE', 1600))
+    RECEIPT_THUMBNAIL_SIZE = int(os.getenv('RECEIPT_THUMBNAIL_SIZE', 160))
+    RECEIPT_JPEG_QUALITY = int(os.getenv('RECEIPT_JPEG_QUALITY', 80))
+    # When false, the display version replaces the original photo once it is made.
+    RECEIPT_KEEP_ORIGINAL = os.getenv('RECEIPT_KEEP_ORIGINAL', 'true').lower() == 'true'
+    # Events with more crews and assignments than this are deleted by `flask events purge`
+    # (the Procfile `purger` process), EVENT_PURGE_BATCH_SIZE crews per transaction.
+    EVENT_PURGE_THRESHOLD = int(os.getenv('EVENT_PURGE_THRESHOLD', 2000))
+    EVENT_PURGE_BATCH_SIZE = int(os.getenv('EVENT_PURGE_BATCH_SIZE', 50))
+    # Transactions that lose a lock or serialization race (assignments) are retried
+    # this many times, after a random pause of up to TRANSACTION_RETRY_BASE_SECONDS * 2**attempt.
+    TRANSACTION_RETRY_ATTEMPTS = int(os.getenv('TRANSACTION_RETRY_ATTEMPTS', 5))
+    TRANSACTION_RETRY_BASE_SECONDS = float(os.getenv('TRANSACTION_RETRY_BASE_SECONDS', 0.02))
+    # Uploads are served by the files blueprint. Behind a proxy, let it stream
+    # the bytes: USE_X_SENDFILE for Apache/lighttpd, or X_ACCEL_REDIRECT_PREFIX
+    # for nginx (an `internal` location aliased to the UPLOAD_STORE folder).
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+    X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX')
+    # Public base URL for links built outside a request (digests, CLI).
+    EXTERNAL_URL = os.getenv('EXTERNAL_URL', 'http://localhost:5000')
+    # 'sqlite' shares one cache file between all gunicorn workers on a host,
+    # 'redis' shares it between hosts, 'memory' is per-process only.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'sqlite')
+    CACHE_URL = os.getenv('CACHE_URL', os.getenv('REDIS_URL'))
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    # Change events for /live/events (SSE) are kept in the cache backend for
+    # LIVE_EVENT_TTL seconds; a client further than LIVE_BACKLOG events behind
+    # reloads instead. Each stream polls the log every LIVE_POLL_INTERVAL seconds
+    # and ends after LIVE_STREAM_SECONDS; the browser reconnects and resumes.
+    # Every open stream holds one gunicorn thread, so each worker serves at most
+    # LIVE_MAX_STREAMS of them and turns further ones away (503) to leave
+    # GUNICORN_THREADS - LIVE_MAX_STREAMS threads for ordinary requests.
+    LIVE_EVENT_TTL = int(os.getenv('LIVE_EVENT_TTL', 600))
+    LIVE_BACKLOG = int(os.getenv('LIVE_BACKLOG', 500))
+    LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', 1.0))
+    LIVE_STREAM_SECONDS = int(os.getenv('LIVE_STREAM_SECONDS', 300))
+    LIVE_HEARTBEAT_SECONDS = int(os.getenv('LIVE_HEARTBEAT_SECONDS', 15))
+    LIVE_RETRY_MILLISECONDS = int(os.getenv('LIVE_RETRY_MILLISECONDS', 2000))
+    LIVE_MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', 8))
+    # Readiness checks run against the app's own engine pool; seconds.
+    HEALTHCHECK_TIMEOUT = float(os.getenv('HEALTHCHECK_TIMEOUT', 2.0))
+    # Root level plus per-logger overrides, e.g. 'app=DEBUG,sqlalchemy.engine=INFO'.
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', 'app=INFO,sqlalchemy.engine=WARNING')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Max DEBUG records per second from any one logging call; 0 keeps them all.
+    LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', 20))
     DEBUG = True
-
-# Test the database connection
-import psycopg2
-from psycopg2 import OperationalError
-
-def test_db_connection():
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        print("Database connection successful:", cursor.fetchone())
-        print("SQLALCHEMY_DATABASE_URI:", DATABASE_URL)
-        conn.close()
-    except OperationalError as e:
-        print("Database connection failed:", e)
-
-test_db_connection()
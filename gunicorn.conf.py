@@ -0,0 +1,27 @@
+# Picked up automatically by `gunicorn wsgi:app` (see Procfile).
+import os
+
+# Import and build the app once in the master, then fork workers from it so
+# each worker boot skips the import and create_app() cost. create_app() opens
+# no database connections, so workers inherit no sockets.
+preload_app = True
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# Threaded workers, so that long-lived /live/events streams do not tie up a
+# whole worker. Each open stream holds one of these threads (but no database
+# connection) for up to LIVE_STREAM_SECONDS; a worker serves at most
+# LIVE_MAX_STREAMS of them, so keep that well below GUNICORN_THREADS and size
+# both against the number of open pages expected. `timeout` then only applies
+# to a worker that stops responding, not to a long-running response.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def post_fork(server, worker):
+    # Drop any pooled connections the master may have opened (e.g. from a
+    # preload-time health check) without closing them under the master's feet.
+    from wsgi import app
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,43 @@
+"""add upload_session for chunked document uploads
+
+Revision ID: 0b6e4d9a2f58
+Revises: f3a8d15c6e27
+Create Date: 2026-10-19 21:03:17.552810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e4d9a2f58'
+down_revision = 'f3a8d15c6e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_session',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=128), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('chunk_size', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], name='fk_upload_session_event_id', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['worker_id'], ['worker.id'], name='fk_upload_session_worker_id', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['document_id'], ['document.id'], name='fk_upload_session_document_id', ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.create_index('ix_upload_session_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_upload_session_updated_at')
+    op.drop_table('upload_session')
@@ -0,0 +1,28 @@
+"""add updated_at version stamps to event, crew and crew_assignment
+
+Revision ID: 3b7c9e2d41a5
+Revises: 04030818aafc
+Create Date: 2026-10-19 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c9e2d41a5'
+down_revision = '04030818aafc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('event', 'crew', 'crew_assignment'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+
+def downgrade():
+    for table in ('crew_assignment', 'crew', 'event'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,97 @@
+"""copy crew times onto crew_assignment and forbid double bookings
+
+Revision ID: 3f6b8d2e9a47
+Revises: 8b4d0e6a2c75
+Create Date: 2026-10-20 01:14:32.908115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b8d2e9a47'
+down_revision = '8b4d0e6a2c75'
+branch_labels = None
+depends_on = None
+
+OPEN = "status IN ('offered', 'accepted')"
+
+# Must stay in step with PG_DDL and SQLITE_DDL in app/services/bookings.py.
+PG_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE crew_assignment ADD CONSTRAINT ex_crew_assignment_double_booking '
+    f'EXCLUDE USING gist (worker_id WITH =, tsrange(start_time, end_time) WITH &&) WHERE ({OPEN})',
+    'CREATE OR REPLACE FUNCTION crew_assignment_copy_crew_times() RETURNS trigger AS $$ BEGIN '
+    'UPDATE crew_assignment SET start_time = NEW.start_time, end_time = NEW.end_time WHERE crew_id = NEW.id; '
+    'RETURN NULL; END $$ LANGUAGE plpgsql',
+    'CREATE TRIGGER crew_copy_times AFTER UPDATE OF start_time, end_time ON crew FOR EACH ROW '
+    'EXECUTE FUNCTION crew_assignment_copy_crew_times()',
+]
+_SQLITE_OVERLAP = ("SELECT RAISE(ABORT, 'double booking') FROM crew_assignment WHERE worker_id = NEW.worker_id "
+                   f"AND {OPEN} AND start_time < NEW.end_time AND end_time > NEW.start_time")
+SQLITE_DDL = [
+    "CREATE TRIGGER crew_assignment_double_booking_insert BEFORE INSERT ON crew_assignment "
+    f"WHEN NEW.{OPEN} BEGIN {_SQLITE_OVERLAP}; END",
+    "CREATE TRIGGER crew_assignment_double_booking_update "
+    "BEFORE UPDATE OF worker_id, status, start_time, end_time ON crew_assignment "
+    f"WHEN NEW.{OPEN} BEGIN {_SQLITE_OVERLAP} AND id <> NEW.id; END",
+    "CREATE TRIGGER crew_copy_times AFTER UPDATE OF start_time, end_time ON crew BEGIN "
+    "UPDATE crew_assignment SET start_time = NEW.start_time, end_time = NEW.end_time WHERE crew_id = NEW.id; END",
+]
+
+CONFLICTS = f"""
+SELECT a.worker_id, a.id, b.id FROM crew_assignment a
+JOIN crew ca ON ca.id = a.crew_id
+JOIN crew_assignment b ON b.worker_id = a.worker_id AND b.id > a.id
+JOIN crew cb ON cb.id = b.crew_id
+WHERE a.{OPEN} AND b.{OPEN} AND ca.start_time < cb.end_time AND cb.start_time < ca.end_time
+LIMIT 10
+"""
+
+
+def _copy_times(table, crews):
+    for column in ('start_time', 'end_time'):
+        op.execute(f'UPDATE {table} SET {column} = (SELECT {column} FROM {crews} WHERE {crews}.id = {table}.crew_id)')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not op.get_context().as_sql:
+        conflicts = bind.execute(sa.text(CONFLICTS)).all()
+        if conflicts:
+            raise RuntimeError(
+                'Workers are double-booked; resolve these first (`flask bookings conflicts` lists all of them): '
+                + ', '.join(f'worker {worker_id} on assignments {first} and {second}' for worker_id, first, second in conflicts))
+
+    for table, crews in (('crew_assignment', 'crew'), ('archived_crew_assignment', 'archived_crew')):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('start_time', sa.DateTime(), nullable=True))
+            batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+        _copy_times(table, crews)
+        # SQLite cannot tighten a column without rebuilding the table; the app always fills them there.
+        if bind.dialect.name == 'postgresql':
+            op.alter_column(table, 'start_time', nullable=False)
+            op.alter_column(table, 'end_time', nullable=False)
+
+    op.create_index('ix_crew_assignment_open_worker_id_start_time', 'crew_assignment',
+                    ['worker_id', 'start_time', 'end_time'], unique=False,
+                    postgresql_where=sa.text(OPEN), sqlite_where=sa.text(OPEN))
+    for statement in PG_DDL if bind.dialect.name == 'postgresql' else SQLITE_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS crew_copy_times ON crew')
+        op.execute('DROP FUNCTION IF EXISTS crew_assignment_copy_crew_times()')
+        op.execute('ALTER TABLE crew_assignment DROP CONSTRAINT IF EXISTS ex_crew_assignment_double_booking')
+    else:
+        op.execute('DROP TRIGGER IF EXISTS crew_copy_times')
+        op.execute('DROP TRIGGER IF EXISTS crew_assignment_double_booking_update')
+        op.execute('DROP TRIGGER IF EXISTS crew_assignment_double_booking_insert')
+    op.drop_index('ix_crew_assignment_open_worker_id_start_time', table_name='crew_assignment')
+    for table in ('archived_crew_assignment', 'crew_assignment'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('end_time')
+            batch_op.drop_column('start_time')
@@ -0,0 +1,49 @@
+"""add indexes for the home, shift and timesheet queries
+
+Revision ID: 4c9e1b7d3a06
+Revises: 0b6e4d9a2f58
+Create Date: 2026-10-19 21:48:52.104377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9e1b7d3a06'
+down_revision = '0b6e4d9a2f58'
+branch_labels = None
+depends_on = None
+
+OPEN_STATUSES = "status IN ('offered', 'accepted')"
+
+# (name, table, columns, partial index predicate as {dialect: SQL})
+INDEXES = [
+    ('ix_crew_assignment_worker_id_status', 'crew_assignment', ['worker_id', 'status'], None),
+    ('ix_crew_assignment_crew_id', 'crew_assignment', ['crew_id'], None),
+    ('ix_crew_assignment_open_crew_id', 'crew_assignment', ['crew_id'], {'postgresql': OPEN_STATUSES, 'sqlite': OPEN_STATUSES}),
+    ('ix_crew_start_time', 'crew', ['start_time'], None),
+    ('ix_crew_event_id_start_time', 'crew', ['event_id', 'start_time'], None),
+    ('ix_shift_worker_id_start', 'shift', ['worker_id', 'start'], None),
+    ('ix_shift_start', 'shift', ['start'], None),
+    ('ix_expense_worker_id_date', 'expense', ['worker_id', 'date'], None),
+    ('ix_note_event_id', 'note', ['event_id'], None),
+    ('ix_event_active_show_number', 'event', ['show_number'], {'postgresql': 'active', 'sqlite': 'active = 1'}),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps these tables writable on Postgres while the indexes build;
+    # it cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            where = where or {}
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True,
+                            postgresql_where=where.get('postgresql') and sa.text(where['postgresql']),
+                            sqlite_where=where.get('sqlite') and sa.text(where['sqlite']))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
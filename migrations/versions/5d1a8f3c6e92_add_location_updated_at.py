@@ -0,0 +1,26 @@
+"""add updated_at to location
+
+Revision ID: 5d1a8f3c6e92
+Revises: 9c2e4a7b1d58
+Create Date: 2026-10-20 09:14:31.207458
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1a8f3c6e92'
+down_revision = '9c2e4a7b1d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+
+def downgrade():
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,39 @@
+"""add outbox_message table for queued emails
+
+Revision ID: 5d2e8f1a7c63
+Revises: 3b7c9e2d41a5
+Create Date: 2026-10-19 17:40:12.504811
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8f1a7c63'
+down_revision = '3b7c9e2d41a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_message_status_available_at', 'outbox_message', ['status', 'available_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_message_status_available_at', table_name='outbox_message')
+    op.drop_table('outbox_message')
@@ -0,0 +1,40 @@
+"""add indexes for the filtered event listings
+
+Revision ID: 5e7c2a9f4d13
+Revises: 9d2a6f4e8b31
+Create Date: 2026-10-19 23:12:40.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7c2a9f4d13'
+down_revision = '9d2a6f4e8b31'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_event_account_manager_id_show_number', ['account_manager_id', 'show_number']),
+    ('ix_event_location_id_show_number', ['location_id', 'show_number']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'event', columns, unique=False, postgresql_concurrently=True)
+        if op.get_bind().dialect.name == 'postgresql':
+            # text_pattern_ops so LIKE 'abc%' can use the index whatever the database collation.
+            op.execute('CREATE INDEX CONCURRENTLY ix_event_show_name_prefix '
+                       'ON event (lower(show_name) text_pattern_ops)')
+        else:
+            op.create_index('ix_event_show_name_prefix', 'event', [sa.text('lower(show_name)')], unique=False)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_event_show_name_prefix', table_name='event', postgresql_concurrently=True)
+        for name, columns in reversed(INDEXES):
+            op.drop_index(name, table_name='event', postgresql_concurrently=True)
@@ -0,0 +1,164 @@
+"""add archive tables for past events
+
+Revision ID: 7a3f9c1e5b24
+Revises: 5e7c2a9f4d13
+Create Date: 2026-10-19 23:41:05.207814
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3f9c1e5b24'
+down_revision = '5e7c2a9f4d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_event',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('show_name', sa.String(length=128), nullable=False),
+    sa.Column('show_number', sa.Integer(), nullable=False),
+    sa.Column('account_manager_id', sa.Integer(), nullable=False),
+    sa.Column('location_id', sa.Integer(), nullable=False),
+    sa.Column('sharepoint', sa.String(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_event', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_event_show_number', ['show_number'], unique=False)
+
+    op.create_table('archived_crew',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=False),
+    sa.Column('roles', sa.String(), nullable=False),
+    sa.Column('shift_type', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_crew', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_crew_event_id', ['event_id'], unique=False)
+
+    op.create_table('archived_crew_assignment',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('crew_id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_crew_assignment', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_crew_assignment_crew_id', ['crew_id'], unique=False)
+        batch_op.create_index('ix_archived_crew_assignment_worker_id', ['worker_id'], unique=False)
+
+    op.create_table('archived_shift',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('start', sa.DateTime(), nullable=False),
+    sa.Column('end', sa.DateTime(), nullable=False),
+    sa.Column('show_name', sa.String(length=100), nullable=True),
+    sa.Column('show_number', sa.Integer(), nullable=False),
+    sa.Column('account_manager_id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('crew_assignment_id', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_shift', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_shift_crew_assignment_id', ['crew_assignment_id'], unique=False)
+        batch_op.create_index('ix_archived_shift_worker_id_start', ['worker_id', 'start'], unique=False)
+
+    op.create_table('archived_note',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('account_manager_only', sa.Boolean(), nullable=True),
+    sa.Column('account_manager_and_td_only', sa.Boolean(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_note', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_note_event_id', ['event_id'], unique=False)
+
+    op.create_table('archived_expense',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('receipt_number', sa.String(length=50), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('account_manager_id', sa.Integer(), nullable=False),
+    sa.Column('show_name', sa.String(length=100), nullable=True),
+    sa.Column('show_number', sa.Integer(), nullable=False),
+    sa.Column('details', sa.String(length=200), nullable=True),
+    sa.Column('net', sa.Float(), nullable=True),
+    sa.Column('hst', sa.Float(), nullable=True),
+    sa.Column('receipt_filename', sa.String(length=100), nullable=True),
+    sa.Column('receipt_status', sa.String(length=20), nullable=True),
+    sa.Column('receipt_display_path', sa.String(length=100), nullable=True),
+    sa.Column('receipt_thumbnail_path', sa.String(length=100), nullable=True),
+    sa.Column('receipt_processing_error', sa.Text(), nullable=True),
+    sa.Column('receipt_updated_at', sa.DateTime(), nullable=True),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_expense', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_expense_show_number', ['show_number'], unique=False)
+        batch_op.create_index('ix_archived_expense_worker_id_date', ['worker_id', 'date'], unique=False)
+
+    op.create_table('archived_document',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=128), nullable=False),
+    sa.Column('path', sa.String(length=256), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('pdf_path', sa.String(length=256), nullable=True),
+    sa.Column('thumbnail_path', sa.String(length=256), nullable=True),
+    sa.Column('page_count', sa.Integer(), nullable=True),
+    sa.Column('text_content', sa.Text(), nullable=True),
+    sa.Column('processing_error', sa.Text(), nullable=True),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_document', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_document_event_id', ['event_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_document', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_document_event_id')
+    op.drop_table('archived_document')
+    with op.batch_alter_table('archived_expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_expense_worker_id_date')
+        batch_op.drop_index('ix_archived_expense_show_number')
+    op.drop_table('archived_expense')
+    with op.batch_alter_table('archived_note', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_note_event_id')
+    op.drop_table('archived_note')
+    with op.batch_alter_table('archived_shift', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_shift_worker_id_start')
+        batch_op.drop_index('ix_archived_shift_crew_assignment_id')
+    op.drop_table('archived_shift')
+    with op.batch_alter_table('archived_crew_assignment', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_crew_assignment_worker_id')
+        batch_op.drop_index('ix_archived_crew_assignment_crew_id')
+    op.drop_table('archived_crew_assignment')
+    with op.batch_alter_table('archived_crew', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_crew_event_id')
+    op.drop_table('archived_crew')
+    with op.batch_alter_table('archived_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_event_show_number')
+    op.drop_table('archived_event')
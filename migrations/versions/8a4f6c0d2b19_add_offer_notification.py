@@ -0,0 +1,36 @@
+"""add offer_notification table and outbox_message.channel
+
+Revision ID: 8a4f6c0d2b19
+Revises: 5d2e8f1a7c63
+Create Date: 2026-10-19 18:02:51.337920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4f6c0d2b19'
+down_revision = '5d2e8f1a7c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('offer_notification',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('crew_assignment_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['crew_assignment_id'], ['crew_assignment.id'], name='fk_offer_notification_crew_assignment_id', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_offer_notification_crew_assignment_id', 'offer_notification', ['crew_assignment_id'], unique=False)
+    with op.batch_alter_table('outbox_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('channel', sa.String(length=16), nullable=False, server_default='email'))
+
+
+def downgrade():
+    with op.batch_alter_table('outbox_message', schema=None) as batch_op:
+        batch_op.drop_column('channel')
+    op.drop_index('ix_offer_notification_crew_assignment_id', table_name='offer_notification')
+    op.drop_table('offer_notification')
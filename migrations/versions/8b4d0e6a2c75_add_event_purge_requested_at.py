@@ -0,0 +1,36 @@
+"""add event.purge_requested_at for background deletes
+
+Revision ID: 8b4d0e6a2c75
+Revises: 7a3f9c1e5b24
+Create Date: 2026-10-20 00:27:51.630442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4d0e6a2c75'
+down_revision = '7a3f9c1e5b24'
+branch_labels = None
+depends_on = None
+
+PENDING = 'purge_requested_at IS NOT NULL'
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('purge_requested_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_event_purge_requested_at', ['purge_requested_at'], unique=False,
+                              postgresql_where=sa.text(PENDING), sqlite_where=sa.text(PENDING))
+    # The archive tables mirror the live columns.
+    with op.batch_alter_table('archived_event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('purge_requested_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('archived_event', schema=None) as batch_op:
+        batch_op.drop_column('purge_requested_at')
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_purge_requested_at')
+        batch_op.drop_column('purge_requested_at')
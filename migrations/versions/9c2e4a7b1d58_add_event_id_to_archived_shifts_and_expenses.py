@@ -0,0 +1,35 @@
+"""record the archived event on archived shifts and expenses
+
+Revision ID: 9c2e4a7b1d58
+Revises: 3f6b8d2e9a47
+Create Date: 2026-10-20 03:02:47.516390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e4a7b1d58'
+down_revision = '3f6b8d2e9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('archived_shift', 'archived_expense'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('event_id', sa.Integer(), nullable=True))
+            batch_op.create_index(f'ix_{table}_event_id', ['event_id'], unique=False)
+        # Rows were archived in the same batch as their event, so they share its archived_at;
+        # within a batch show numbers are still unique.
+        op.execute(f'UPDATE {table} SET event_id = (SELECT archived_event.id FROM archived_event '
+                   f'WHERE archived_event.show_number = {table}.show_number '
+                   f'AND archived_event.archived_at = {table}.archived_at)')
+
+
+def downgrade():
+    for table in ('archived_expense', 'archived_shift'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_event_id')
+            batch_op.drop_column('event_id')
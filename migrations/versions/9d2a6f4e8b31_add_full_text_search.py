@@ -0,0 +1,65 @@
+"""add full-text search indexes for notes, help tickets and documents
+
+Revision ID: 9d2a6f4e8b31
+Revises: 4c9e1b7d3a06
+Create Date: 2026-10-19 22:31:05.662913
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2a6f4e8b31'
+down_revision = '4c9e1b7d3a06'
+branch_labels = None
+depends_on = None
+
+# Must stay in step with SOURCES in app/services/search.py.
+SOURCES = {
+    'note': ('content',),
+    'help_ticket': ('subject', 'content'),
+    'document': ('name', 'text_content'),
+}
+
+
+def _pg_text(columns):
+    return " || ' ' || ".join(f"coalesce({name}, '')" for name in columns)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # GIN expression indexes; Postgres keeps them current on every write.
+        with op.get_context().autocommit_block():
+            for name, columns in SOURCES.items():
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{name}_search ON {name} "
+                           f"USING gin (to_tsvector('english'::regconfig, {_pg_text(columns)}))")
+        return
+
+    for name, columns in SOURCES.items():
+        cols = ', '.join(columns)
+        new = ', '.join(f'new.{c}' for c in columns)
+        old = ', '.join(f'old.{c}' for c in columns)
+        fts = f'{name}_fts'
+        op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{name}', content_rowid='id', "
+                   f"tokenize='porter unicode61')")
+        op.execute(f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {name} BEGIN "
+                   f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END")
+        op.execute(f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {name} BEGIN "
+                   f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END")
+        op.execute(f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {cols} ON {name} BEGIN "
+                   f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+                   f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END")
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in SOURCES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{name}_search')
+        return
+
+    for name in SOURCES:
+        for suffix in ('insert', 'delete', 'update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {name}_fts_{suffix}')
+        op.execute(f'DROP TABLE IF EXISTS {name}_fts')
@@ -0,0 +1,39 @@
+"""add background processing columns to document
+
+Revision ID: c71b3e94d5a8
+Revises: 8a4f6c0d2b19
+Create Date: 2026-10-19 18:31:07.912466
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71b3e94d5a8'
+down_revision = '8a4f6c0d2b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        # Existing uploads were never processed; the worker picks them up as pending.
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'))
+        batch_op.add_column(sa.Column('pdf_path', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail_path', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('page_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('text_content', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('processing_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('uploaded_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.add_column(sa.Column('processed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.create_index('ix_document_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_index('ix_document_status')
+        for column in ('updated_at', 'processed_at', 'uploaded_at', 'processing_error', 'text_content',
+                       'page_count', 'thumbnail_path', 'pdf_path', 'status'):
+            batch_op.drop_column(column)
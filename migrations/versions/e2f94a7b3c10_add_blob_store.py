@@ -0,0 +1,34 @@
+"""add blob table for content-addressed uploads
+
+Revision ID: e2f94a7b3c10
+Revises: c71b3e94d5a8
+Create Date: 2026-10-19 19:05:44.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f94a7b3c10'
+down_revision = 'c71b3e94d5a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('key', sa.String(length=80), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_blob_sha256', 'blob', ['sha256'], unique=False)
+    # Existing uploads are moved into the store with `flask blobs import-legacy`.
+
+
+def downgrade():
+    op.drop_index('ix_blob_sha256', table_name='blob')
+    op.drop_table('blob')
@@ -0,0 +1,37 @@
+"""add receipt processing columns to expense
+
+Revision ID: f3a8d15c6e27
+Revises: e2f94a7b3c10
+Create Date: 2026-10-19 20:12:44.381205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8d15c6e27'
+down_revision = 'e2f94a7b3c10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('receipt_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('receipt_display_path', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('receipt_thumbnail_path', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('receipt_processing_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('receipt_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_expense_receipt_status', ['receipt_status'], unique=False)
+
+    # Existing receipts get their thumbnails from the worker like new ones.
+    op.execute("UPDATE expense SET receipt_status = 'pending' WHERE receipt_filename IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_receipt_status')
+        for column in ('receipt_updated_at', 'receipt_processing_error', 'receipt_thumbnail_path',
+                       'receipt_display_path', 'receipt_status'):
+            batch_op.drop_column(column)
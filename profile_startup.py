@@ -0,0 +1,75 @@
+"""
+Measure cold-start cost of the app factory, broken down by imported module.
+
+Runs `create_app()` in a fresh interpreter under `python -X importtime` and
+reports the import time attributed to each top-level package (the sum of
+its modules' self time, so nothing is double counted), the slowest single
+modules, and the wall-clock time of the factory itself.
+
+    python profile_startup.py                 # top 20 packages and modules
+    python profile_startup.py --budget-ms 600 # exit 1 if imports exceed the budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+STARTUP_SNIPPET = (
+    "import time; t = time.perf_counter(); "
+    "from app import create_app; create_app(); "
+    "print('factory_ms', (time.perf_counter() - t) * 1000)"
+)
+
+
+def parse_importtime(stderr):
+    """Return [(module, self microseconds)] from `-X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        modules.append((name.strip(), int(self_us)))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=20, help='Number of packages to list.')
+    parser.add_argument('--budget-ms', type=float, default=None, help='Fail when total import time exceeds this.')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SNIPPET],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        return result.returncode
+
+    modules = parse_importtime(result.stderr)
+    packages = defaultdict(int)
+    for name, micros in modules:
+        packages[name.split('.')[0]] += micros
+    total_ms = sum(packages.values()) / 1000
+    factory_ms = float(result.stdout.split('factory_ms')[-1])
+
+    print(f"{'package':<32}{'self ms':>10}{'share':>8}")
+    for name, micros in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<32}{micros / 1000:>10.1f}{micros / 1000 / total_ms:>8.0%}")
+    print(f"\n{'slowest modules':<32}{'self ms':>10}")
+    for name, micros in sorted(modules, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<32}{micros / 1000:>10.1f}")
+    print(f"\ntotal import time: {total_ms:.1f} ms")
+    print(f"import + create_app() wall time: {factory_ms:.1f} ms")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Import budget exceeded: {total_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())